@@ -1,18 +1,52 @@
 import streamlit as st
 import os
 import logging
-from basic_pitch import ICASSP_2022_MODEL_PATH
+import importlib
 
-from audio_to_midi import render_audio_to_midi_ui
-from whistle_to_sheet import render_whistle_to_sheet_ui
-from draw_to_music import render_draw_to_music_ui
-from image_to_musicxml import render_image_to_musicxml_ui
+from model_registry import get_model_registry
+from result_cache import get_result_cache
+from audio_io import get_audio_cache
+from job_queue import get_job_queue
+from tracing import get_metrics_server, render_timing_panel
 
 logging.basicConfig(level=logging.ERROR)
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 
 st.set_page_config(layout="wide", page_title="SoundScape Studio")
 
+# each mode's module, and with it TensorFlow, music21 etc., is imported only once that mode is selected
+MODES = {
+    "Whistle-to-Sheet": ("whistle_to_sheet", "render_whistle_to_sheet_ui"),
+    "Audio-to-MIDI": ("audio_to_midi", "render_audio_to_midi_ui"),
+    "Draw-to-Music": ("draw_to_music", "render_draw_to_music_ui"),
+    "Image-to-MusicXML": ("image_to_musicxml", "render_image_to_musicxml_ui"),
+}
+
+# set SAPE_WARMUP=1 to load CREPE and Basic Pitch before the first request
+if os.environ.get("SAPE_WARMUP") == "1":
+    get_model_registry().warm_up()
+
+# set SAPE_METRICS_PORT to expose span timings at http://<host>:<port>/metrics
+get_metrics_server()
+
+def render_model_metrics():
+    """Show model timings, cache counters, background jobs and recent traces in the sidebar."""
+    metrics = get_model_registry().metrics()
+    with st.sidebar.expander("Model metrics"):
+        if metrics:
+            st.json(metrics)
+        else:
+            st.write("No models loaded yet.")
+    with st.sidebar.expander("Result cache"):
+        st.json(get_result_cache().stats())
+    with st.sidebar.expander("Decoded audio"):
+        st.json(get_audio_cache().stats())
+    with st.sidebar.expander("Background jobs"):
+        st.json({'limits': get_job_queue().limits, 'jobs': get_job_queue().store.counts()})
+    if st.sidebar.checkbox("Show timing panel"):
+        st.subheader("Recent conversion timings")
+        render_timing_panel()
+
 def main():
     """Main application function."""
     st.title("SoundScape Studio")
@@ -20,27 +54,27 @@ def main():
 
     mode = st.selectbox(
         "Choose conversion mode:",
-        ["Whistle-to-Sheet","Audio-to-MIDI", "Draw-to-Music", "Image-to-MusicXML"],
+        list(MODES),
         label_visibility="collapsed"
     )
     st.markdown("<br>", unsafe_allow_html=True)
 
-    logging.info(f"Model path: {ICASSP_2022_MODEL_PATH}")
-    # purly for debugging purposes
-    if mode == "Audio-to-MIDI" and not os.path.exists(ICASSP_2022_MODEL_PATH):
-        st.error("Basic Pitch model path not found.")
-        st.stop()
-
     if mode == "Audio-to-MIDI":
-        render_audio_to_midi_ui()
-    elif mode == "Whistle-to-Sheet":
-        render_whistle_to_sheet_ui()
-    elif mode == "Draw-to-Music":
-        render_draw_to_music_ui()
-    elif mode == "Image-to-MusicXML":
-        render_image_to_musicxml_ui()
-    else:
+        from basic_pitch import ICASSP_2022_MODEL_PATH
+
+        logging.info(f"Model path: {ICASSP_2022_MODEL_PATH}")
+        # purly for debugging purposes
+        if not os.path.exists(ICASSP_2022_MODEL_PATH):
+            st.error("Basic Pitch model path not found.")
+            st.stop()
+
+    if mode not in MODES:
         st.error("Unknown mode selected.")
+    else:
+        module_name, render_name = MODES[mode]
+        getattr(importlib.import_module(module_name), render_name)()
+
+    render_model_metrics()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,131 @@
+import streamlit as st
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+import numpy as np
+from tracing import set_attributes, span
+
+DEFAULT_AUDIO_CACHE_MB = 256
+
+def decode_audio(audio_bytes):
+    """Decode audio bytes (or a memoryview) to mono float32 at the file's own rate; returns (audio, sr)."""
+    import soundfile as sf
+
+    with span("audio.decode", bytes=len(audio_bytes)):
+        try:
+            audio, sr = sf.read(BytesIO(audio_bytes), dtype='float32', always_2d=True)
+            # a mono file's only column is already contiguous float32, so it is used without a copy
+            audio = audio[:, 0] if audio.shape[1] == 1 else audio.mean(axis=1, dtype=np.float32)
+        except RuntimeError:
+            # formats libsndfile can't decode (e.g. MP3 on older builds) need audioread, which wants a file
+            import librosa
+            import tempfile
+
+            with tempfile.NamedTemporaryFile() as f:
+                f.write(audio_bytes)
+                f.flush()
+                audio, sr = librosa.load(f.name, sr=None, mono=True, dtype=np.float32)
+        set_attributes(samples=len(audio), sr=sr)
+    return audio, sr
+
+def resample(audio, orig_sr, target_sr):
+    """Resample mono float32 audio with soxr; returns the input itself when the rates match."""
+    if orig_sr == target_sr:
+        return audio
+    import soxr
+
+    with span("audio.resample", samples=len(audio), orig_sr=orig_sr, target_sr=target_sr):
+        return soxr.resample(np.asarray(audio, dtype=np.float32), orig_sr, target_sr, quality='HQ')
+
+class DecodedAudio:
+    """One decoded upload, with the resampled copies each model has asked for.
+
+    The buffers are read-only because they are shared between every model and
+    session that analyses the same bytes.
+    """
+
+    def __init__(self, audio, sr):
+        audio.flags.writeable = False
+        self.sr = sr
+        self._rates = {sr: audio}
+        self._lock = threading.Lock()
+
+    def at_rate(self, sr=None):
+        """The signal at sr (the native rate if None), resampled once on first use."""
+        sr = sr or self.sr
+        with self._lock:
+            if sr not in self._rates:
+                audio = resample(self._rates[self.sr], self.sr, sr)
+                audio.flags.writeable = False
+                self._rates[sr] = audio
+            return self._rates[sr]
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return sum(audio.nbytes for audio in self._rates.values())
+
+class AudioCache:
+    """In-memory LRU of decoded uploads keyed by their content, bounded by the bytes of all their buffers."""
+
+    def __init__(self, max_bytes=DEFAULT_AUDIO_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, audio_bytes):
+        """Return the DecodedAudio for these bytes, decoding them only if no model has yet."""
+        key = hashlib.sha256(memoryview(audio_bytes)).hexdigest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        entry = DecodedAudio(*decode_audio(audio_bytes))
+        with self._lock:
+            entry = self._entries.setdefault(key, entry)
+        return entry
+
+    def evict(self):
+        """Drop least recently used uploads until the buffers fit in max_bytes."""
+        with self._lock:
+            total = sum(entry.nbytes for entry in self._entries.values())
+            while total > self.max_bytes and len(self._entries) > 1:
+                _, entry = self._entries.popitem(last=False)
+                total -= entry.nbytes
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'mb': sum(entry.nbytes for entry in self._entries.values()) / (1024 * 1024),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+@st.cache_resource
+def get_audio_cache():
+    """Return the decoded-audio cache shared by every session in this process."""
+    max_mb = float(os.environ.get("SAPE_AUDIO_CACHE_MB", DEFAULT_AUDIO_CACHE_MB))
+    return AudioCache(int(max_mb * 1024 * 1024))
+
+def load_audio(audio_bytes, sr=None, use_cache=True):
+    """Mono float32 audio at sr (the file's own rate if None), decoded once and resampled once per rate.
+
+    Returns (audio, sr). With use_cache the read-only buffers are shared with
+    every other model that loads the same bytes.
+    """
+    if not use_cache:
+        audio, file_sr = decode_audio(audio_bytes)
+        return resample(audio, file_sr, sr or file_sr), sr or file_sr
+    cache = get_audio_cache()
+    entry = cache.get(audio_bytes)
+    audio = entry.at_rate(sr)
+    cache.evict()
+    return audio, sr or entry.sr
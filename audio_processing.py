@@ -1,29 +1,44 @@
 import streamlit as st
 import numpy as np
+import os
+import queue
+import threading
+from time import perf_counter
+from audio_io import resample
+from model_registry import get_model_registry
+from note_array import NOTE_NAMES, NoteArray
+from tracing import record_error, set_attributes, span
 
-def extract_pitch_from_audio(audio_data, sr=16000):
-    """Extract pitch using CREPE model."""
-    try:
-        import crepe
-        import librosa
-        
-        # Resample to 16kHz for CREPE
-        if sr != 16000:
-            audio_data = librosa.resample(audio_data, orig_sr=sr, target_sr=16000)
-            sr = 16000
-        
-        time, frequency, confidence, activation = crepe.predict(
-            audio_data, sr, viterbi=True, step_size=10
-        )
-        
-        frequency[confidence < 0.5] = 0
-        # this removes low confidence frequencies
-        # number can be adjusted on human feedback TODO!
-        
-        return time, frequency, confidence
-    except Exception as e:
-        st.error(f"Error extracting pitch: {e}")
-        return None, None, None
+CREPE_SAMPLE_RATE = 16000
+CREPE_WINDOW = 1024
+# concurrent CREPE requests are merged into model calls of up to this many frames,
+# waiting at most this many seconds for other requests to join
+CREPE_BATCH_FRAMES = 512
+CREPE_BATCH_WAIT = 0.005
+# whistling range searched by the DSP pitch backends, in Hz
+PITCH_FMIN = 200
+PITCH_FMAX = 4000
+
+def extract_pitch_from_audio(audio_data, sr=16000, step_size=10, viterbi=True, confidence_threshold=0.5,
+                             backend='crepe'):
+    """Extract pitch using the chosen backend (CREPE by default)."""
+    with span("pitch.extract", backend=backend, samples=len(audio_data), sr=sr):
+        try:
+            # the pitch backends run at 16kHz; callers that load audio at that rate skip this
+            audio_data = resample(audio_data, sr, CREPE_SAMPLE_RATE)
+            sr = CREPE_SAMPLE_RATE
+
+            time, frequency, confidence = run_pitch_backend(backend, audio_data, sr, step_size, viterbi)
+
+            frequency[confidence < confidence_threshold] = 0
+            # this removes low confidence frequencies; the hysteresis segmentation
+            # passes 0 and gates on confidence itself
+
+            return time, frequency, confidence
+        except Exception as e:
+            record_error(e)
+            st.error(f"Error extracting pitch: {e}")
+            return None, None, None
 
 def frequency_to_note_name(frequency):
     """Convert frequency to musical note name."""
@@ -41,54 +56,630 @@ def frequency_to_note_name(frequency):
         return f"{note_names[n]}{octave}"
     return None
 
-def process_whistle_audio(audio_data, sr=22050):
-    """Process whistled audio to extract musical notes."""
-    try:
-        time, frequency, confidence = extract_pitch_from_audio(audio_data, sr)
-        
-        if time is None:
-            return None
-        
-        # Segment into notes
-        notes = []
-        current_note = None
-        note_threshold = 50  # Hz threshold for note changes
-        min_duration = 0.1  # Minimum note duration in seconds
-        
-        for i, (t, f, c) in enumerate(zip(time, frequency, confidence)):
-            note_name = frequency_to_note_name(f) if f > 0 else None
-            
-            if current_note is None and note_name:
-                # Start new note
-                current_note = {
-                    'start_time': t,
-                    'note_name': note_name,
-                    'frequency': f,
-                    'end_time': t
-                }
-            elif current_note and note_name:
-                # Check if same note continues
-                if abs(f - current_note['frequency']) < note_threshold:
-                    current_note['end_time'] = t
-                else:
-                    # End current note and start new one
-                    if current_note['end_time'] - current_note['start_time'] >= min_duration:
-                        notes.append(current_note)
-                    current_note = {
-                        'start_time': t,
-                        'note_name': note_name,
-                        'frequency': f,
-                        'end_time': t
-                    }
-            elif current_note and not note_name:
-                if current_note['end_time'] - current_note['start_time'] >= min_duration:
-                    notes.append(current_note)
-                current_note = None
-        
-        if current_note and current_note['end_time'] - current_note['start_time'] >= min_duration:
-            notes.append(current_note)
-        
-        return notes
-    except Exception as e:
-        st.error(f"Error processing whistle audio: {e}")
+def autocorrelation_pitch(frames, sr=16000, fmin=200, fmax=4000, threshold=0.15):
+    """Estimate one pitch per frame with a vectorized YIN (normalized autocorrelation difference).
+
+    frames is a (n_frames, frame_length) array and frame_length should cover
+    at least two periods of fmin. Returns frequency (0 where unvoiced) and a
+    confidence in [0, 1] for every frame.
+    """
+    frames = np.atleast_2d(np.asarray(frames, dtype=np.float64))
+    n_frames, frame_length = frames.shape
+    tau_min = max(2, int(np.floor(sr / fmax)))
+    tau_max = min(int(np.ceil(sr / fmin)), frame_length // 2)
+    width = frame_length - tau_max
+
+    # difference function d(tau) = e(0) + e(tau) - 2 r(tau), with r from one FFT per frame
+    n_fft = 1 << int(np.ceil(np.log2(frame_length + width)))
+    spectrum = np.fft.rfft(frames, n_fft, axis=1)
+    reference = np.fft.rfft(frames[:, :width], n_fft, axis=1)
+    correlation = np.fft.irfft(spectrum * np.conj(reference), n_fft, axis=1)[:, :tau_max + 1]
+    energy = np.concatenate([np.zeros((n_frames, 1)), np.cumsum(frames ** 2, axis=1)], axis=1)
+    lags = np.arange(tau_max + 1)
+    shifted_energy = energy[:, lags + width] - energy[:, lags]
+    difference = np.maximum(energy[:, [width]] + shifted_energy - 2 * correlation, 0)
+
+    # cumulative mean normalized difference
+    cumulative = np.cumsum(difference[:, 1:], axis=1)
+    normalized = np.ones_like(difference)
+    normalized[:, 1:] = difference[:, 1:] * lags[1:] / np.maximum(cumulative, 1e-12)
+
+    # first local minimum under the threshold, falling back to the global minimum
+    search = normalized[:, tau_min:tau_max]
+    neighbours = normalized[:, tau_min - 1:tau_max + 1]
+    is_minimum = (search <= neighbours[:, :-2]) & (search <= neighbours[:, 2:])
+    candidates = is_minimum & (search < threshold)
+    has_candidate = candidates.any(axis=1)
+    tau = np.where(has_candidate, np.argmax(candidates, axis=1), np.argmin(search, axis=1)) + tau_min
+
+    # parabolic interpolation around the chosen lag
+    rows = np.arange(n_frames)
+    left = normalized[rows, tau - 1]
+    centre = normalized[rows, tau]
+    right = normalized[rows, np.minimum(tau + 1, tau_max)]
+    curvature = left - 2 * centre + right
+    shift = np.where(np.abs(curvature) > 1e-12, 0.5 * (left - right) / np.where(curvature == 0, 1, curvature), 0)
+    shift = np.clip(shift, -1, 1)
+
+    frequency = sr / (tau + shift)
+    confidence = np.clip(1 - centre, 0, 1)
+    silent = np.sqrt(np.mean(frames ** 2, axis=1)) < 1e-4
+    voiced = has_candidate & ~silent
+    frequency[~voiced] = 0
+    confidence[silent] = 0
+    return frequency, confidence
+
+def crepe_frames(audio_data, step_size=10):
+    """Frame 16 kHz audio the way crepe.get_activation does: centred, one normalized window per hop."""
+    audio = np.pad(np.asarray(audio_data, dtype=np.float32), CREPE_WINDOW // 2)
+    hop_length = int(CREPE_SAMPLE_RATE * step_size / 1000)
+    frames = np.lib.stride_tricks.sliding_window_view(audio, CREPE_WINDOW)[::hop_length].copy()
+    frames -= frames.mean(axis=1, keepdims=True)
+    frames /= np.clip(frames.std(axis=1, keepdims=True), 1e-8, None)
+    return frames
+
+class _BatchRequest:
+    def __init__(self, frames):
+        self.frames = frames
+        self.activation = None
+        self.error = None
+        self.done = threading.Event()
+
+class CrepeBatcher:
+    """Micro-batching scheduler that runs the framed audio of concurrent requests through CREPE together.
+
+    A worker thread takes the first waiting request, then keeps collecting
+    requests for up to max_wait seconds or until batch_size frames are
+    queued, runs them as one model call and hands every caller its own rows
+    of the activation. Long recordings are split into batch_size chunks, so
+    short requests can share a call with the tail of a long one.
+    """
+
+    def __init__(self, model, name="crepe", batch_size=CREPE_BATCH_FRAMES, max_wait=CREPE_BATCH_WAIT):
+        self.model = model
+        self.name = name
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._carry = None
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'batches': 0, 'frames': 0, 'wait_seconds': 0.0}
+        threading.Thread(target=self._worker, name=f"{name}-batcher", daemon=True).start()
+
+    def activation(self, frames):
+        """Return the model activation for frames, shape (n_frames, 360), blocking until it is computed."""
+        if len(frames) == 0:
+            return np.zeros((0, 360), dtype=np.float32)
+        requests = [_BatchRequest(frames[start:start + self.batch_size])
+                    for start in range(0, len(frames), self.batch_size)]
+        with self._lock:
+            self._stats['requests'] += 1
+        for request in requests:
+            self._queue.put(request)
+        for request in requests:
+            request.done.wait()
+            if request.error is not None:
+                raise request.error
+        return np.concatenate([request.activation for request in requests])
+
+    def _collect(self):
+        """Block for the first request, then gather more until the batch is full or max_wait has passed."""
+        if self._carry is not None:
+            batch, self._carry = [self._carry], None
+        else:
+            batch = [self._queue.get()]
+        n_frames = len(batch[0].frames)
+        start = perf_counter()
+        while n_frames < self.batch_size:
+            remaining = start + self.max_wait - perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if n_frames + len(request.frames) > self.batch_size:
+                self._carry = request
+                break
+            batch.append(request)
+            n_frames += len(request.frames)
+        return batch, n_frames, perf_counter() - start
+
+    def _worker(self):
+        while True:
+            batch, n_frames, waited = self._collect()
+            try:
+                frames = np.concatenate([request.frames for request in batch])
+                with span("crepe.batch", frames=n_frames, requests=len(batch)), \
+                        get_model_registry().track_inference(self.name):
+                    activation = self.model.predict(frames, batch_size=len(frames), verbose=0)
+                start = 0
+                for request in batch:
+                    request.activation = activation[start:start + len(request.frames)]
+                    start += len(request.frames)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            with self._lock:
+                self._stats['batches'] += 1
+                self._stats['frames'] += n_frames
+                self._stats['wait_seconds'] += waited
+            for request in batch:
+                request.done.set()
+
+    def stats(self):
+        """Requests served, model calls made and the mean frames per call."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['mean_batch_frames'] = stats['frames'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+@st.cache_resource
+def get_crepe_batcher(capacity='full'):
+    """Return the CREPE batcher shared by every session in this process.
+
+    SAPE_CREPE_BATCH sets the most frames per model call and
+    SAPE_CREPE_BATCH_WAIT_MS how long a call waits for other requests.
+    """
+    model = get_model_registry().get_crepe_model(capacity)
+    return CrepeBatcher(
+        model, f"crepe-{capacity}",
+        batch_size=int(os.environ.get("SAPE_CREPE_BATCH", CREPE_BATCH_FRAMES)),
+        max_wait=float(os.environ.get("SAPE_CREPE_BATCH_WAIT_MS", CREPE_BATCH_WAIT * 1000)) / 1000
+    )
+
+def _crepe_backend(capacity):
+    def estimate(audio_data, sr, step_size, viterbi):
+        import crepe.core
+
+        activation = get_crepe_batcher(capacity).activation(crepe_frames(audio_data, step_size))
+        confidence = activation.max(axis=1)
+        if viterbi:
+            cents = crepe.core.to_viterbi_cents(activation)
+        else:
+            cents = crepe.core.to_local_average_cents(activation)
+        frequency = 10 * 2 ** (cents / 1200)
+        frequency[np.isnan(frequency)] = 0
+        time = np.arange(len(confidence)) * step_size / 1000.0
+        return time, frequency, confidence
+    return estimate
+
+def _pyin_backend(audio_data, sr, step_size, viterbi):
+    import librosa
+
+    hop_length = int(sr * step_size / 1000)
+    f0, voiced, voiced_probability = librosa.pyin(
+        audio_data, fmin=PITCH_FMIN, fmax=PITCH_FMAX, sr=sr, frame_length=1024, hop_length=hop_length
+    )
+    frequency = np.where(voiced, np.nan_to_num(f0), 0)
+    time = np.arange(len(frequency)) * step_size / 1000.0
+    return time, frequency, voiced_probability
+
+def _autocorrelation_backend(audio_data, sr, step_size, viterbi):
+    hop_length = int(sr * step_size / 1000)
+    frame_length = 1024
+    # centred frames like CREPE and pyin, so frame i sits at i * step_size
+    padded = np.pad(np.asarray(audio_data, dtype=np.float64), frame_length // 2)
+    frames = np.lib.stride_tricks.sliding_window_view(padded, frame_length)[::hop_length]
+
+    frequency = np.zeros(len(frames))
+    confidence = np.zeros(len(frames))
+    block = 1024  # frames per call, bounds the FFT working memory on long recordings
+    for start in range(0, len(frames), block):
+        frequency[start:start + block], confidence[start:start + block] = autocorrelation_pitch(
+            frames[start:start + block], sr, PITCH_FMIN, PITCH_FMAX
+        )
+    time = np.arange(len(frequency)) * step_size / 1000.0
+    return time, frequency, confidence
+
+# every backend takes (audio_data, sr, step_size, viterbi) at 16 kHz and returns
+# (time, frequency, confidence) with one frame per step_size milliseconds
+PITCH_BACKENDS = {
+    'crepe': _crepe_backend('full'),
+    'crepe-tiny': _crepe_backend('tiny'),
+    'pyin': _pyin_backend,
+    'autocorr': _autocorrelation_backend,
+}
+
+def run_pitch_backend(backend, audio_data, sr, step_size=10, viterbi=True):
+    """Run one of PITCH_BACKENDS and record its inference time in the model registry."""
+    with span("pitch.inference", backend=backend, samples=len(audio_data)):
+        if backend not in PITCH_BACKENDS:
+            raise ValueError(f"Unknown pitch backend '{backend}', expected one of {sorted(PITCH_BACKENDS)}")
+        with get_model_registry().track_inference(f"pitch-{backend}"):
+            return PITCH_BACKENDS[backend](audio_data, sr, step_size, viterbi)
+
+def frequencies_to_midi(frequency):
+    """Convert an array of frequencies to MIDI note numbers (-1 where unvoiced)."""
+    frequency = np.asarray(frequency, dtype=np.float64)
+    A4 = 440
+    C0 = A4 * np.power(2, -4.75)
+
+    voiced = frequency > C0
+    midi = np.full(frequency.shape, -1, dtype=np.int64)
+    # same rounding as frequency_to_note_name (round half to even), offset so C0 -> 12
+    midi[voiced] = np.rint(12 * np.log2(frequency[voiced] / C0)).astype(np.int64) + 12
+    return midi
+
+def midi_to_note_name(midi):
+    """Convert a MIDI note number to a note name, matching frequency_to_note_name."""
+    if midi < 0:
         return None
+    return f"{NOTE_NAMES[midi % 12]}{midi // 12 - 1}"
+
+def _find_runs(mask):
+    """Return start and stop indices of the True runs in a boolean array."""
+    edges = np.diff(np.concatenate(([False], mask, [False])).astype(np.int8))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+def _split_run(frequency, run_start, run_stop, note_threshold):
+    """Split one voiced run into notes wherever the pitch leaves the note's start frequency."""
+    starts = []
+    s = run_start
+    while s < run_stop:
+        starts.append(s)
+        # search ahead in growing windows so long stable notes stay linear-time
+        next_start = None
+        lo, step = s + 1, 64
+        while lo < run_stop:
+            hi = min(run_stop, lo + step)
+            changed = np.flatnonzero(~(np.abs(frequency[lo:hi] - frequency[s]) < note_threshold))
+            if changed.size:
+                next_start = lo + changed[0]
+                break
+            lo, step = hi, step * 2
+        if next_start is None:
+            break
+        s = next_start
+    return starts
+
+def segment_notes(time, frequency, confidence=None, note_threshold=50, min_duration=0.1):
+    """Segment a pitch track into a NoteArray using array operations."""
+    with span("notes.segment", frames=len(frequency)):
+        time = np.asarray(time)
+        frequency = np.asarray(frequency)
+        midi = frequencies_to_midi(frequency)
+
+        # run-length encode the voiced regions, then split each on pitch changes
+        run_starts, run_stops = _find_runs(midi >= 0)
+        starts = []
+        for run_start, run_stop in zip(run_starts, run_stops):
+            starts.extend(_split_run(frequency, run_start, run_stop, note_threshold))
+        if not starts:
+            return NoteArray()
+
+        starts = np.asarray(starts, dtype=np.int64)
+        # a note ends on the frame before the next note starts, or at the end of its run
+        next_starts = np.append(starts[1:], len(frequency))
+        run_ends = run_stops[np.searchsorted(run_stops, starts, side='right')]
+        ends = np.minimum(next_starts, run_ends) - 1
+
+        keep = time[ends] - time[starts] >= min_duration
+        starts, ends = starts[keep], ends[keep]
+        if confidence is None:
+            note_confidence = 1.0
+        else:
+            # mean confidence over each note's frames
+            cumulative = np.concatenate([[0.0], np.cumsum(confidence, dtype=np.float64)])
+            note_confidence = (cumulative[ends + 1] - cumulative[starts]) / (ends + 1 - starts)
+        notes = NoteArray(midi[starts], time[starts], time[ends], confidence=note_confidence)
+        set_attributes(notes=len(notes))
+        return notes
+
+# defaults of the hysteresis segmentation; confidences are the pitch backend's, 0 to 1
+HYSTERESIS_PARAMS = {
+    'on_confidence': 0.6,  # a voiced region starts once confidence reaches this
+    'off_confidence': 0.35,  # and lasts until it drops below this
+    'median_frames': 5,  # median filter over the voiced mask, in frames
+    'split_cents': 70,  # a held departure this far from the note's pitch starts a new note
+    'onset_threshold': 0.5,  # onset strength peaks above this, relative to the loudest, re-attack a note
+}
+
+def onset_strength(audio_data, sr=16000, step_size=10):
+    """Spectral-flux onset strength scaled to a peak of 1, with one value per pitch frame."""
+    import librosa
+
+    hop_length = int(sr * step_size / 1000)
+    with span("notes.onsets", samples=len(audio_data)):
+        envelope = librosa.onset.onset_strength(y=np.asarray(audio_data, dtype=np.float32), sr=sr,
+                                                hop_length=hop_length, center=True)
+    peak = envelope.max() if len(envelope) else 0.0
+    return envelope / peak if peak > 0 else envelope
+
+def _voicing_off(frequency, confidence, off_confidence):
+    return ~(frequency > 0) | (confidence < off_confidence)
+
+def hysteresis_voicing(frequency, confidence, on_confidence=0.6, off_confidence=0.35, median_frames=5):
+    """Voiced mask from a Schmitt trigger on confidence, with flickers removed by a median filter.
+
+    Frames at or above on_confidence switch voicing on, frames below
+    off_confidence or without a pitch switch it off, and frames in between
+    keep the previous state; this is a forward fill of the last switching
+    frame, so it runs in one vectorized pass.
+    """
+    from scipy.ndimage import median_filter
+
+    frequency = np.asarray(frequency, dtype=np.float64)
+    confidence = np.asarray(confidence, dtype=np.float64)
+    on = (frequency > 0) & (confidence >= on_confidence)
+    off = _voicing_off(frequency, confidence, off_confidence)
+    last_switch = np.where(on | off, np.arange(len(on)), -1)
+    np.maximum.accumulate(last_switch, out=last_switch)
+    voiced = (last_switch >= 0) & on[np.maximum(last_switch, 0)]
+    if median_frames > 1 and len(voiced):
+        # the median of a boolean window is its majority
+        voiced = median_filter(voiced.astype(np.uint8), size=median_frames, mode='nearest').astype(bool)
+    return voiced
+
+def _fill_cents(frequency, voiced, run_starts, run_stops):
+    """Pitch in cents (MIDI number * 100) of every voiced frame, filled from its run's nearest pitched frame."""
+    n = len(frequency)
+    valid = frequency > 0
+    cents = np.full(n, np.nan)
+    cents[valid] = 1200 * np.log2(frequency[valid] / 440.0) + 6900
+    previous = np.where(valid, np.arange(n), -1)
+    np.maximum.accumulate(previous, out=previous)
+    following = np.where(valid, np.arange(n), n)
+    following = np.minimum.accumulate(following[::-1])[::-1]
+    run_start = np.zeros(n, dtype=np.int64)
+    run_start[voiced] = np.repeat(run_starts, run_stops - run_starts)
+    source = np.where(previous >= run_start, previous, following)
+    filled = np.full(n, np.nan)
+    usable = voiced & (source < n)
+    filled[usable] = cents[source[usable]]
+    return filled
+
+def _first_held_departure(cents, lo, stop, anchor, split_cents, hold):
+    """First frame from lo on where cents stay more than split_cents from anchor for hold frames."""
+    step = 64
+    while lo < stop:
+        hi = min(stop, lo + step)
+        # look hold - 1 frames past hi so departures starting just before it are seen whole
+        window = cents[lo:min(stop, hi + hold - 1)]
+        departed = ~(np.abs(window - anchor) <= split_cents)
+        if len(departed) >= hold:
+            held = np.convolve(departed, np.ones(hold, dtype=np.int64), 'valid') == hold
+            found = np.flatnonzero(held[:hi - lo])
+            if found.size:
+                return lo + found[0]
+        lo, step = hi, step * 2
+    return None
+
+def _split_cents(cents, run_start, run_stop, split_cents, hold):
+    """Note starts within one voiced run and the pitch each started at, in linear time like _split_run."""
+    starts, anchors = [], []
+    s = run_start
+    while s < run_stop:
+        anchor = np.nanmedian(cents[s:min(run_stop, s + hold)])
+        starts.append(s)
+        anchors.append(anchor)
+        s = _first_held_departure(cents, s + 1, run_stop, anchor, split_cents, hold)
+        if s is None:
+            break
+    return starts, anchors
+
+def _onset_peaks(strength, threshold):
+    """Frames where the onset strength has a local maximum of at least threshold."""
+    strength = np.asarray(strength, dtype=np.float64)
+    padded = np.concatenate([[-np.inf], strength, [-np.inf]])
+    return (strength >= threshold) & (strength >= padded[:-2]) & (strength > padded[2:])
+
+def segment_notes_hysteresis(time, frequency, confidence, onset_strength=None, min_duration=0.1,
+                             on_confidence=0.6, off_confidence=0.35, median_frames=5, split_cents=70,
+                             onset_threshold=0.5):
+    """Segment a pitch track into a NoteArray with voicing hysteresis and pitch changes measured in cents.
+
+    frequency should not be gated by confidence beforehand. Notes split
+    where the pitch moves more than split_cents away from the note's pitch
+    for median_frames frames, so vibrato and single-frame glitches stay in
+    one note, and at onset strength peaks, so a re-attacked pitch becomes a
+    new note. A note's pitch is the confidence-weighted mean of its frames.
+    """
+    with span("notes.segment", frames=len(frequency), method="hysteresis"):
+        time = np.asarray(time)
+        frequency = np.asarray(frequency, dtype=np.float64)
+        confidence = np.asarray(confidence, dtype=np.float64)
+        hold = max(1, median_frames)
+
+        voiced = hysteresis_voicing(frequency, confidence, on_confidence, off_confidence, median_frames)
+        run_starts, run_stops = _find_runs(voiced)
+        cents = _fill_cents(frequency, voiced, run_starts, run_stops)
+        onsets = (np.flatnonzero(_onset_peaks(onset_strength[:len(frequency)], onset_threshold))
+                  if onset_strength is not None else np.zeros(0, dtype=np.int64))
+
+        starts, anchors = [], []
+        for run_start, run_stop in zip(run_starts, run_stops):
+            # re-attacks split the run first; each piece is then split on pitch
+            inner = onsets[(onsets >= run_start + hold) & (onsets < run_stop)]
+            bounds = np.concatenate([[run_start], inner, [run_stop]])
+            for piece_start, piece_stop in zip(bounds[:-1], bounds[1:]):
+                piece_starts, piece_anchors = _split_cents(cents, piece_start, piece_stop, split_cents, hold)
+                starts.extend(piece_starts)
+                anchors.extend(piece_anchors)
+        if not starts:
+            return NoteArray()
+
+        starts = np.asarray(starts, dtype=np.int64)
+        anchors = np.asarray(anchors, dtype=np.float64)
+        next_starts = np.append(starts[1:], len(frequency))
+        run_ends = run_stops[np.searchsorted(run_stops, starts, side='right')]
+        ends = np.minimum(next_starts, run_ends) - 1
+
+        # frames further than split_cents from their note's pitch, such as octave errors
+        # or glides at the edges, get no say in the note's pitch
+        lengths = ends + 1 - starts
+        frames = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        outlier = np.zeros(len(frequency), dtype=bool)
+        outlier[frames] = ~(np.abs(cents[frames] - np.repeat(anchors, lengths)) <= split_cents)
+
+        keep = time[ends] - time[starts] >= min_duration
+        starts, ends = starts[keep], ends[keep]
+
+        # confidence-weighted mean pitch and mean confidence of every note, from running sums
+        weights = np.where(np.isnan(cents) | outlier, 0.0, confidence)
+        weighted_cents = np.concatenate([[0.0], np.cumsum(np.nan_to_num(cents) * weights)])
+        total_weight = np.concatenate([[0.0], np.cumsum(weights)])
+        total_confidence = np.concatenate([[0.0], np.cumsum(confidence)])
+        note_weight = total_weight[ends + 1] - total_weight[starts]
+        pitched = note_weight > 0
+        starts, ends, note_weight = starts[pitched], ends[pitched], note_weight[pitched]
+        mean_cents = (weighted_cents[ends + 1] - weighted_cents[starts]) / note_weight
+        notes = NoteArray(
+            np.clip(np.rint(mean_cents / 100), 0, 127),
+            time[starts], time[ends],
+            confidence=(total_confidence[ends + 1] - total_confidence[starts]) / (ends + 1 - starts)
+        )
+        set_attributes(notes=len(notes))
+        return notes
+
+def segment_pitch_track(time, frequency, confidence, segmentation='hysteresis', min_duration=0.1,
+                        note_threshold=50, onset_strength=None, **hysteresis_params):
+    """Segment with the hysteresis method (default) or the legacy fixed note_threshold in Hz."""
+    if segmentation == 'hysteresis':
+        return segment_notes_hysteresis(time, frequency, confidence, onset_strength, min_duration,
+                                        **hysteresis_params)
+    if segmentation == 'legacy':
+        return segment_notes(time, frequency, confidence, note_threshold, min_duration)
+    raise ValueError(f"Unknown segmentation '{segmentation}', expected 'hysteresis' or 'legacy'")
+
+def process_whistle_audio(audio_data, sr=22050, step_size=10, viterbi=True, confidence_threshold=0.5,
+                          note_threshold=50, min_duration=0.1, backend='crepe', segmentation='hysteresis',
+                          **hysteresis_params):
+    """Process whistled audio to extract musical notes.
+
+    confidence_threshold and note_threshold only apply to the legacy
+    segmentation; hysteresis_params override HYSTERESIS_PARAMS.
+    """
+    with span("whistle.process", backend=backend, samples=len(audio_data), sr=sr):
+        try:
+            audio_data = resample(audio_data, sr, CREPE_SAMPLE_RATE)
+            if segmentation == 'hysteresis':
+                # the segmentation gates on confidence itself
+                confidence_threshold = 0.0
+            time, frequency, confidence = extract_pitch_from_audio(
+                audio_data, CREPE_SAMPLE_RATE, step_size, viterbi, confidence_threshold, backend
+            )
+
+            if time is None:
+                return None
+
+            strength = None
+            if segmentation == 'hysteresis':
+                strength = onset_strength(audio_data, CREPE_SAMPLE_RATE, step_size)
+            return segment_pitch_track(time, frequency, confidence, segmentation, min_duration, note_threshold,
+                                       strength, **dict(HYSTERESIS_PARAMS, **hysteresis_params))
+        except Exception as e:
+            record_error(e)
+            st.error(f"Error processing whistle audio: {e}")
+            return None
+
+def stream_pitch_track(source, block_seconds=10.0, overlap_seconds=0.5, step_size=10, viterbi=True,
+                       confidence_threshold=0.5, backend='crepe'):
+    """Yield (time, frequency, confidence) chunks of a file's pitch track, block by block.
+
+    The file is read and resampled incrementally, so memory stays bounded by
+    the block size. Each block is analysed with overlap_seconds of audio on
+    both sides so frames near block edges match a whole-file analysis.
+    """
+    import soundfile as sf
+
+    hop = int(CREPE_SAMPLE_RATE * step_size / 1000)
+    overlap = max(1, int(round(overlap_seconds * CREPE_SAMPLE_RATE / hop))) * hop
+    buffer = np.zeros(0, dtype=np.float32)
+    buffer_start = 0  # 16 kHz sample index of buffer[0], always a multiple of hop
+    emitted_until = 0  # position of the next frame to yield
+
+    with sf.SoundFile(source) as f:
+        resampler = None
+        if f.samplerate != CREPE_SAMPLE_RATE:
+            import soxr
+            resampler = soxr.ResampleStream(f.samplerate, CREPE_SAMPLE_RATE, 1, dtype='float32')
+        blocksize = max(1, int(block_seconds * f.samplerate))
+
+        while True:
+            block = f.read(blocksize, dtype='float32', always_2d=True)
+            last = len(block) < blocksize
+            mono = block.mean(axis=1, dtype=np.float32)
+            if resampler is not None:
+                mono = resampler.resample_chunk(mono, last=last)
+            buffer = np.concatenate([buffer, mono])
+
+            # hold back the last `overlap` samples until the next block gives them right context
+            emit_stop = buffer_start + len(buffer) if last else buffer_start + len(buffer) - overlap
+            if emit_stop > emitted_until and len(buffer) > 0:
+                _, frequency, confidence = run_pitch_backend(
+                    backend, buffer, CREPE_SAMPLE_RATE, step_size, viterbi
+                )
+                positions = buffer_start + np.arange(len(frequency)) * hop
+                selected = (positions >= emitted_until) & (positions < emit_stop)
+                frequency[confidence < confidence_threshold] = 0
+                yield positions[selected] / CREPE_SAMPLE_RATE, frequency[selected], confidence[selected]
+                emitted_until = -(-emit_stop // hop) * hop
+
+            if last:
+                break
+
+            # keep `overlap` samples of left context before the next frame to emit
+            keep_from = max(buffer_start, emitted_until - overlap)
+            buffer = buffer[keep_from - buffer_start:]
+            buffer_start = keep_from
+
+def _final_frames(frequency, confidence, segmentation, off_confidence, median_frames):
+    """How many leading frames segment the same on their own as within the whole track."""
+    if segmentation == 'legacy':
+        # legacy notes never continue through an unvoiced frame
+        unvoiced = np.flatnonzero(frequencies_to_midi(frequency) < 0)
+        return unvoiced[-1] + 1 if unvoiced.size else 0
+    # the voicing restarts after a switch-off frame, and the median filter needs
+    # half its window of switched-off frames on both sides of the cut
+    half = median_frames // 2
+    run_starts, run_stops = _find_runs(_voicing_off(frequency, confidence, off_confidence))
+    long_enough = run_stops - run_starts >= max(2 * half, 1)
+    return run_stops[long_enough][-1] - half if long_enough.any() else 0
+
+def segment_notes_stream(pitch_chunks, note_threshold=50, min_duration=0.1, segmentation='hysteresis',
+                         **hysteresis_params):
+    """Yield NoteArrays of the notes in an iterable of pitch track chunks as soon as they are final.
+
+    Notes never continue through unvoiced frames, so the track up to a
+    stretch of them can be segmented on its own; the rest waits for the
+    next chunk. Concatenated, the notes are the same as segment_pitch_track()
+    on the whole track, except that no onset strength is used. Chunks that
+    complete no note yield nothing.
+    """
+    params = dict(HYSTERESIS_PARAMS, **hysteresis_params)
+    pending_time = np.zeros(0)
+    pending_frequency = np.zeros(0)
+    pending_confidence = np.zeros(0)
+
+    for time, frequency, confidence in pitch_chunks:
+        pending_time = np.concatenate([pending_time, time])
+        pending_frequency = np.concatenate([pending_frequency, frequency])
+        pending_confidence = np.concatenate([pending_confidence, confidence])
+
+        cut = _final_frames(pending_frequency, pending_confidence, segmentation, params['off_confidence'],
+                            params['median_frames'])
+        if cut:
+            notes = segment_pitch_track(
+                pending_time[:cut], pending_frequency[:cut], pending_confidence[:cut],
+                segmentation, min_duration, note_threshold, **params
+            )
+            if len(notes):
+                yield notes
+            pending_time = pending_time[cut:]
+            pending_frequency = pending_frequency[cut:]
+            pending_confidence = pending_confidence[cut:]
+
+    notes = segment_pitch_track(pending_time, pending_frequency, pending_confidence, segmentation, min_duration,
+                                note_threshold, **params)
+    if len(notes):
+        yield notes
+
+def stream_whistle_notes(source, block_seconds=10.0, overlap_seconds=0.5, step_size=10, viterbi=True,
+                         confidence_threshold=0.5, note_threshold=50, min_duration=0.1, backend='crepe',
+                         segmentation='hysteresis', **hysteresis_params):
+    """Yield NoteArrays of whistled notes from an audio file or file-like object while it is still being read."""
+    if segmentation == 'hysteresis':
+        confidence_threshold = 0.0
+    pitch_chunks = stream_pitch_track(
+        source, block_seconds, overlap_seconds, step_size, viterbi, confidence_threshold, backend
+    )
+    yield from segment_notes_stream(pitch_chunks, note_threshold, min_duration, segmentation, **hysteresis_params)
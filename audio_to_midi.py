@@ -1,46 +1,156 @@
 import streamlit as st
-import tempfile
 import os
-import traceback
-from basic_pitch.inference import predict_and_save
-from basic_pitch import ICASSP_2022_MODEL_PATH
+import numpy as np
 from audio_recorder_streamlit import audio_recorder
-
-def process_audio(audio_file_path, output_directory, source_filename="input_audio"):
-    """Processes an audio file and save the MIDI output."""
-    try:
-        model_path_to_load = ICASSP_2022_MODEL_PATH
-        
-        with st.status("Converting audio to MIDI...") as status:
-            if not os.path.exists(model_path_to_load):
-                st.error(f"Model path not found at {model_path_to_load}")
-                return None, None
-
-            status.update(label="Generating MIDI transcription...")
-            predict_and_save(
-                [audio_file_path],
-                output_directory,
-                True,    # save_midi
-                False,   # sonify_midi
-                False,   # save_model_outputs
-                False,   # save_notes
-                model_path_to_load
+from audio_io import load_audio
+from midi_utils import midi_to_bytes
+from model_registry import get_model_registry
+from result_cache import get_result_cache
+from job_queue import get_job_queue, render_job
+from tracing import set_attributes, span
+
+def transcribe_audio_array(audio, model, onset_threshold=0.5, frame_threshold=0.3, minimum_note_length=127.70,
+                           batch_size=1):
+    """Run Basic Pitch on mono float32 audio at its 22050 Hz rate; returns (midi_data, note_events).
+
+    Mirrors basic_pitch.inference.predict, but takes the samples directly
+    instead of a file path. batch_size > 1 runs several windows per model
+    call, which the TensorFlow SavedModel supports but TFLite does not.
+    """
+    from basic_pitch.constants import AUDIO_N_SAMPLES, AUDIO_SAMPLE_RATE, FFT_HOP
+    from basic_pitch.inference import unwrap_output, window_audio_file
+    from basic_pitch.note_creation import model_output_to_notes
+
+    n_overlapping_frames = 30
+    overlap_len = n_overlapping_frames * FFT_HOP
+    hop_size = AUDIO_N_SAMPLES - overlap_len
+
+    audio = np.asarray(audio, dtype=np.float32)
+    padded = np.concatenate([np.zeros(overlap_len // 2, dtype=np.float32), audio])
+    windows = [window for window, _ in window_audio_file(padded, hop_size)]
+
+    output = {"note": [], "onset": [], "contour": []}
+    with span("basic_pitch.inference", samples=len(audio), windows=len(windows), batch_size=batch_size):
+        for start in range(0, len(windows), batch_size):
+            batch = np.stack(windows[start:start + batch_size])
+            for key, value in model.predict(batch).items():
+                output[key].append(value)
+    unwrapped = {
+        key: unwrap_output(np.concatenate(values), len(audio), n_overlapping_frames)
+        for key, values in output.items()
+    }
+
+    min_note_len = int(np.round(minimum_note_length / 1000 * (AUDIO_SAMPLE_RATE / FFT_HOP)))
+    with span("basic_pitch.notes"):
+        midi_data, note_events = model_output_to_notes(
+            unwrapped,
+            onset_thresh=onset_threshold,
+            frame_thresh=frame_threshold,
+            min_note_len=min_note_len,
+            min_freq=None,
+            max_freq=None,
+            multiple_pitch_bends=False,
+            melodia_trick=True,
+        )
+        set_attributes(notes=len(note_events))
+    return midi_data, note_events
+
+def basic_pitch_model_path():
+    """Path of the Basic Pitch model; importing basic_pitch is deferred because it loads TensorFlow."""
+    from basic_pitch import ICASSP_2022_MODEL_PATH
+    return ICASSP_2022_MODEL_PATH
+
+def audio_bytes_to_midi(audio_bytes, onset_threshold=0.5, frame_threshold=0.3, minimum_note_length=127.70,
+                        use_cache=True, parallel='auto'):
+    """Transcribe encoded audio bytes to MIDI bytes with Basic Pitch, entirely in memory.
+
+    parallel='auto' splits recordings longer than PARALLEL_MIN_SECONDS into
+    windows transcribed across the worker pool; True always does, False never.
+    """
+    with span("basic_pitch.transcribe", bytes=len(audio_bytes)):
+        return _audio_bytes_to_midi(audio_bytes, onset_threshold, frame_threshold, minimum_note_length,
+                                    use_cache, parallel)
+
+def _use_parallel(parallel, n_samples, sr):
+    from basic_pitch_parallel import PARALLEL_MIN_SECONDS, default_workers
+
+    if parallel == 'auto':
+        return n_samples / sr > PARALLEL_MIN_SECONDS and default_workers() > 1
+    return bool(parallel)
+
+def _audio_bytes_to_midi(audio_bytes, onset_threshold, frame_threshold, minimum_note_length, use_cache,
+                         parallel):
+    from basic_pitch.constants import AUDIO_SAMPLE_RATE
+
+    # the samples decide whether the windowed path runs, and its notes differ slightly at the seams
+    audio, _ = load_audio(audio_bytes, AUDIO_SAMPLE_RATE, use_cache)
+    use_parallel = _use_parallel(parallel, len(audio), AUDIO_SAMPLE_RATE)
+
+    cache = get_result_cache() if use_cache else None
+    if cache is not None:
+        params = {
+            'model_path': os.path.basename(basic_pitch_model_path()),
+            'onset_threshold': onset_threshold,
+            'frame_threshold': frame_threshold,
+            'minimum_note_length': minimum_note_length,
+            'parallel': use_parallel,
+        }
+        if use_parallel:
+            from basic_pitch_parallel import OVERLAP_SECONDS, SEGMENT_SECONDS
+
+            params.update(segment_seconds=SEGMENT_SECONDS, overlap_seconds=OVERLAP_SECONDS)
+        cache_key = cache.make_key(audio_bytes, "basic-pitch", params)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            set_attributes(from_cache=True)
+            return cached['midi_bytes']
+
+    registry = get_model_registry()
+    if use_parallel:
+        from basic_pitch_parallel import transcribe_parallel
+
+        with span("basic_pitch.parallel", seconds=len(audio) / AUDIO_SAMPLE_RATE), \
+                registry.track_inference("basic-pitch"):
+            midi_data, note_events = transcribe_parallel(audio, AUDIO_SAMPLE_RATE, onset_threshold,
+                                                         frame_threshold, minimum_note_length)
+    else:
+        model = registry.get_basic_pitch_model(basic_pitch_model_path())
+        with registry.track_inference("basic-pitch"):
+            midi_data, note_events = transcribe_audio_array(
+                audio, model, onset_threshold, frame_threshold, minimum_note_length
+            )
+    midi_bytes = midi_to_bytes(midi_data)
+
+    if cache is not None:
+        cache.put(cache_key, {'midi_bytes': midi_bytes, 'note_events': note_events})
+    return midi_bytes
+
+def audio_to_midi_job(progress, audio_bytes):
+    """Background job: transcribe audio bytes to MIDI bytes."""
+    progress(0.1, "Generating MIDI transcription...")
+    return audio_bytes_to_midi(audio_bytes)
+
+def submit_conversion(audio_bytes, source_filename, session_key):
+    """Queue a Basic Pitch conversion and remember its job in the session."""
+    st.session_state[session_key] = get_job_queue().submit('basic-pitch', audio_to_midi_job, audio_bytes)
+    st.session_state[session_key + "_name"] = os.path.splitext(os.path.basename(source_filename))[0]
+
+def render_conversion_result(session_key, download_key):
+    """Show the progress of a queued conversion and offer the MIDI file for download when it is done."""
+    def render_midi(midi_bytes):
+        if midi_bytes:
+            st.success("MIDI conversion successful!")
+            st.download_button(
+                label="Download MIDI File",
+                data=midi_bytes,
+                file_name=f"{st.session_state[session_key + '_name']}_basic_pitch.mid",
+                mime="audio/midi",
+                key=download_key
             )
-
-        base_name = os.path.splitext(os.path.basename(source_filename))[0]
-        midi_file_path = os.path.join(output_directory, f"{base_name}_basic_pitch.mid")
-
-        if os.path.exists(midi_file_path):
-            return midi_file_path, base_name
         else:
-            st.error("MIDI file generation failed.")
-            return None, None
+            st.warning("Conversion process did not return a MIDI file.")
 
-    except Exception as e:
-        print(f"Error during transcription: {e}")
-        print(traceback.format_exc())
-        st.error(f"Transcription error: {type(e).__name__}")
-        return None, None
+    render_job(session_key, render_midi)
 
 def render_audio_to_midi_ui():
     """Render the complete Audio-to-MIDI interface."""
@@ -59,44 +169,8 @@ def render_audio_to_midi_ui():
             st.audio(uploaded_file.getvalue())
 
             if st.button("Convert Uploaded Audio to MIDI", key="convert_upload"):
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    temp_audio_path = os.path.join(temp_dir, uploaded_file.name)
-                    output_dir = os.path.join(temp_dir, "midi_output_upload")
-                    os.makedirs(output_dir, exist_ok=True)
-
-                    try:
-                        with open(temp_audio_path, "wb") as f:
-                            f.write(uploaded_file.getvalue())
-
-                        if os.path.exists(temp_audio_path) and os.path.getsize(temp_audio_path) > 0:
-                            st.success(f"Audio saved ({os.path.getsize(temp_audio_path)} bytes)")
-
-                            with st.spinner("Processing uploaded audio..."):
-                                midi_file_path, base_name = process_audio(temp_audio_path, output_dir, uploaded_file.name)
-
-                            if midi_file_path and os.path.exists(midi_file_path):
-                                st.success("MIDI conversion successful!")
-
-                                with open(midi_file_path, "rb") as f:
-                                    midi_bytes = f.read()
-
-                                st.download_button(
-                                    label="Download MIDI File",
-                                    data=midi_bytes,
-                                    file_name=f"{base_name}_basic_pitch.mid",
-                                    mime="audio/midi",
-                                    key="download_upload"
-                                )
-                            elif not midi_file_path:
-                                 st.warning("Conversion process did not return a MIDI file path.")
-                            else:
-                                 st.error("MIDI file was not found after processing.")
-                        else:
-                            st.error("Failed to save uploaded audio file. Please try again.")
-
-                    except Exception as e:
-                        st.error(f"Error processing uploaded audio: {type(e).__name__}")
-                        print(traceback.format_exc())
+                submit_conversion(uploaded_file.getvalue(), uploaded_file.name, "audio_job_upload")
+            render_conversion_result("audio_job_upload", "download_upload")
         else:
             st.info("Upload an audio file to begin.")
 
@@ -119,43 +193,7 @@ def render_audio_to_midi_ui():
             st.audio(audio_bytes, format="audio/wav")
 
             if st.button("Convert Recorded Audio to MIDI", key="convert_record"):
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    temp_audio_path = os.path.join(temp_dir, "recorded_audio.wav")
-                    output_dir = os.path.join(temp_dir, "midi_output_record")
-                    os.makedirs(output_dir, exist_ok=True)
-
-                    try:
-                        with open(temp_audio_path, "wb") as f:
-                            f.write(audio_bytes)
-
-                        if os.path.exists(temp_audio_path) and os.path.getsize(temp_audio_path) > 0:
-                            st.success(f"Recorded audio saved ({os.path.getsize(temp_audio_path)} bytes)")
-
-                            with st.spinner("Processing recorded audio..."):
-                                midi_file_path, base_name = process_audio(temp_audio_path, output_dir, "recorded_audio.wav")
-
-                            if midi_file_path and os.path.exists(midi_file_path):
-                                st.success("MIDI conversion successful!")
-
-                                with open(midi_file_path, "rb") as f:
-                                    midi_bytes = f.read()
-
-                                st.download_button(
-                                    label="Download MIDI File",
-                                    data=midi_bytes,
-                                    file_name=f"{base_name}_basic_pitch.mid",
-                                    mime="audio/midi",
-                                    key="download_record"
-                                )
-                            elif not midi_file_path:
-                                st.warning("Conversion process did not return a MIDI file path.")
-                            else:
-                                st.error("MIDI file was not found after processing.")
-                        else:
-                            st.error("Failed to save recorded audio file. Please try again.")
-
-                    except Exception as e:
-                        st.error(f"Error processing recorded audio: {type(e).__name__}")
-                        print(traceback.format_exc())
+                submit_conversion(audio_bytes, "recorded_audio.wav", "audio_job_record")
+            render_conversion_result("audio_job_record", "download_record")
         else:
             st.info("Click the microphone icon above to start recording.")
@@ -0,0 +1,121 @@
+import streamlit as st
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+SEGMENT_SECONDS = 60.0  # audio each worker transcribes at a time, excluding the overlap
+OVERLAP_SECONDS = 2.0  # context added on both sides of a segment so notes at its edges are seen whole
+SEAM_TOLERANCE = 0.1  # seconds; notes this close to a window edge are taken to be cut off by it
+PARALLEL_MIN_SECONDS = 120.0  # shorter recordings are transcribed in one piece
+
+_worker_model = None
+
+def split_segments(n_samples, sr, segment_seconds=SEGMENT_SECONDS, overlap_seconds=OVERLAP_SECONDS):
+    """Cut a recording into (window_start, window_stop, core_start, core_stop) sample ranges.
+
+    The cores tile the recording; each window is its core plus overlap_seconds
+    on both sides. A remainder shorter than the overlap joins the last core.
+    """
+    segment = max(1, int(segment_seconds * sr))
+    overlap = int(overlap_seconds * sr)
+    core_starts = list(range(0, n_samples, segment))
+    if len(core_starts) > 1 and n_samples - core_starts[-1] < overlap:
+        core_starts.pop()
+    core_stops = core_starts[1:] + [n_samples]
+    return [(max(0, start - overlap), min(n_samples, stop + overlap), start, stop)
+            for start, stop in zip(core_starts, core_stops)]
+
+def merge_segment_events(segments, sr, tolerance=SEAM_TOLERANCE):
+    """Merge per-window note events into one list, without duplicates at the seams.
+
+    segments holds (window_start, window_stop, core_start, core_stop, events)
+    with sample bounds and event times relative to the window. A note belongs
+    to the segment whose core contains its onset. A note cut off by its
+    window's end is extended by the same pitch's note that the next window
+    sees from its start (or from the note's onset, when that lies in the
+    overlap), so held notes cross any number of seams.
+    """
+    merged = []
+    cut_off = {}  # pitch -> index in merged of a note that ran into the previous window's end
+    for window_start, window_stop, core_start, core_stop, events in segments:
+        offset = window_start / sr
+        window_end = window_stop / sr
+        still_cut_off = {}
+        for start, end, pitch, amplitude, bends in events:
+            start, end = start + offset, end + offset
+            previous = merged[cut_off[pitch]] if pitch in cut_off else None
+            # the next window sees a cut-off note from its own start, or from the onset if that lies in the overlap
+            if (previous is not None and abs(start - max(offset, previous[0])) <= tolerance
+                    and end >= previous[1] - tolerance):
+                index = cut_off.pop(pitch)
+                merged[index] = (previous[0], max(previous[1], end), pitch, max(previous[3], amplitude),
+                                 previous[4])
+            elif core_start / sr <= start < core_stop / sr:
+                merged.append((start, end, pitch, amplitude, bends))
+                index = len(merged) - 1
+            else:
+                continue
+            if end >= window_end - tolerance:
+                still_cut_off[pitch] = index
+        cut_off = still_cut_off
+    merged.sort(key=lambda event: (event[0], event[2]))
+    return merged
+
+def _init_worker(threads):
+    """Load Basic Pitch once per worker process, with its inference threads capped."""
+    global _worker_model
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+    # without a cap every worker starts one inference thread per core
+    for name in ('TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS', 'OMP_NUM_THREADS'):
+        os.environ[name] = str(threads)
+    from model_registry import get_model_registry
+
+    _worker_model = get_model_registry().get_basic_pitch_model()
+
+def _transcribe_segment(audio, onset_threshold, frame_threshold, minimum_note_length):
+    """Note events of one window, with times relative to its start."""
+    from audio_to_midi import transcribe_audio_array
+
+    _, events = transcribe_audio_array(audio, _worker_model, onset_threshold, frame_threshold,
+                                       minimum_note_length)
+    return events
+
+def default_workers():
+    return int(os.environ.get("SAPE_BASIC_PITCH_WORKERS", os.cpu_count() or 1))
+
+def make_pool(workers=None):
+    """A spawn-context process pool of Basic Pitch workers sharing the host's cores."""
+    workers = workers or default_workers()
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker, initargs=(threads,))
+
+@st.cache_resource
+def get_basic_pitch_pool():
+    """Return the Basic Pitch worker pool shared by every session; SAPE_BASIC_PITCH_WORKERS sizes it."""
+    return make_pool()
+
+def transcribe_parallel(audio, sr, onset_threshold=0.5, frame_threshold=0.3, minimum_note_length=127.70,
+                        pool=None, segment_seconds=SEGMENT_SECONDS, overlap_seconds=OVERLAP_SECONDS,
+                        progress=None):
+    """Transcribe long audio at Basic Pitch's rate window by window across a process pool.
+
+    Returns (midi_data, note_events) like transcribe_audio_array.
+    progress(done, total) is called as windows finish.
+    """
+    from basic_pitch.note_creation import note_events_to_midi
+
+    pool = pool or get_basic_pitch_pool()
+    audio = np.asarray(audio, dtype=np.float32)
+    bounds = split_segments(len(audio), sr, segment_seconds, overlap_seconds)
+    futures = [pool.submit(_transcribe_segment, audio[window_start:window_stop], onset_threshold,
+                           frame_threshold, minimum_note_length)
+               for window_start, window_stop, _, _ in bounds]
+    segments = []
+    for done, (bound, future) in enumerate(zip(bounds, futures), 1):
+        segments.append((*bound, future.result()))
+        if progress:
+            progress(done, len(bounds))
+    events = merge_segment_events(segments, sr)
+    return note_events_to_midi(events), events
@@ -0,0 +1,107 @@
+"""Time Basic Pitch on a long recording in one pass and split across 1..N worker processes.
+
+Each parallel run is compared with the single pass: speedup, efficiency
+(speedup per worker) and the F1 of its notes against the single pass's,
+matching notes of the same pitch whose onsets are within 50 ms.
+
+Run from the repository root (needs basic-pitch installed):
+    python -m benchmarks.bench_basic_pitch_parallel [--seconds 600] [--workers 1 2 4 8] [--json results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+from benchmarks.fixtures import synthesize_notes
+
+ONSET_TOLERANCE = 0.05
+
+def synthesize_performance(seconds, sr):
+    """Sine-tone melodies in two voices, long enough to span many windows."""
+    n_notes = int(seconds / 0.5) + 1
+    audio = np.zeros(int(seconds * sr), dtype=np.float32)
+    for seed, octave in ((0, 0), (1, -12)):
+        notes = synthesize_notes(n_notes, note_seconds=0.25, seed=seed)
+        for pitch, start, end in zip(notes.pitch.tolist(), notes.start.tolist(), notes.end.tolist()):
+            first, last = int(start * sr), min(int(end * sr), len(audio))
+            if first >= len(audio):
+                break
+            t = np.arange(last - first) / sr
+            frequency = 440.0 * 2 ** ((pitch + octave - 69) / 12)
+            audio[first:last] += 0.3 * np.sin(2 * np.pi * frequency * t) * np.exp(-2 * t)
+    return audio
+
+def note_f1(reference, events, tolerance=ONSET_TOLERANCE):
+    """F1 of events against reference, pairing same-pitch notes with onsets within tolerance."""
+    unmatched = {}
+    for start, _, pitch, _, _ in reference:
+        unmatched.setdefault(pitch, []).append(start)
+    matches = 0
+    for start, _, pitch, _, _ in events:
+        onsets = unmatched.get(pitch, [])
+        nearest = min(range(len(onsets)), key=lambda i: abs(onsets[i] - start), default=None)
+        if nearest is not None and abs(onsets[nearest] - start) <= tolerance:
+            onsets.pop(nearest)
+            matches += 1
+    if not reference or not events:
+        return float(len(reference) == len(events))
+    precision, recall = matches / len(events), matches / len(reference)
+    return 2 * precision * recall / (precision + recall) if matches else 0.0
+
+def benchmark_parallel(seconds=600.0, worker_counts=None):
+    from basic_pitch.constants import AUDIO_SAMPLE_RATE
+    from audio_to_midi import transcribe_audio_array
+    from basic_pitch_parallel import make_pool, split_segments, transcribe_parallel
+    from model_registry import get_model_registry
+
+    cores = os.cpu_count() or 1
+    worker_counts = worker_counts or sorted({1, 2, 4, cores} & set(range(1, cores + 1)))
+    audio = synthesize_performance(seconds, AUDIO_SAMPLE_RATE)
+
+    model = get_model_registry().get_basic_pitch_model()
+    start = time.perf_counter()
+    _, reference = transcribe_audio_array(audio, model)
+    sequential = time.perf_counter() - start
+
+    results = [{'workers': 0, 'seconds': sequential, 'speedup': 1.0, 'efficiency': 1.0, 'f1': 1.0,
+                'notes': len(reference)}]
+    for workers in worker_counts:
+        pool = make_pool(workers)
+        try:
+            # warm every worker up, so model loading is not timed
+            list(pool.map(len, [[]] * workers))
+            start = time.perf_counter()
+            _, events = transcribe_parallel(audio, AUDIO_SAMPLE_RATE, pool=pool)
+            elapsed = time.perf_counter() - start
+        finally:
+            pool.shutdown()
+        speedup = sequential / elapsed
+        results.append({'workers': workers, 'seconds': elapsed, 'speedup': speedup,
+                        'efficiency': speedup / workers, 'f1': note_f1(reference, events),
+                        'notes': len(events)})
+    return {'audio_seconds': seconds, 'cores': cores,
+            'windows': len(split_segments(len(audio), AUDIO_SAMPLE_RATE)), 'results': results}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=600.0, help="Length of the synthetic recording.")
+    parser.add_argument("--workers", nargs="+", type=int, help="Worker counts to try (default 1, 2, 4 and all cores).")
+    parser.add_argument("--json", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    report = benchmark_parallel(args.seconds, args.workers)
+    print(f"{report['audio_seconds']:.0f}s of audio in {report['windows']} windows on {report['cores']} cores")
+    print(f"{'workers':>8}{'seconds':>10}{'speedup':>9}{'efficiency':>12}{'notes':>7}{'F1':>7}")
+    for r in report['results']:
+        label = r['workers'] or "1 pass"
+        print(f"{label:>8}{r['seconds']:>10.2f}{r['speedup']:>9.2f}{r['efficiency']:>12.2f}{r['notes']:>7}"
+              f"{r['f1']:>7.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Compare canvas_to_midi with the original per-pixel conversion on a 1000x500 canvas.
+
+Run from the repository root:
+    python -m benchmarks.bench_canvas_to_midi [--strokes 40] [--repeat 3]
+"""
+import argparse
+import time
+from io import BytesIO
+from types import SimpleNamespace
+import numpy as np
+from benchmarks.fixtures import synthesize_canvas
+from midi_utils import canvas_to_midi
+
+def per_pixel_canvas_to_midi(image_data, output):
+    """The original conversion: one 0.25 s note for every drawn pixel."""
+    import pretty_midi
+
+    img_data = np.mean(np.array(image_data)[:, :, :3], axis=2)
+    height, width = img_data.shape
+    midi = pretty_midi.PrettyMIDI()
+    instrument = pretty_midi.Instrument(program=0)
+    for x in range(width):
+        for y in np.where(img_data[:, x] < 200)[0]:
+            pitch = int(84 - (y / height) * (84 - 60))
+            pitch = max(60, min(84, pitch))
+            instrument.notes.append(pretty_midi.Note(velocity=100, pitch=pitch, start=x * 0.25, end=x * 0.25 + 0.25))
+    midi.instruments.append(instrument)
+    midi.write(output)
+
+def coverage(midi_bytes):
+    """Set of (pitch, column) cells sounded by a MIDI file, to check both paths agree."""
+    import pretty_midi
+
+    midi = pretty_midi.PrettyMIDI(BytesIO(midi_bytes))
+    cells = set()
+    for note in midi.instruments[0].notes:
+        first, last = round(note.start / 0.25), round(note.end / 0.25)
+        cells.update((note.pitch, x) for x in range(first, last))
+    return cells, len(midi.instruments[0].notes)
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        output = BytesIO()
+        start = time.perf_counter()
+        func(output)
+        times.append(time.perf_counter() - start)
+    return min(times), output.getvalue()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--strokes", type=int, default=40, help="Random strokes drawn on the canvas.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per path; the best time is reported.")
+    args = parser.parse_args()
+
+    image_data = synthesize_canvas(n_strokes=args.strokes)
+    canvas = SimpleNamespace(image_data=image_data)
+
+    old_seconds, old_bytes = best_time(lambda out: per_pixel_canvas_to_midi(image_data, out), args.repeat)
+    new_seconds, new_bytes = best_time(lambda out: canvas_to_midi(canvas, out), args.repeat)
+    old_cells, old_notes = coverage(old_bytes)
+    new_cells, new_notes = coverage(new_bytes)
+
+    print(f"{'path':<12}{'notes':>10}{'MIDI bytes':>12}{'seconds':>10}")
+    print(f"{'per-pixel':<12}{old_notes:>10}{len(old_bytes):>12}{old_seconds:>10.3f}")
+    print(f"{'vectorized':<12}{new_notes:>10}{len(new_bytes):>12}{new_seconds:>10.3f}")
+    print(f"notes x{old_notes / max(new_notes, 1):.0f} fewer, {old_seconds / new_seconds:.0f}x faster, "
+          f"same pitch/column coverage: {old_cells == new_cells}")
+
+if __name__ == "__main__":
+    main()
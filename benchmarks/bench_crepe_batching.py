@@ -0,0 +1,109 @@
+"""Throughput and latency of CREPE under concurrent requests, with and without micro-batching.
+
+Every simulated client sends short whistles back to back. The baseline runs
+each request through the model on its own, as crepe.predict does; the batched
+runs share one CrepeBatcher.
+
+Run from the repository root:
+    python -m benchmarks.bench_crepe_batching [--clients 1 4 16] [--duration 3] [--capacity tiny]
+        [--batch-sizes 256 512 1024] [--max-wait-ms 5] [--json results.json]
+"""
+import argparse
+import json
+import threading
+import time
+import numpy as np
+from audio_processing import CREPE_SAMPLE_RATE, CrepeBatcher, crepe_frames
+from benchmarks.fixtures import synthesize_whistle
+from model_registry import get_model_registry
+
+class UnbatchedCrepe:
+    """One model call per request, like crepe.predict."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def activation(self, frames):
+        return self.model.predict(frames, verbose=0)
+
+    def stats(self):
+        return {}
+
+def simulate_load(runner, clients, requests_per_client, frames):
+    """Run clients threads that each submit requests_per_client requests; returns wall time and latencies."""
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            runner.activation(frames)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies
+
+def benchmark_batching(capacity='tiny', clients=(1, 4, 16), requests_per_client=8, duration=3.0,
+                       batch_sizes=(256, 512, 1024), max_wait=0.005):
+    model = get_model_registry().get_crepe_model(capacity)
+    audio, _ = synthesize_whistle(duration, CREPE_SAMPLE_RATE)
+    frames = crepe_frames(audio)
+    model.predict(frames[:32], verbose=0)  # build the graph before timing
+
+    runners = [('unbatched', None, lambda: UnbatchedCrepe(model))]
+    runners += [('batched', size, lambda size=size: CrepeBatcher(model, f"crepe-{capacity}", size, max_wait))
+                for size in batch_sizes]
+    results = []
+    for n_clients in clients:
+        for mode, batch_size, make_runner in runners:
+            runner = make_runner()
+            seconds, latencies = simulate_load(runner, n_clients, requests_per_client, frames)
+            n_requests = n_clients * requests_per_client
+            results.append({
+                'mode': mode,
+                'batch_size': batch_size,
+                'clients': n_clients,
+                'requests': n_requests,
+                'seconds': seconds,
+                'requests_per_second': n_requests / seconds,
+                'audio_seconds_per_second': n_requests * duration / seconds,
+                'latency_p50': float(np.percentile(latencies, 50)),
+                'latency_p95': float(np.percentile(latencies, 95)),
+                'mean_batch_frames': runner.stats().get('mean_batch_frames'),
+            })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--capacity", default="tiny", choices=["tiny", "small", "medium", "large", "full"])
+    parser.add_argument("--clients", nargs="+", type=int, default=[1, 4, 16], help="Concurrent clients.")
+    parser.add_argument("--requests", type=int, default=8, help="Requests sent by every client.")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds of audio per request.")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[256, 512, 1024],
+                        help="Most frames per batched model call.")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="How long a batch waits for more requests.")
+    parser.add_argument("--json", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results = benchmark_batching(args.capacity, args.clients, args.requests, args.duration, args.batch_sizes,
+                                 args.max_wait_ms / 1000)
+    print(f"{'clients':>8}  {'mode':<16}{'req/s':>9}{'audio-s/s':>11}{'p50 ms':>9}{'p95 ms':>9}{'frames/call':>13}")
+    for r in results:
+        mode = r['mode'] + (f"@{r['batch_size']}" if r['batch_size'] else "")
+        frames = f"{r['mean_batch_frames']:.0f}" if r['mean_batch_frames'] else "-"
+        print(f"{r['clients']:>8}  {mode:<16}{r['requests_per_second']:>9.1f}{r['audio_seconds_per_second']:>11.1f}"
+              f"{r['latency_p50'] * 1000:>9.0f}{r['latency_p95'] * 1000:>9.0f}{frames:>13}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
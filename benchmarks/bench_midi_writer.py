@@ -0,0 +1,105 @@
+"""Compare the direct MIDI encoder with building and writing a PrettyMIDI object, and check the round trip.
+
+Every encoded file is parsed back with pretty_midi and must give the same
+pitches, velocities and, to within a tick, the same note times.
+
+Run from the repository root:
+    python -m benchmarks.bench_midi_writer [--sizes 1000 10000 100000] [--repeat 3] [--json results.json]
+"""
+import argparse
+import json
+import sys
+import time
+from io import BytesIO
+import numpy as np
+from midi_writer import TICKS_PER_SECOND, write_midi_bytes
+from note_array import NoteArray
+
+def dense_notes(n_notes, seed=0):
+    """Polyphonic notes like a dense drawing: pitches never overlap themselves."""
+    rng = np.random.default_rng(seed)
+    per_pitch = -(-n_notes // 25)
+    pitch = np.repeat(np.arange(60, 85), per_pitch)[:n_notes]
+    # back-to-back notes of random length on every pitch, including ones ending where the next starts
+    lengths = rng.integers(1, 8, (25, per_pitch)) * 0.25
+    gaps = rng.integers(0, 3, (25, per_pitch)) * 0.25
+    starts = (np.cumsum(lengths + gaps, axis=1) - lengths).ravel()[:n_notes]
+    ends = starts + lengths.ravel()[:n_notes]
+    velocity = rng.integers(1, 128, n_notes)
+    return NoteArray(pitch, starts, ends, velocity).sorted()
+
+def pretty_midi_bytes(notes):
+    """The previous path: a PrettyMIDI object tree written through mido."""
+    buf = BytesIO()
+    notes.to_pretty_midi().write(buf)
+    return buf.getvalue()
+
+def direct_bytes(notes):
+    return write_midi_bytes(notes.pitch, notes.start, notes.end, notes.velocity)
+
+def round_trip_errors(notes, midi_bytes):
+    """Parse midi_bytes with pretty_midi and list how it differs from notes."""
+    import pretty_midi
+
+    parsed = NoteArray.from_pretty_midi(pretty_midi.PrettyMIDI(BytesIO(midi_bytes))).sorted()
+    expected = notes.sorted()
+    if len(parsed) != len(expected):
+        return [f"{len(parsed)} notes parsed, {len(expected)} written"]
+    errors = []
+    tolerance = 0.5 / TICKS_PER_SECOND + 1e-9
+    if not np.array_equal(parsed.pitch, expected.pitch):
+        errors.append("pitches differ")
+    if not np.array_equal(parsed.velocity, expected.velocity):
+        errors.append("velocities differ")
+    if np.abs(parsed.start - expected.start).max() > tolerance:
+        errors.append(f"start times off by up to {np.abs(parsed.start - expected.start).max():.6f}s")
+    if np.abs(parsed.end - expected.end).max() > tolerance:
+        errors.append(f"end times off by up to {np.abs(parsed.end - expected.end).max():.6f}s")
+    return errors
+
+def _best_time(call, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def benchmark_writers(sizes=(1000, 10000, 100000), repeat=3):
+    results = []
+    for size in sizes:
+        notes = dense_notes(size)
+        pretty_seconds = _best_time(lambda: pretty_midi_bytes(notes), repeat)
+        direct_seconds = _best_time(lambda: direct_bytes(notes), repeat)
+        midi_bytes = direct_bytes(notes)
+        results.append({
+            'notes': size,
+            'pretty_midi_seconds': pretty_seconds,
+            'direct_seconds': direct_seconds,
+            'speedup': pretty_seconds / direct_seconds,
+            'bytes': len(midi_bytes),
+            'round_trip_errors': round_trip_errors(notes, midi_bytes),
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000], help="Notes per file.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per writer; the fastest counts.")
+    parser.add_argument("--json", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results = benchmark_writers(args.sizes, args.repeat)
+    print(f"{'notes':>8}{'pretty_midi s':>15}{'direct s':>11}{'speedup':>9}  round trip")
+    for r in results:
+        status = "; ".join(r['round_trip_errors']) or "ok"
+        print(f"{r['notes']:>8}{r['pretty_midi_seconds']:>15.4f}{r['direct_seconds']:>11.4f}{r['speedup']:>9.1f}"
+              f"  {status}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if any(r['round_trip_errors'] for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""Time every conversion pipeline on synthetic fixtures, with peak memory and throughput.
+
+Each case runs in its own interpreter so its peak RSS is not inflated by the
+others. Results can be saved as JSON and compared between commits.
+
+Run from the repository root:
+    python -m benchmarks.bench_pipelines [--cases canvas_to_midi midi_to_audio] [--quick]
+        [--json results.json] [--compare baseline.json]
+    python -m benchmarks.bench_pipelines --compare old.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from io import BytesIO
+from types import SimpleNamespace
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WHISTLE_SR = 22050
+REGRESSION_THRESHOLD = 0.10  # slowdowns beyond this are flagged by --compare
+
+# each setup builds its fixture and returns (call, units); units is the amount of work per call
+def _setup_extract_pitch(size, backend):
+    from audio_processing import extract_pitch_from_audio
+    from benchmarks.fixtures import synthesize_whistle
+
+    audio, _ = synthesize_whistle(size, WHISTLE_SR)
+    return lambda: extract_pitch_from_audio(audio, WHISTLE_SR, backend=backend), size
+
+def _setup_process_whistle(size, backend):
+    from audio_processing import process_whistle_audio
+    from benchmarks.fixtures import synthesize_whistle
+
+    audio, _ = synthesize_whistle(size, WHISTLE_SR)
+    return lambda: process_whistle_audio(audio, WHISTLE_SR, backend=backend), size
+
+def _setup_process_audio(size, backend):
+    from audio_to_midi import audio_bytes_to_midi
+    from benchmarks.fixtures import synthesize_whistle, to_wav_bytes
+
+    audio, _ = synthesize_whistle(size, WHISTLE_SR)
+    audio_bytes = to_wav_bytes(audio, WHISTLE_SR)
+    return lambda: audio_bytes_to_midi(audio_bytes, use_cache=False), size
+
+def _setup_canvas_to_midi(size, backend):
+    from midi_utils import canvas_to_midi
+    from benchmarks.fixtures import synthesize_canvas
+
+    canvas = SimpleNamespace(image_data=synthesize_canvas(n_strokes=size))
+    megapixels = canvas.image_data.shape[0] * canvas.image_data.shape[1] / 1e6
+    return lambda: canvas_to_midi(canvas, BytesIO()), megapixels
+
+def _setup_midi_to_audio(size, backend):
+    from midi_utils import midi_to_audio
+    from benchmarks.fixtures import synthesize_midi
+
+    midi_bytes = synthesize_midi(size)
+    return lambda: midi_to_audio(BytesIO(midi_bytes), BytesIO(), "wav"), size
+
+def _setup_sheet_music(size, backend):
+    from midi_utils import _render_sheet_pages, create_sheet_music_from_notes
+    from benchmarks.fixtures import synthesize_notes
+
+    notes = synthesize_notes(size)
+
+    def call():
+        # rendering is memoized; time a cold render
+        _render_sheet_pages.cache_clear()
+        return create_sheet_music_from_notes(notes)
+    return call, size
+
+def _setup_create_midi(size, backend):
+    from midi_utils import create_midi_from_notes
+    from benchmarks.fixtures import synthesize_notes
+
+    notes = synthesize_notes(size)
+    return lambda: create_midi_from_notes(notes, BytesIO()), size
+
+def _setup_system_split(size, backend):
+    from omr_tiling import find_system_bounds
+    from benchmarks.fixtures import synthesize_staff_image
+
+    page = synthesize_staff_image(size)
+    return lambda: find_system_bounds(page), page.width * page.height / 1e6
+
+# name: (setup, default sizes, quick sizes, size label, throughput unit, backends)
+CASES = {
+    'extract_pitch_from_audio': (_setup_extract_pitch, [10, 60], [5], "audio s", "audio-s/s",
+                                 ['crepe', 'autocorr']),
+    'process_whistle_audio': (_setup_process_whistle, [10, 60], [5], "audio s", "audio-s/s", ['crepe', 'autocorr']),
+    'process_audio': (_setup_process_audio, [10, 60], [5], "audio s", "audio-s/s", [None]),
+    'canvas_to_midi': (_setup_canvas_to_midi, [40, 400], [40], "strokes", "Mpx/s", [None]),
+    'midi_to_audio': (_setup_midi_to_audio, [100, 2000], [100], "notes", "notes/s", [None]),
+    'create_sheet_music_from_notes': (_setup_sheet_music, [50, 500], [50], "notes", "notes/s", [None]),
+    'create_midi_from_notes': (_setup_create_midi, [100, 5000], [100], "notes", "notes/s", [None]),
+    'find_system_bounds': (_setup_system_split, [4, 16], [4], "systems", "Mpx/s", [None]),
+}
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def run_case(name, size, backend=None, repeat=3):
+    """Run one case in this process: a first call that may load models, then timed repeats."""
+    setup = CASES[name][0]
+    call, units = setup(size, backend)
+    setup_rss = _peak_rss_mb()
+
+    start = time.perf_counter()
+    output = call()
+    first = time.perf_counter() - start
+    # the pipelines report errors through st.error and return None, False or (None, ...)
+    if output is None or output is False or (isinstance(output, tuple) and output[0] is None):
+        raise RuntimeError(f"{name} returned no result")
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    return {
+        'case': name,
+        'backend': backend,
+        'size': size,
+        'size_unit': CASES[name][3],
+        'first_seconds': first,
+        'seconds': best,
+        'median_seconds': float(np.median(times)),
+        'throughput': units / best if best > 0 else float('inf'),
+        'unit': CASES[name][4],
+        'setup_rss_mb': setup_rss,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+def run_case_isolated(name, size, backend=None, repeat=3):
+    """Run a case in a fresh interpreter so peak RSS belongs to that case alone."""
+    command = [sys.executable, "-m", "benchmarks.bench_pipelines", "--run-case", name, str(size),
+               "--repeat", str(repeat)]
+    if backend:
+        command += ["--backend", backend]
+    completed = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True,
+                               env=dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3"))
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode or not lines:
+        error = (completed.stderr.strip().splitlines() or ["no output"])[-1]
+        return {'case': name, 'backend': backend, 'size': size, 'error': error}
+    return json.loads(lines[-1])
+
+def _case_key(result):
+    return f"{result['case']}[{result['backend'] or '-'}]@{result['size']}"
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_suite(cases, quick=False, repeat=3):
+    results = []
+    for name in cases:
+        _, sizes, quick_sizes, _, _, backends = CASES[name]
+        for backend in backends:
+            for size in (quick_sizes if quick else sizes):
+                result = run_case_isolated(name, size, backend, repeat)
+                results.append(result)
+                print_result(result)
+    return {
+        'commit': _git_commit(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+
+def print_result(result):
+    key = _case_key(result)
+    if 'error' in result:
+        print(f"{key:<52} skipped: {result['error']}")
+        return
+    print(f"{key:<52}{result['seconds']:>10.4f}s{result['throughput']:>12.1f} {result['unit']:<10}"
+          f"{result['peak_rss_mb']:>8.0f} MB peak")
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Print the time ratio of every case present in both reports; returns the regressed cases."""
+    previous = {_case_key(r): r for r in baseline['results'] if 'error' not in r}
+    regressions = []
+    print(f"\ncomparing {baseline.get('commit')} -> {current.get('commit')}")
+    print(f"{'case':<52}{'before':>10}{'after':>10}{'ratio':>8}{'peak MB':>16}")
+    for result in current['results']:
+        key = _case_key(result)
+        if 'error' in result or key not in previous:
+            continue
+        before = previous[key]
+        ratio = result['seconds'] / before['seconds']
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{key:<52}{before['seconds']:>10.4f}{result['seconds']:>10.4f}{ratio:>8.2f}"
+              f"{before['peak_rss_mb']:>8.0f}->{result['peak_rss_mb']:<6.0f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--quick", action="store_true", help="Only the smallest size of every case.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case after the first call.")
+    parser.add_argument("--json", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", nargs="+", metavar="REPORT",
+                        help="Compare against a saved report, or compare two saved reports without running.")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Relative slowdown reported as a regression.")
+    parser.add_argument("--run-case", nargs=2, metavar=("CASE", "SIZE"), help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        name, size = args.run_case
+        print(json.dumps(run_case(name, float(size) if "." in size else int(size), args.backend, args.repeat)))
+        return 0
+
+    if args.compare and len(args.compare) == 2:
+        reports = []
+        for path in args.compare:
+            with open(path) as f:
+                reports.append(json.load(f))
+        return 1 if compare(*reports, threshold=args.threshold) else 0
+
+    report = run_suite(args.cases, args.quick, args.repeat)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare[0]) as f:
+            return 1 if compare(json.load(f), report, threshold=args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
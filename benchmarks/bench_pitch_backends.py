@@ -0,0 +1,67 @@
+"""Compare speed and accuracy of the pitch backends on synthetic whistles.
+
+Run from the repository root:
+    python -m benchmarks.bench_pitch_backends [--duration 30] [--json results.json]
+"""
+import argparse
+import json
+import time
+import numpy as np
+from audio_processing import PITCH_BACKENDS, CREPE_SAMPLE_RATE, run_pitch_backend
+from benchmarks.fixtures import synthesize_whistle
+
+def pitch_accuracy(reference, estimate):
+    """Raw pitch accuracy (within 50 cents), median cents error and voicing false alarms."""
+    n = min(len(reference), len(estimate))
+    reference, estimate = reference[:n], estimate[:n]
+    voiced = reference > 0
+    both = voiced & (estimate > 0)
+    cents = np.full(n, np.inf)
+    cents[both] = 1200 * np.abs(np.log2(estimate[both] / reference[both]))
+    return {
+        'raw_pitch_accuracy': float(np.mean(cents[voiced] <= 50)) if voiced.any() else 0.0,
+        'median_cents_error': float(np.median(cents[both])) if both.any() else float('nan'),
+        'voicing_false_alarm': float(np.mean(estimate[~voiced] > 0)) if (~voiced).any() else 0.0,
+    }
+
+def benchmark_backends(backends, duration=30.0, confidence_threshold=0.5, seed=0):
+    """Time every backend on the same synthetic whistle and score it against the reference."""
+    audio, reference = synthesize_whistle(duration, CREPE_SAMPLE_RATE, seed=seed)
+    results = []
+    for backend in backends:
+        try:
+            # the first call loads models; time the second
+            run_pitch_backend(backend, audio[:CREPE_SAMPLE_RATE], CREPE_SAMPLE_RATE)
+            start = time.perf_counter()
+            _, frequency, confidence = run_pitch_backend(backend, audio, CREPE_SAMPLE_RATE)
+            elapsed = time.perf_counter() - start
+        except ImportError as e:
+            print(f"skipping {backend}: {e}")
+            continue
+        frequency = np.where(confidence < confidence_threshold, 0, frequency)
+        results.append({
+            'backend': backend,
+            'seconds': elapsed,
+            'realtime_factor': duration / elapsed,
+            **pitch_accuracy(reference, frequency),
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of synthetic whistle.")
+    parser.add_argument("--backends", nargs="+", default=list(PITCH_BACKENDS), choices=list(PITCH_BACKENDS))
+    parser.add_argument("--json", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results = benchmark_backends(args.backends, args.duration)
+    print(f"{'backend':<12}{'seconds':>10}{'x realtime':>12}{'RPA':>8}{'cents':>8}{'false alarm':>13}")
+    for r in results:
+        print(f"{r['backend']:<12}{r['seconds']:>10.3f}{r['realtime_factor']:>12.1f}"
+              f"{r['raw_pitch_accuracy']:>8.3f}{r['median_cents_error']:>8.1f}{r['voicing_false_alarm']:>13.3f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
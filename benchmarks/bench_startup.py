@@ -0,0 +1,113 @@
+"""Measure cold-start import time of the app and of each mode, with a -X importtime profile.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup [--top 15] [--repeat 3] [--render] [--json results.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+TARGETS = ("app", "whistle_to_sheet", "audio_to_midi", "draw_to_music", "image_to_musicxml")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# AppTest renders app.py headlessly; the selected mode is imported on the first run
+FIRST_RENDER_SCRIPT = """
+import sys
+from streamlit.testing.v1 import AppTest
+mode = sys.argv[1]
+at = AppTest.from_file("app.py", default_timeout=300).run()
+if mode != at.selectbox[0].value:
+    at.selectbox[0].select(mode).run()
+print(len(at.exception))
+"""
+
+def parse_importtime(stderr):
+    """Parse -X importtime output into (module, self_us, cumulative_us, depth) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+def profile_import(module):
+    """Import a module in a fresh interpreter; returns wall seconds and the importtime rows."""
+    env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3")
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    error = None
+    if completed.returncode:
+        error = completed.stderr.strip().splitlines()[-1]
+    return elapsed, parse_importtime(completed.stderr), error
+
+def first_render(mode):
+    """Seconds from starting a fresh interpreter until the app has rendered the given mode once."""
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-c", FIRST_RENDER_SCRIPT, mode], cwd=REPO_ROOT,
+                               env=dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3"), capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if completed.returncode:
+        return None, completed.stderr.strip().splitlines()[-1]
+    exceptions = int(completed.stdout.split()[-1])
+    return elapsed, (f"{exceptions} exception(s) while rendering" if exceptions else None)
+
+def benchmark_startup(targets=TARGETS, repeat=3, top=15):
+    """Best-of-repeat import time per target, with the slowest of its direct imports."""
+    results = []
+    for module in targets:
+        runs = [profile_import(module) for _ in range(repeat)]
+        elapsed, rows, error = min(runs, key=lambda run: run[0])
+        # depth 1 is everything the target itself imports, e.g. streamlit, numpy or basic_pitch
+        direct = sorted((row for row in rows if row[3] == 1), key=lambda row: -row[2])
+        results.append({
+            'module': module,
+            'seconds': elapsed,
+            'modules_imported': len(rows),
+            'error': error,
+            'slowest': [{'module': name, 'cumulative_ms': cumulative / 1000}
+                        for name, _, cumulative, _ in direct[:top]],
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", nargs="+", default=list(TARGETS), help="Modules to import.")
+    parser.add_argument("--repeat", type=int, default=3, help="Cold imports per target; the fastest counts.")
+    parser.add_argument("--top", type=int, default=15, help="Slowest direct imports to list per target.")
+    parser.add_argument("--render", action="store_true",
+                        help="Also time the first render of every mode through streamlit's AppTest.")
+    parser.add_argument("--json", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results = benchmark_startup(args.targets, args.repeat, args.top)
+    for r in results:
+        status = f"  FAILED: {r['error']}" if r['error'] else ""
+        print(f"\nimport {r['module']}: {r['seconds'] * 1000:.0f} ms, {r['modules_imported']} modules{status}")
+        for row in r['slowest']:
+            print(f"  {row['cumulative_ms']:>9.1f} ms  {row['module']}")
+
+    report = {'imports': results}
+    if args.render:
+        from app import MODES
+
+        report['first_render'] = []
+        print(f"\n{'mode':<20}{'first render (s)':>18}")
+        for mode in MODES:
+            seconds, error = first_render(mode)
+            report['first_render'].append({'mode': mode, 'seconds': seconds, 'error': error})
+            print(f"{mode:<20}{seconds if seconds is not None else float('nan'):>18.2f}"
+                  + (f"  ({error})" if error else ""))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
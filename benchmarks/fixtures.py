@@ -0,0 +1,109 @@
+"""Deterministic synthetic inputs for the benchmarks."""
+import numpy as np
+
+def synthesize_whistle(duration=10.0, sr=16000, step_size=10, note_seconds=0.4, rest_probability=0.2,
+                       vibrato_cents=20, noise_level=0.01, seed=0):
+    """Synthesize a whistle-like melody and its reference pitch track.
+
+    Returns the audio and the reference frequency (0 during rests) at every
+    step_size-millisecond frame, aligned with the pitch backends' frames.
+    """
+    rng = np.random.default_rng(seed)
+    n_samples = int(duration * sr)
+    n_notes = int(np.ceil(duration / note_seconds))
+
+    # one MIDI pitch per note in the C5-C7 whistling range, 0 for a rest
+    pitches = rng.integers(72, 97, n_notes).astype(np.float64)
+    pitches[rng.random(n_notes) < rest_probability] = 0
+    note_index = np.minimum((np.arange(n_samples) / sr / note_seconds).astype(int), n_notes - 1)
+    midi = pitches[note_index]
+
+    vibrato = vibrato_cents / 100 * np.sin(2 * np.pi * 5.5 * np.arange(n_samples) / sr)
+    frequency = np.where(midi > 0, 440 * 2 ** ((midi + vibrato - 69) / 12), 0)
+    phase = 2 * np.pi * np.cumsum(frequency) / sr
+    audio = np.where(midi > 0, 0.5 * np.sin(phase), 0) + noise_level * rng.standard_normal(n_samples)
+
+    hop = int(sr * step_size / 1000)
+    reference = frequency[np.minimum(np.arange(1 + n_samples // hop) * hop, n_samples - 1)]
+    return audio.astype(np.float32), reference
+
+def synthesize_canvas(width=1000, height=500, n_strokes=40, stroke_width=12, seed=0):
+    """Draw random thick strokes on a white RGBA canvas shaped like st_canvas image_data."""
+    rng = np.random.default_rng(seed)
+    canvas = np.full((height, width, 4), 255, dtype=np.uint8)
+    for _ in range(n_strokes):
+        x0, x1 = np.sort(rng.integers(0, width, 2))
+        y0, y1 = rng.integers(0, height, 2)
+        xs = np.arange(x0, x1 + 1)
+        ys = np.round(np.linspace(y0, y1, len(xs))).astype(int)
+        for offset in range(-(stroke_width // 2), stroke_width // 2 + 1):
+            rows = np.clip(ys + offset, 0, height - 1)
+            canvas[rows, xs, :3] = 0
+    return canvas
+
+def synthesize_sine(duration=10.0, sr=22050, frequency=440.0, amplitude=0.5):
+    """A steady sine tone."""
+    t = np.arange(int(duration * sr)) / sr
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+def to_wav_bytes(audio, sr):
+    """Encode mono float audio as 16-bit WAV bytes, like an upload or a recording."""
+    import soundfile as sf
+    from io import BytesIO
+
+    buf = BytesIO()
+    sf.write(buf, audio, sr, format='WAV', subtype='PCM_16')
+    return buf.getvalue()
+
+def synthesize_notes(n_notes=100, note_seconds=0.25, seed=0):
+    """A monophonic NoteArray shaped like segment_notes output."""
+    from note_array import NoteArray
+
+    rng = np.random.default_rng(seed)
+    pitches = rng.integers(60, 85, n_notes)
+    durations = note_seconds * rng.integers(1, 4, n_notes)
+    starts = np.concatenate([[0.0], np.cumsum(durations)[:-1]])
+    return NoteArray(pitches, starts, starts + durations)
+
+def synthesize_midi(n_notes=500, polyphony=4, seconds_per_note=0.1, seed=0):
+    """MIDI bytes with n_notes random piano notes, about polyphony of them sounding at once."""
+    import pretty_midi
+    from io import BytesIO
+
+    rng = np.random.default_rng(seed)
+    midi = pretty_midi.PrettyMIDI()
+    instrument = pretty_midi.Instrument(program=0)
+    starts = np.sort(rng.random(n_notes)) * n_notes * seconds_per_note
+    durations = seconds_per_note * polyphony * rng.uniform(0.5, 1.5, n_notes)
+    for pitch, start, duration, velocity in zip(rng.integers(36, 97, n_notes), starts, durations,
+                                                rng.integers(40, 128, n_notes)):
+        instrument.notes.append(pretty_midi.Note(velocity=int(velocity), pitch=int(pitch),
+                                                 start=float(start), end=float(start + duration)))
+    midi.instruments.append(instrument)
+    buf = BytesIO()
+    midi.write(buf)
+    return buf.getvalue()
+
+def synthesize_staff_image(n_systems=4, width=2000, staves_per_system=2, line_spacing=20, seed=0):
+    """Render a grayscale score page: systems of five-line staves joined by barlines, with noteheads."""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    staff_height = 4 * line_spacing
+    system_height = staves_per_system * staff_height + (staves_per_system - 1) * 5 * line_spacing
+    gutter = 7 * line_spacing
+    page = np.full((gutter + n_systems * (system_height + gutter), width), 255, dtype=np.uint8)
+    margin = width // 20
+    for system in range(n_systems):
+        top = gutter + system * (system_height + gutter)
+        for staff in range(staves_per_system):
+            staff_top = top + staff * (staff_height + 5 * line_spacing)
+            for line in range(5):
+                y = staff_top + line * line_spacing
+                page[y:y + 2, margin:width - margin] = 0
+            for x in np.sort(rng.integers(margin + 40, width - margin - 40, 24)):
+                y = staff_top + rng.integers(0, 9) * line_spacing // 2
+                page[y - line_spacing // 2 + 1:y + line_spacing // 2, x:x + int(line_spacing * 1.3)] = 0
+        for x in np.linspace(margin, width - margin - 3, 5).astype(int):
+            page[top:top + system_height + 2, x:x + 3] = 0
+    return Image.fromarray(page)
@@ -0,0 +1,182 @@
+import hashlib
+import os
+from collections import OrderedDict
+from io import BytesIO
+import numpy as np
+from midi_utils import CANVAS_PITCH_RANGE, CANVAS_TIME_STEP, canvas_pitch_grid, grid_to_notes
+from synthesis import SYNTH_SAMPLE_RATE, mix_notes, normalize, write_audio
+from tracing import set_attributes, span
+
+DEFAULT_CANVAS_CACHE_ENTRIES = 4
+
+def canvas_hash(image_data):
+    """Fast content hash of a canvas array, including its shape and dtype."""
+    image = np.ascontiguousarray(image_data)
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{image.shape}{image.dtype}".encode())
+    hasher.update(memoryview(image).cast('B'))
+    return hasher.hexdigest()
+
+def _note_columns(notes, time_step):
+    return (np.round(notes.start / time_step).astype(np.int64),
+            np.round(notes.end / time_step).astype(np.int64))
+
+def dirty_columns(old_grid, new_grid, old_notes, new_notes, time_step=CANVAS_TIME_STEP):
+    """Column range [first, stop) to re-derive when old_grid becomes new_grid, or None if they match.
+
+    The changed columns are widened until no old or new note crosses either
+    edge, so the notes outside the range are the same in both grids.
+    """
+    changed = np.flatnonzero((old_grid != new_grid).any(axis=0))
+    if len(changed) == 0:
+        return None
+    first, stop = int(changed[0]), int(changed[-1]) + 1
+    columns = [_note_columns(old_notes, time_step), _note_columns(new_notes, time_step)]
+    while True:
+        widened_first, widened_stop = first, stop
+        for onsets, releases in columns:
+            crossing = (onsets < stop) & (releases > first)
+            if crossing.any():
+                widened_first = min(widened_first, int(onsets[crossing].min()))
+                widened_stop = max(widened_stop, int(releases[crossing].max()))
+        if (widened_first, widened_stop) == (first, stop):
+            return first, stop
+        first, stop = widened_first, widened_stop
+
+def _audio_length(notes, fs):
+    return int(np.ceil(np.max(notes.end) * fs)) + 1 if len(notes) else 0
+
+def _mix(notes, fs):
+    audio = np.zeros(_audio_length(notes, fs), dtype=np.float32)
+    return mix_notes(audio, 0, notes.pitch, notes.start, notes.end, notes.velocity, fs)
+
+class CanvasRender:
+    """The notes, MIDI and unnormalized audio of one canvas, with its previews encoded on demand.
+
+    The float samples are the largest part and are only needed to patch the
+    next render, so release_audio drops them; they are re-mixed if asked for.
+    """
+
+    def __init__(self, grid, notes, audio, fs=SYNTH_SAMPLE_RATE):
+        self.grid = grid
+        self.notes = notes
+        self.fs = fs
+        self._audio = audio
+        self.midi_bytes = notes.to_midi_bytes()
+        self._encoded = {}
+
+    @property
+    def audio(self):
+        if self._audio is None:
+            self._audio = _mix(self.notes, self.fs)
+        return self._audio
+
+    def release_audio(self):
+        self._audio = None
+
+    def audio_bytes(self, audio_format="wav"):
+        """The preview encoded as audio_format, encoded once per format."""
+        if audio_format not in self._encoded:
+            with span("audio.encode", samples=len(self.audio), format=audio_format):
+                buf = BytesIO()
+                write_audio(normalize(self.audio), buf, self.fs, audio_format)
+                self._encoded[audio_format] = buf.getvalue()
+        return self._encoded[audio_format]
+
+    @property
+    def nbytes(self):
+        audio_bytes = self._audio.nbytes if self._audio is not None else 0
+        return (self.grid.nbytes + self.notes.nbytes + audio_bytes + len(self.midi_bytes)
+                + sum(len(data) for data in self._encoded.values()))
+
+def render_grid(grid, time_step=CANVAS_TIME_STEP, lowest_pitch=CANVAS_PITCH_RANGE[0], fs=SYNTH_SAMPLE_RATE):
+    """Render a pitch grid from scratch."""
+    notes = grid_to_notes(grid, time_step, lowest_pitch)
+    return CanvasRender(grid, notes, _mix(notes, fs), fs)
+
+def update_render(previous, grid, time_step=CANVAS_TIME_STEP, lowest_pitch=CANVAS_PITCH_RANGE[0],
+                  fs=SYNTH_SAMPLE_RATE):
+    """Render grid by re-deriving only the columns that differ from previous.grid.
+
+    Notes outside the dirty range are kept, and only the samples under it
+    are cleared and mixed again; the result matches render_grid exactly.
+    """
+    if previous.grid.shape != grid.shape:
+        return render_grid(grid, time_step, lowest_pitch, fs)
+    new_notes = grid_to_notes(grid, time_step, lowest_pitch)
+    columns = dirty_columns(previous.grid, grid, previous.notes, new_notes, time_step)
+    if columns is None:
+        return previous
+    first, stop = columns
+    set_attributes(dirty_columns=stop - first)
+
+    audio = np.zeros(_audio_length(new_notes, fs), dtype=np.float32)
+    kept = min(len(audio), len(previous.audio))
+    audio[:kept] = previous.audio[:kept]
+    sample_first = min(int(round(first * time_step * fs)), len(audio))
+    sample_stop = min(int(round(stop * time_step * fs)), len(audio))
+    audio[sample_first:sample_stop] = 0
+    onsets, releases = _note_columns(new_notes, time_step)
+    inside = (onsets >= first) & (releases <= stop)
+    patch = new_notes[inside]
+    mix_notes(audio[sample_first:sample_stop], sample_first, patch.pitch, patch.start, patch.end, patch.velocity, fs)
+    return CanvasRender(grid, new_notes, audio, fs)
+
+class CanvasRenderCache:
+    """Per-session LRU of canvas renders keyed by a hash of the canvas pixels.
+
+    A canvas seen before is served from the cache; a new one is rendered
+    incrementally from the most recent render, so a small edit only
+    re-synthesizes the columns it touched. SAPE_CANVAS_CACHE_ENTRIES bounds
+    the number of canvases kept.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or int(os.environ.get("SAPE_CANVAS_CACHE_ENTRIES",
+                                                             DEFAULT_CANVAS_CACHE_ENTRIES))
+        self._entries = OrderedDict()
+        self._last = None
+        self.hits = 0
+        self.incremental = 0
+        self.full = 0
+
+    def render(self, image_data):
+        """Return the CanvasRender of image_data, reusing earlier work where it can."""
+        key = canvas_hash(image_data)
+        with span("canvas.render", pixels=int(np.prod(np.shape(image_data)[:2]))):
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                set_attributes(from_cache=True)
+            else:
+                grid = canvas_pitch_grid(image_data)
+                if self._last is not None and self._last.grid.shape == grid.shape:
+                    result = update_render(self._last, grid)
+                    self.incremental += 1
+                else:
+                    result = render_grid(grid)
+                    self.full += 1
+                self._entries[key] = result
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            if self._last is not None and self._last is not result:
+                # only the latest render is patched, so older ones keep just their encoded previews
+                self._last.release_audio()
+            self._last = result
+        return result
+
+    def clear(self):
+        self._entries.clear()
+        self._last = None
+
+    def stats(self):
+        # an unchanged pitch grid shares its render between canvas hashes
+        renders = {id(entry): entry for entry in self._entries.values()}.values()
+        return {
+            'entries': len(self._entries),
+            'mb': sum(entry.nbytes for entry in renders) / (1024 * 1024),
+            'hits': self.hits,
+            'incremental': self.incremental,
+            'full': self.full,
+        }
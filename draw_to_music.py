@@ -1,13 +1,15 @@
 import streamlit as st
-import tempfile
-import os
-from midi_utils import canvas_to_midi, midi_to_audio
+from canvas_render import CanvasRenderCache
+from synthesis import AUDIO_MIME_TYPES
+from tracing import record_error
 
 class DrawToMusicApp:
     """Modular class for Draw-to-Music functionality."""
     
     def __init__(self):
         self.canvas_key = "drawing_canvas"
+        # reruns and repeated clicks on an unchanged drawing reuse its render
+        self.render_cache = CanvasRenderCache()
         
     def render_canvas_controls(self):
         """Render canvas drawing controls."""
@@ -59,29 +61,20 @@ class DrawToMusicApp:
         if self.canvas_key in st.session_state:
             del st.session_state[self.canvas_key]
         self.canvas_key = f"drawing_canvas_{int(time.time())}"
+        self.render_cache.clear()
     
-    def process_drawing(self, canvas_result):
-        """Process the drawing and return MIDI and audio files."""
+    def process_drawing(self, canvas_result, audio_format="wav"):
+        """Process the drawing and return MIDI and audio bytes, without touching the disk."""
         if canvas_result is None or canvas_result.image_data is None:
             return None, None
         
-        with tempfile.TemporaryDirectory() as temp_dir:
-            midi_output_path = os.path.join(temp_dir, "drawn_music.mid")
-            audio_output_path = os.path.join(temp_dir, "drawn_music.wav")
-            
-            #  drawing to MIDI
-            if canvas_to_midi(canvas_result, midi_output_path):
-                #  MIDI to audio for playback
-                if midi_to_audio(midi_output_path, audio_output_path):
-                    # Read files into memory
-                    with open(midi_output_path, "rb") as f:
-                        midi_bytes = f.read()
-                    with open(audio_output_path, "rb") as f:
-                        audio_bytes = f.read()
-                    
-                    return midi_bytes, audio_bytes
-        
-        return None, None
+        try:
+            render = self.render_cache.render(canvas_result.image_data)
+            return render.midi_bytes, render.audio_bytes(audio_format)
+        except Exception as e:
+            record_error(e)
+            st.error(f"Error converting drawing to music: {e}")
+            return None, None
     
     def render_instructions(self):
         """Render usage instructions."""
@@ -107,18 +100,26 @@ def render_draw_to_music_ui():
         drawing_mode, stroke_width, stroke_color = draw_app.render_canvas_controls()
         canvas_result = draw_app.render_canvas(drawing_mode, stroke_width, stroke_color)
         
+        audio_format = st.radio(
+            "Preview format:",
+            ["wav", "flac", "ogg"],
+            horizontal=True,
+            help="FLAC and OGG previews are much smaller to send to the browser.",
+            key="preview_format"
+        )
+        
         col1, col2, col3 = st.columns(3)
         
         with col1:
             if st.button("Listen to Drawing", key="listen_drawing"):
                 if canvas_result.image_data is not None:
                     with st.spinner("Converting drawing to music..."):
-                        midi_bytes, audio_bytes = draw_app.process_drawing(canvas_result)
+                        midi_bytes, audio_bytes = draw_app.process_drawing(canvas_result, audio_format)
                     
                     if audio_bytes:
                         st.success("Music generated from your drawing!")
                         st.subheader("Listen to Your Drawing")
-                        st.audio(audio_bytes, format="audio/wav")
+                        st.audio(audio_bytes, format=AUDIO_MIME_TYPES[audio_format])
                         
                         # Store for download
                         st.session_state.drawing_midi = midi_bytes
@@ -1,57 +1,138 @@
 import streamlit as st
-import subprocess
 import os
-import music21
-from PIL import Image
+from omr_strategy import convert_with_strategy
+from omr_tiling import tiled_image_to_musicxml
+from job_queue import get_job_queue, render_job
+from tracing import record_span, set_attributes, span
 
-def image_to_musicxml(image_path, output_dir="."):
+OMR_STRATEGIES = {
+    "Predict from image": "predict",
+    "Race deskew variants": "race",
+    "Try in order": "sequential",
+}
+
+def report_omr_result(result):
+    """Show how an OMR conversion went and return its MusicXML path, or None if it failed."""
+    if result['strategy'] == 'cached' and not result['attempts']:
+        st.error(f"This image failed before, skipping it ({result['error']}). "
+                 "Tick 'Retry images that failed before' to try again.")
+        return None
+    if result.get('features'):
+        st.caption(f"Estimated skew {result['features']['skew_degrees']:+.2f}°, "
+                   f"{result['features']['width']}×{result['features']['height']} px")
+
+    for attempt in result['attempts']:
+        if attempt['error']:
+            label = f"Attempt {attempt['variant'] + 1}" if attempt['variant'] is not None else "Conversion"
+            st.warning(f"{label}: Conversion failed with error: {attempt['error']}")
+
+    if result['musicxml_path']:
+        st.success(f"Successfully converted image to MusicXML using attempt {result['variant'] + 1} "
+                   f"in {result['seconds']:.1f}s")
+        st.caption(" · ".join(f"{stage}: {seconds:.1f}s" for stage, seconds in result['stages'].items()))
+        return result['musicxml_path']
+
+    st.error(f"All conversion attempts failed. Last error: {result['error']}")
+    return None
+
+def record_omr_stages(result):
+    """Add the stage timings measured in the OMR worker to the open trace."""
+    for stage, seconds in result['stages'].items():
+        record_span(f"omr.stage.{stage}", seconds, variant=result['variant'])
+
+def traced_convert(image_path, output_dir, strategy="predict", retry_failed=False):
+    """convert_with_strategy inside an "omr.convert" span, with the worker's stages as child spans."""
+    with span("omr.convert", bytes=os.path.getsize(image_path), strategy=strategy):
+        result = convert_with_strategy(image_path, output_dir, strategy, retry_failed=retry_failed)
+        record_omr_stages(result)
+        set_attributes(attempts=len(result['attempts']), succeeded=bool(result['musicxml_path']))
+        return result
+
+def image_to_musicxml(image_path, output_dir=".", strategy="predict", retry_failed=False):
     if not os.path.exists(image_path):
         st.error(f"Error: Image file not found at {image_path}")
         return None
 
     try:
-        env = os.environ.copy()
-        env['TF_FORCE_GPU_ALLOW_GROWTH'] = 'true'
-        env['CUDA_MEMORY_FRACTION'] = '0.7'
-        
-        commands_to_try = [
-            ["oemer", image_path, "-o", output_dir, "--without-deskew"],
-            ["oemer", image_path, "-o", output_dir],
-            ["oemer", image_path, "-o", output_dir, "--use-tf", "--without-deskew"],
-        ]
-        
-        last_error = None
-        for i, command in enumerate(commands_to_try):
-            try:
-                st.info(f"Attempt {i+1}: Trying with command: {' '.join(command)}")
-                result = subprocess.run(command, check=True, capture_output=True, text=True, env=env, timeout=300)
-                
-                base_name = os.path.splitext(os.path.basename(image_path))[0]
-                musicxml_path = os.path.join(output_dir, base_name + ".musicxml")
-                
-                if os.path.exists(musicxml_path):
-                    st.success(f"Successfully converted image to MusicXML using attempt {i+1}")
-                    return musicxml_path
-                    
-            except subprocess.TimeoutExpired:
-                last_error = f"Attempt {i+1}: Process timed out after 5 minutes"
-                st.warning(last_error)
-                continue
-            except subprocess.CalledProcessError as e:
-                last_error = f"Attempt {i+1}: Command failed with error: {e.stderr}"
-                st.warning(last_error)
-                continue
-        
-        st.error(f"All conversion attempts failed. Last error: {last_error}")
-        return None
-        
+        return report_omr_result(traced_convert(image_path, output_dir, strategy, retry_failed))
+
     except Exception as e:
         st.error(f"Unexpected error during conversion: {str(e)}")
         return None
 
+def omr_job(progress, image_path, output_dir, strategy="predict", retry_failed=False):
+    """Background job: convert one sheet image to MusicXML."""
+    progress(0.1, "Converting image to MusicXML...")
+    return traced_convert(image_path, output_dir, strategy, retry_failed)
+
+def tiled_omr_job(progress, score_path, output_dir, strategy="predict", retry_failed=False):
+    """Background job: convert a large or multi-page score system by system."""
+    def report(done, total, result):
+        status = "converted" if result['musicxml_path'] else f"failed ({result['error']})"
+        progress(done / total, f"System {done}/{total} {status}")
+
+    progress(0.0, "Splitting score into staff systems...")
+    with span("omr.tiled", bytes=os.path.getsize(score_path), strategy=strategy):
+        try:
+            musicxml_path, tiles = tiled_image_to_musicxml(score_path, output_dir, strategy, progress=report,
+                                                           retry_failed=retry_failed)
+        except ImportError as e:
+            raise RuntimeError(f"PDF input is not available ({e}); install pypdfium2 to convert PDFs") from e
+        for tile in tiles:
+            record_omr_stages(tile)
+        failed_tiles = [os.path.basename(tile['image']) for tile in tiles if not tile['musicxml_path']]
+        set_attributes(systems=len(tiles), failed_systems=len(failed_tiles))
+    return {'musicxml_path': musicxml_path, 'tiles': tiles, 'failed_tiles': failed_tiles}
+
+def report_tiled_result(result):
+    """Show how many staff systems were converted and return the merged MusicXML path."""
+    tiles = result['tiles']
+    failed = [r for r in tiles if not r['musicxml_path']]
+    if failed:
+        st.warning(f"{len(failed)} of {len(tiles)} staff systems could not be converted and were left out.")
+        for r in failed:
+            st.caption(f"{os.path.basename(r['image'])}: {r['error']}")
+    if result['musicxml_path']:
+        st.success(f"Merged {len(tiles) - len(failed)} staff systems into one score")
+    return result['musicxml_path']
+
+def render_musicxml_downloads(musicxml_path):
+    """Offer the MusicXML and a MIDI rendering of it for download."""
+    st.success("Conversion completed successfully!")
+
+    with open(musicxml_path, "rb") as file:
+        st.download_button(
+            label="Download MusicXML",
+            data=file,
+            file_name=os.path.basename(musicxml_path),
+            mime="application/xml"
+        )
+
+    try:
+        import music21
+
+        with span("musicxml.to_midi", bytes=os.path.getsize(musicxml_path)):
+            score = music21.converter.parse(musicxml_path)
+            midi_path = musicxml_path.replace(".musicxml", ".mid")
+            score.write('midi', fp=midi_path)
+
+        if os.path.exists(midi_path):
+            with open(midi_path, "rb") as file:
+                st.download_button(
+                    label="Download MIDI",
+                    data=file,
+                    file_name=os.path.basename(midi_path),
+                    mime="audio/midi"
+                )
+            st.success("MIDI file generated successfully!")
+    except Exception as e:
+        st.warning(f"Could not generate MIDI file: {str(e)}")
+
 def resize_image(image_path, output_path, max_size=600):
+    from PIL import Image
+
     try:
-        with Image.open(image_path) as img:
+        with span("omr.resize", max_size=max_size), Image.open(image_path) as img:
             original_size = img.size
             
             if img.mode != 'RGB':
@@ -85,7 +166,7 @@ def render_image_to_musicxml_ui():
     
     st.info("Using GPU acceleration for faster processing. Large images will be resized to prevent memory issues.")
 
-    uploaded_file = st.file_uploader("Choose an image file", type=["png", "jpg", "jpeg"])
+    uploaded_file = st.file_uploader("Choose an image file", type=["png", "jpg", "jpeg", "tif", "tiff", "pdf"])
 
     if uploaded_file is not None:
         temp_dir = "temp"
@@ -93,51 +174,51 @@ def render_image_to_musicxml_ui():
             os.makedirs(temp_dir)
 
         original_image_path = os.path.join(temp_dir, uploaded_file.name)
-        base_name, _ = os.path.splitext(uploaded_file.name)
+        base_name, extension = os.path.splitext(uploaded_file.name)
         processed_image_path = os.path.join(temp_dir, base_name + "_processed.jpg")
 
         with open(original_image_path, "wb") as f:
             f.write(uploaded_file.getbuffer())
 
-        final_image_path = resize_image(original_image_path, processed_image_path, max_size=600)
+        multi_page = extension.lower() in (".pdf", ".tif", ".tiff")
+        tiled = st.checkbox(
+            "Split into staff systems at full resolution (needed for PDFs and multi-page scores)",
+            value=multi_page, disabled=multi_page, key="omr_tiled"
+        )
+
+        if tiled:
+            final_image_path = original_image_path
+        else:
+            final_image_path = resize_image(original_image_path, processed_image_path, max_size=600)
+
+            st.subheader("Processed Image")
+            from PIL import Image
+
+            processed_image = Image.open(final_image_path)
+            st.image(processed_image, caption="Image ready for processing", use_column_width=True)
 
-        st.subheader("Processed Image")
-        processed_image = Image.open(final_image_path)
-        st.image(processed_image, caption="Image ready for processing", use_column_width=True)
+        strategy = st.radio("Fallback strategy:", list(OMR_STRATEGIES), horizontal=True, key="omr_strategy")
+        retry_failed = st.checkbox("Retry images that failed before", value=False, key="omr_retry_failed")
 
         if st.button("Convert to MusicXML and MIDI"):
-            with st.spinner("Converting image to MusicXML using GPU acceleration..."):
-                musicxml_path = image_to_musicxml(final_image_path, temp_dir)
+            queue = get_job_queue()
+            if tiled:
+                st.session_state["omr_job"] = queue.submit(
+                    'omr', tiled_omr_job, final_image_path, temp_dir, OMR_STRATEGIES[strategy], retry_failed
+                )
+            else:
+                st.session_state["omr_job"] = queue.submit(
+                    'omr', omr_job, final_image_path, temp_dir, OMR_STRATEGIES[strategy], retry_failed
+                )
 
+        def render_result(result):
+            musicxml_path = report_tiled_result(result) if 'tiles' in result else report_omr_result(result)
             if musicxml_path:
-                st.success("Conversion completed successfully!")
-                
-                with open(musicxml_path, "rb") as file:
-                    st.download_button(
-                        label="Download MusicXML",
-                        data=file,
-                        file_name=os.path.basename(musicxml_path),
-                        mime="application/xml"
-                    )
-
-                try:
-                    score = music21.converter.parse(musicxml_path)
-                    midi_path = musicxml_path.replace(".musicxml", ".mid")
-                    score.write('midi', fp=midi_path)
-                    
-                    if os.path.exists(midi_path):
-                        with open(midi_path, "rb") as file:
-                            st.download_button(
-                                label="Download MIDI",
-                                data=file,
-                                file_name=os.path.basename(midi_path),
-                                mime="audio/midi"
-                            )
-                        st.success("MIDI file generated successfully!")
-                except Exception as e:
-                    st.warning(f"Could not generate MIDI file: {str(e)}")
+                render_musicxml_downloads(musicxml_path)
             else:
                 st.error("Failed to convert the image to MusicXML. Please try with a different image.")
 
+        render_job("omr_job", render_result)
+
 if __name__ == "__main__":
     render_image_to_musicxml_ui()
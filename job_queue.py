@@ -0,0 +1,175 @@
+import streamlit as st
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from tracing import record_error, span
+
+# jobs of one model type that may run at once; more wait in that type's queue
+MODEL_LIMITS = {
+    'basic-pitch': 1,
+    'whistle': 2,
+    'omr': 2,
+}
+JOB_RETENTION_SECONDS = 3600  # finished jobs older than this are pruned
+JOB_POLL_SECONDS = 1.0
+
+class JobStore:
+    """SQLite table of job status, progress and pickled results; ':memory:' keeps it in-process."""
+
+    def __init__(self, path=":memory:"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT, status TEXT, progress REAL, message TEXT,"
+                " result BLOB, error TEXT, created_at REAL, started_at REAL, finished_at REAL)"
+            )
+            # a job that was queued or running when the last process exited will never finish
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'interrupted by a restart', finished_at = ?"
+                " WHERE status IN ('queued', 'running')", (time.time(),)
+            )
+
+    def create(self, job_id, kind):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, progress, message, created_at)"
+                " VALUES (?, ?, 'queued', 0.0, 'Waiting for a free worker', ?)",
+                (job_id, kind, time.time())
+            )
+
+    def update(self, job_id, **fields):
+        if 'result' in fields:
+            fields['result'] = pickle.dumps(fields['result'], protocol=pickle.HIGHEST_PROTOCOL)
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        """Return the job's status fields without its result, or None if it is unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, status, progress, message, error, created_at, started_at, finished_at"
+                " FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ('id', 'kind', 'status', 'progress', 'message', 'error', 'created_at', 'started_at',
+                'finished_at')
+        return dict(zip(keys, row))
+
+    def result(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return pickle.loads(row[0]) if row and row[0] is not None else None
+
+    def counts(self):
+        """Number of jobs per (kind, status)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status").fetchall()
+        return {f"{kind}/{status}": count for kind, status, count in rows}
+
+    def prune(self, max_age=JOB_RETENTION_SECONDS):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - max_age,)
+            )
+
+class JobQueue:
+    """Background execution of conversions, with one bounded worker pool per model type.
+
+    Jobs run in threads of this process, so they share the models already held
+    by the model registry; OMR jobs hand their work on to the OMR worker
+    processes. A job function is called as fn(progress, *args) and may call
+    progress(fraction, message) to report how far it got.
+    """
+
+    def __init__(self, store=None, limits=MODEL_LIMITS):
+        self.store = store or JobStore()
+        self.limits = dict(limits)
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, kind):
+        with self._lock:
+            if kind not in self._pools:
+                self._pools[kind] = ThreadPoolExecutor(self.limits.get(kind, 1), thread_name_prefix=f"job-{kind}")
+            return self._pools[kind]
+
+    def submit(self, kind, fn, *args):
+        """Queue fn(progress, *args) under the given model type and return its job id."""
+        self.store.prune()
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, kind)
+        self._pool(kind).submit(self._run, job_id, kind, fn, args)
+        return job_id
+
+    def _run(self, job_id, kind, fn, args):
+        self.store.update(job_id, status='running', message='Started', started_at=time.time())
+
+        def progress(fraction=None, message=None):
+            fields = {}
+            if fraction is not None:
+                fields['progress'] = float(min(max(fraction, 0.0), 1.0))
+            if message is not None:
+                fields['message'] = message
+            if fields:
+                self.store.update(job_id, **fields)
+
+        # the job's span is the root the conversion's own spans nest under
+        with span(f"job.{kind}", job_id=job_id):
+            try:
+                result = fn(progress, *args)
+                self.store.update(job_id, status='done', progress=1.0, message='Finished', result=result,
+                                  finished_at=time.time())
+            except Exception as e:
+                record_error(e)
+                self.store.update(job_id, status='failed', message='Failed', error=f"{type(e).__name__}: {e}",
+                                  finished_at=time.time())
+
+    def status(self, job_id):
+        return self.store.get(job_id)
+
+    def result(self, job_id):
+        return self.store.result(job_id)
+
+@st.cache_resource
+def get_job_queue():
+    """Return the job queue shared by every session in this process."""
+    return JobQueue(JobStore(os.environ.get("SAPE_JOB_DB", ":memory:")))
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _poll_job(job_id):
+    job = get_job_queue().status(job_id)
+    if job is None or job['status'] in ('done', 'failed'):
+        # rerun the whole page so the result is drawn outside this polling fragment
+        st.rerun(scope="app")
+    elapsed = time.time() - (job['started_at'] or job['created_at'])
+    st.progress(job['progress'], text=f"{job['message']} ({elapsed:.0f}s)")
+
+def render_job(session_key, render_result):
+    """Show the progress of the job whose id is in st.session_state[session_key], then its result.
+
+    render_result is called with the job's return value once it is done. The
+    page polls only while the job is unfinished, so other widgets stay usable.
+    """
+    job_id = st.session_state.get(session_key)
+    if job_id is None:
+        return
+    queue = get_job_queue()
+    job = queue.status(job_id)
+    if job is None:
+        st.warning("This conversion is no longer available. Please run it again.")
+        del st.session_state[session_key]
+    elif job['status'] in ('queued', 'running'):
+        _poll_job(job_id)
+    elif job['status'] == 'failed':
+        st.error(f"Conversion failed: {job['error']}")
+    else:
+        render_result(queue.result(job_id))
@@ -0,0 +1,266 @@
+import streamlit as st
+import numpy as np
+import queue
+import time
+from collections import namedtuple
+from audio_processing import autocorrelation_pitch, frequencies_to_midi, midi_to_note_name
+from model_registry import get_model_registry
+
+LIVE_SAMPLE_RATE = 16000
+LATENCY_BUDGET = 0.1  # seconds, end-to-end from sound to note event
+
+# kind is 'note_on' or 'note_off'; stream_time is where the change starts in the
+# audio, latency how long after that sound was captured the event came out
+NoteEvent = namedtuple('NoteEvent', ['kind', 'pitch', 'note_name', 'stream_time', 'latency'])
+
+class WavFileSource:
+    """Simulated microphone that plays an audio file back in hop-sized frames."""
+
+    def __init__(self, source, sr=LIVE_SAMPLE_RATE, hop_length=160, realtime=False):
+        import soundfile as sf
+
+        audio, file_sr = sf.read(source, dtype='float32', always_2d=True)
+        audio = audio.mean(axis=1)
+        if file_sr != sr:
+            import soxr
+            audio = soxr.resample(audio, file_sr, sr)
+        self.audio = audio.astype(np.float32)
+        self.sr = sr
+        self.hop_length = hop_length
+        self.realtime = realtime
+
+    def __iter__(self):
+        """Yield (frame, capture_time) pairs, pacing them like a live input when realtime is set."""
+        started = time.perf_counter()
+        for start in range(0, len(self.audio) - self.hop_length + 1, self.hop_length):
+            end = start + self.hop_length
+            if self.realtime:
+                # a live input delivers a frame once its last sample has been captured
+                delay = started + end / self.sr - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield self.audio[start:end], time.perf_counter()
+
+class MicrophoneSource:
+    """Live microphone input through the optional sounddevice package."""
+
+    def __init__(self, duration, sr=LIVE_SAMPLE_RATE, hop_length=160):
+        self.duration = duration
+        self.sr = sr
+        self.hop_length = hop_length
+
+    def __iter__(self):
+        import sounddevice as sd
+
+        frames = queue.Queue()
+
+        def callback(indata, n_frames, time_info, status):
+            frames.put((indata[:, 0].copy(), time.perf_counter()))
+
+        n_hops = int(self.duration * self.sr / self.hop_length)
+        with sd.InputStream(samplerate=self.sr, blocksize=self.hop_length, channels=1,
+                            dtype='float32', callback=callback):
+            for _ in range(n_hops):
+                yield frames.get()
+
+class YinDetector:
+    """Fast DSP pitch detector; analyses every hop as soon as it arrives."""
+
+    def __init__(self, sr=LIVE_SAMPLE_RATE, window_length=512, fmin=200, fmax=4000, threshold=0.15):
+        self.sr = sr
+        self.window_length = window_length
+        self.batch_size = 1
+        self.fmin = fmin
+        self.fmax = fmax
+        self.threshold = threshold
+
+    def detect(self, windows):
+        return autocorrelation_pitch(windows, self.sr, self.fmin, self.fmax, self.threshold)
+
+class CrepeDetector:
+    """CREPE on short windows, batching a few hops per model call to amortize its overhead."""
+
+    def __init__(self, capacity='tiny', batch_size=4, confidence_threshold=0.5):
+        self.sr = 16000
+        self.window_length = 1024
+        self.batch_size = batch_size
+        self.capacity = capacity
+        self.confidence_threshold = confidence_threshold
+        self.model = get_model_registry().get_crepe_model(capacity)
+
+    def detect(self, windows):
+        import crepe.core
+
+        frames = np.array(windows, dtype=np.float32)
+        frames -= frames.mean(axis=1, keepdims=True)
+        frames /= np.clip(frames.std(axis=1, keepdims=True), 1e-8, None)
+        with get_model_registry().track_inference(f"crepe-{self.capacity}"):
+            activation = self.model.predict(frames, verbose=0)
+        confidence = activation.max(axis=1)
+        frequency = 10 * 2 ** (crepe.core.to_local_average_cents(activation) / 1200)
+        frequency[np.isnan(frequency) | (confidence < self.confidence_threshold)] = 0
+        return frequency, confidence
+
+class LiveNoteTracker:
+    """Turn a stream of audio frames into note-on/note-off events.
+
+    A note starts once the same MIDI pitch has been detected for on_frames
+    hops and ends after off_frames hops of silence or another pitch, which
+    keeps vibrato and single-frame glitches from producing events.
+    """
+
+    def __init__(self, detector, on_frames=3, off_frames=3):
+        self.detector = detector
+        self.on_frames = on_frames
+        self.off_frames = off_frames
+        self.window = np.zeros(detector.window_length, dtype=np.float32)
+        self.samples_seen = 0
+        self.pending = []  # (window, stream_time, capture_time) waiting for a detector batch
+        self.current_pitch = -1
+        self.candidate_pitch = -1
+        self.candidate_count = 0
+        self.candidate_start = 0.0
+
+    def process(self, frame, capture_time):
+        """Feed one hop of audio and return the note events it completes."""
+        frame = np.asarray(frame, dtype=np.float32)
+        self.window = np.concatenate([self.window[len(frame):], frame])
+        self.samples_seen += len(frame)
+        # the detector window is centred half a window behind the newest sample
+        stream_time = (self.samples_seen - self.detector.window_length / 2) / self.detector.sr
+        self.pending.append((self.window.copy(), max(stream_time, 0.0), capture_time))
+        if len(self.pending) < self.detector.batch_size:
+            return []
+        return self._flush()
+
+    def finish(self, capture_time=None):
+        """Analyse any frames still waiting for a batch and close the sounding note."""
+        events = self._flush() if self.pending else []
+        if self.current_pitch >= 0:
+            end_time = self.samples_seen / self.detector.sr
+            newest_stream_time = end_time - self.detector.window_length / 2 / self.detector.sr
+            events.append(self._event('note_off', self.current_pitch, end_time, newest_stream_time,
+                                      capture_time or time.perf_counter()))
+            self.current_pitch = -1
+        return events
+
+    def _flush(self):
+        windows = np.stack([window for window, _, _ in self.pending])
+        frequency, _ = self.detector.detect(windows)
+        pitches = frequencies_to_midi(frequency)
+        newest_stream_time = self.pending[-1][1]
+        newest_capture = self.pending[-1][2]
+
+        events = []
+        for pitch, (_, stream_time, _) in zip(pitches, self.pending):
+            if pitch == self.candidate_pitch:
+                self.candidate_count += 1
+            else:
+                self.candidate_pitch = pitch
+                self.candidate_count = 1
+                self.candidate_start = stream_time
+
+            needed = self.on_frames if self.candidate_pitch >= 0 else self.off_frames
+            if self.candidate_pitch != self.current_pitch and self.candidate_count == needed:
+                if self.current_pitch >= 0:
+                    events.append(self._event('note_off', self.current_pitch, self.candidate_start,
+                                              newest_stream_time, newest_capture))
+                if self.candidate_pitch >= 0:
+                    events.append(self._event('note_on', self.candidate_pitch, self.candidate_start,
+                                              newest_stream_time, newest_capture))
+                self.current_pitch = self.candidate_pitch
+        self.pending = []
+        return events
+
+    def _event(self, kind, pitch, stream_time, newest_stream_time, newest_capture):
+        # time the triggering sound spent in the stream plus the wall time since the
+        # newest frame arrived; this holds for both real-time and as-fast-as-possible sources
+        now = time.perf_counter()
+        latency = (newest_stream_time - stream_time) + (now - newest_capture) \
+            + self.detector.window_length / 2 / self.detector.sr
+        return NoteEvent(kind, int(pitch), midi_to_note_name(int(pitch)), stream_time, latency)
+
+def run_live(source, tracker):
+    """Yield note events from a frame source as they are detected."""
+    capture_time = None
+    for frame, capture_time in source:
+        yield from tracker.process(frame, capture_time)
+    yield from tracker.finish(capture_time)
+
+def summarize_latency(events, budget=LATENCY_BUDGET):
+    """Report mean, 95th percentile and worst-case event latency against the budget."""
+    if not events:
+        return {'events': 0, 'budget': budget}
+    latencies = np.array([event.latency for event in events])
+    return {
+        'events': len(events),
+        'mean': float(latencies.mean()),
+        'p95': float(np.percentile(latencies, 95)),
+        'max': float(latencies.max()),
+        'budget': budget,
+        'within_budget': float(np.mean(latencies <= budget)),
+    }
+
+def render_live_whistle_ui():
+    """Render the live note detection tab."""
+    st.write("Detect notes frame by frame as audio arrives, with the measured latency of every event.")
+
+    detector_name = st.radio(
+        "Pitch detector:",
+        ["YIN (fast DSP)", "CREPE tiny (batched)"],
+        horizontal=True,
+        key="live_detector"
+    )
+
+    source_kind = st.radio(
+        "Audio source:",
+        ["Simulate from WAV file", "Microphone"],
+        horizontal=True,
+        key="live_source"
+    )
+
+    source = None
+    if source_kind == "Simulate from WAV file":
+        live_file = st.file_uploader("Choose a WAV file to play back", type=['wav'], key="live_uploader")
+        realtime = st.checkbox("Play back at real-time speed", value=False, key="live_realtime")
+        if live_file and st.button("Start live detection", key="start_live_file"):
+            source = WavFileSource(live_file, realtime=realtime)
+    else:
+        duration = st.slider("Listen for (seconds):", 2, 30, 10, key="live_duration")
+        if st.button("Start listening", key="start_live_mic"):
+            source = MicrophoneSource(duration)
+
+    if source is None:
+        return
+
+    try:
+        detector = YinDetector() if detector_name.startswith("YIN") else CrepeDetector()
+        tracker = LiveNoteTracker(detector)
+
+        events = []
+        placeholder = st.empty()
+        for event in run_live(source, tracker):
+            events.append(event)
+            if event.kind == 'note_on':
+                placeholder.markdown(f"### {event.note_name}")
+        placeholder.empty()
+    except ImportError as e:
+        st.error(f"Live input is not available: {e}. Install sounddevice for microphone input.")
+        return
+
+    summary = summarize_latency(events)
+    if not events:
+        st.warning("No notes detected.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Mean latency", f"{summary['mean'] * 1000:.0f} ms")
+    col2.metric("95th percentile", f"{summary['p95'] * 1000:.0f} ms")
+    col3.metric("Within budget", f"{summary['within_budget'] * 100:.0f}%",
+                help=f"Share of events under {LATENCY_BUDGET * 1000:.0f} ms")
+
+    st.dataframe(
+        [{'event': e.kind, 'note': e.note_name, 'time (s)': round(e.stream_time, 3),
+          'latency (ms)': round(e.latency * 1000, 1)} for e in events],
+        use_container_width=True
+    )
@@ -1,142 +1,207 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-from io import BytesIO
 import numpy as np
+from io import BytesIO
+from functools import lru_cache
+from xml.sax.saxutils import escape
+from note_array import NoteArray
+from tracing import record_error, span
 
-def create_sheet_music_from_notes(notes):
-    """Create sheet music visualization using matplotlib."""
-    try:
-        fig, ax = plt.subplots(figsize=(12, 6))
-        
-        #  staff lines
-        staff_lines = [0, 1, 2, 3, 4]
-        for line in staff_lines:
-            ax.axhline(y=line, color='black', linewidth=1)
-        
-        #  notes
-        note_positions = {'C': 0, 'D': 0.5, 'E': 1, 'F': 1.5, 'G': 2, 'A': 2.5, 'B': 3}
-        
-        x_pos = 0
-        for note in notes:
-            if note['note_name']:
-                note_base = note['note_name'][0]
-                if note_base in note_positions:
-                    y_pos = note_positions[note_base]
-                    ax.scatter(x_pos, y_pos, s=200, c='black')
-                    ax.text(x_pos, y_pos + 0.3, note['note_name'], ha='center', fontsize=8)
-            x_pos += 1
-        
-        ax.set_xlim(-0.5, len(notes) + 0.5)
-        ax.set_ylim(-0.5, 4.5)
-        ax.set_title("Generated Sheet Music")
-        ax.axis('off')
-        
-        # save to bytes
-        buf = BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight', dpi=150)
-        buf.seek(0)
-        plt.close()
-        
-        return buf.getvalue()
-    except Exception as e:
-        st.error(f"Error creating sheet music: {e}")
-        return None
+# staff position of each note letter, in staff-line units above the bottom line
+NOTE_POSITIONS = {'C': 0, 'D': 0.5, 'E': 1, 'F': 1.5, 'G': 2, 'A': 2.5, 'B': 3}
+
+SHEET_WIDTH = 1200
+SHEET_MARGIN = 40
+LINE_GAP = 12  # pixels between staff lines
+SYSTEM_HEIGHT = 110
+TITLE_HEIGHT = 50
+
+CANVAS_TIME_STEP = 0.25  # seconds per canvas column
+CANVAS_PITCH_RANGE = (60, 84)  # C4 to C6, bottom to top
+CANVAS_DRAWN_THRESHOLD = 200  # grayscale below this counts as drawn
+
+@lru_cache(maxsize=64)
+def _render_sheet_pages(note_names, notes_per_system, systems_per_page):
+    """Render note names to SVG pages; cached on the note names and layout."""
+    n_systems = max(1, -(-len(note_names) // notes_per_system))
+    note_spacing = (SHEET_WIDTH - 2 * SHEET_MARGIN) / notes_per_system
+    pages = []
+
+    for first_system in range(0, n_systems, systems_per_page):
+        systems = range(first_system, min(first_system + systems_per_page, n_systems))
+        top = TITLE_HEIGHT if first_system == 0 else SHEET_MARGIN / 2
+        height = int(top + len(systems) * SYSTEM_HEIGHT)
+        parts = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{SHEET_WIDTH}" height="{height}" '
+            f'viewBox="0 0 {SHEET_WIDTH} {height}" font-family="sans-serif">',
+            '<rect width="100%" height="100%" fill="white"/>',
+        ]
+        if first_system == 0:
+            parts.append(f'<text x="{SHEET_WIDTH / 2}" y="30" text-anchor="middle" font-size="18">'
+                         f'{escape("Generated Sheet Music")}</text>')
+
+        for row, system in enumerate(systems):
+            # y of the bottom staff line; higher notes go up the page
+            bottom = top + row * SYSTEM_HEIGHT + 40 + 4 * LINE_GAP
+            lines = " ".join(
+                f"M{SHEET_MARGIN} {bottom - i * LINE_GAP}H{SHEET_WIDTH - SHEET_MARGIN}" for i in range(5)
+            )
+            parts.append(f'<path d="{lines}" stroke="black" stroke-width="1"/>')
+
+            start = system * notes_per_system
+            for i, note_name in enumerate(note_names[start:start + notes_per_system]):
+                if not note_name or note_name[0] not in NOTE_POSITIONS:
+                    continue
+                x = SHEET_MARGIN + (i + 0.5) * note_spacing
+                y = bottom - NOTE_POSITIONS[note_name[0]] * LINE_GAP
+                parts.append(f'<ellipse cx="{x:.1f}" cy="{y:.1f}" rx="7" ry="5.5" fill="black"/>')
+                parts.append(f'<text x="{x:.1f}" y="{y - 0.3 * LINE_GAP - 8:.1f}" text-anchor="middle" '
+                             f'font-size="10">{escape(note_name)}</text>')
+
+        parts.append('</svg>')
+        pages.append("".join(parts))
+
+    return tuple(pages)
+
+def create_sheet_music_from_notes(notes, notes_per_system=16, systems_per_page=4):
+    """Create sheet music as SVG from a NoteArray, one string per page of staff systems."""
+    with span("sheet.render", notes=len(notes)):
+        try:
+            note_names = tuple(notes.note_names)
+            return list(_render_sheet_pages(note_names, notes_per_system, systems_per_page))
+        except Exception as e:
+            record_error(e)
+            st.error(f"Error creating sheet music: {e}")
+            return None
+
+def midi_to_bytes(midi):
+    """Serialize a PrettyMIDI object to Standard MIDI File bytes in memory."""
+    buf = BytesIO()
+    midi.write(buf)
+    return buf.getvalue()
+
+def _write_output(data, output):
+    """Write bytes to a path or a file-like object."""
+    if hasattr(output, "write"):
+        output.write(data)
+    else:
+        with open(output, "wb") as f:
+            f.write(data)
+
+def notes_to_midi_bytes(notes):
+    """Build single-instrument (piano) MIDI bytes from a NoteArray."""
+    with span("midi.write", notes=len(notes)):
+        return notes.to_midi_bytes()
 
 def create_midi_from_notes(notes, output_path):
-    """Create MIDI file from detected notes."""
-    try:
-        import pretty_midi
-        
-        midi = pretty_midi.PrettyMIDI()
-        instrument = pretty_midi.Instrument(program=0)  # Piano
-        
-        for i, note in enumerate(notes):
-            if note['note_name'] and note['frequency'] > 0:
-                # Convert note name to MIDI number
-                note_number = pretty_midi.note_name_to_number(note['note_name'])
-                
-                # Create note with duration
-                midi_note = pretty_midi.Note(
-                    velocity=100,
-                    pitch=note_number,
-                    start=note['start_time'],
-                    end=note['end_time']
-                )
-                instrument.notes.append(midi_note)
-        
-        midi.instruments.append(instrument)
-        midi.write(output_path)
-        return True
-    except Exception as e:
-        st.error(f"Error creating MIDI: {e}")
-        return False
+    """Create MIDI file from a NoteArray; output_path may be a path or a file-like object."""
+    with span("midi.create_file", notes=len(notes)):
+        try:
+            _write_output(notes_to_midi_bytes(notes), output_path)
+            return True
+        except Exception as e:
+            record_error(e)
+            st.error(f"Error creating MIDI: {e}")
+            return False
+
+def canvas_pitch_grid(image_data, pitch_range=CANVAS_PITCH_RANGE, threshold=CANVAS_DRAWN_THRESHOLD):
+    """Return a (n_pitches, width) boolean grid of the pitches drawn in each canvas column."""
+    img_data = np.asarray(image_data)
+
+    # Find pixels that are drawn (non-white); mean(RGB) < threshold without going through floats
+    if img_data.ndim == 3:
+        drawn = img_data[:, :, :3].sum(axis=2, dtype=np.int32) < 3 * threshold
+    else:
+        drawn = img_data < threshold
+
+    height, width = drawn.shape
+    # Convert y position to pitch, top row = highest pitch
+    rows = np.arange(height)
+    row_pitches = (pitch_range[1] - (rows / height) * (pitch_range[1] - pitch_range[0])).astype(np.int64)
+    row_pitches = np.clip(row_pitches, pitch_range[0], pitch_range[1])
+
+    # each pitch covers a contiguous band of rows, so OR-reduce the bands in one call
+    band_starts = np.flatnonzero(np.diff(row_pitches, prepend=row_pitches[0] + 1))
+    grid = np.zeros((pitch_range[1] - pitch_range[0] + 1, width), dtype=bool)
+    grid[row_pitches[band_starts] - pitch_range[0]] = np.logical_or.reduceat(drawn, band_starts, axis=0)
+    return grid
+
+def grid_to_notes(grid, time_step=CANVAS_TIME_STEP, lowest_pitch=CANVAS_PITCH_RANGE[0]):
+    """Merge runs of drawn columns into sustained notes, ordered by onset then pitch."""
+    edges = np.diff(np.pad(grid, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    # nonzero walks row by row, so the n-th onset and n-th release of a pitch pair up
+    pitch_index, onset_columns = np.nonzero(edges == 1)
+    _, release_columns = np.nonzero(edges == -1)
+
+    order = np.lexsort((pitch_index, onset_columns))
+    return NoteArray(pitch_index[order] + lowest_pitch, onset_columns[order] * time_step,
+                     release_columns[order] * time_step)
+
+def canvas_to_midi_bytes(image_data):
+    """Convert canvas image data to MIDI bytes."""
+    # Each column = CANVAS_TIME_STEP seconds, consecutive drawn columns become one note
+    with span("canvas.to_midi", pixels=int(np.prod(np.shape(image_data)[:2]))):
+        return notes_to_midi_bytes(grid_to_notes(canvas_pitch_grid(image_data)))
 
 def canvas_to_midi(canvas_data, output_path):
-    """Convert canvas drawing to MIDI file."""
-    try:
-        import pretty_midi
-        
-        if canvas_data is None or canvas_data.image_data is None:
+    """Convert canvas drawing to MIDI file; output_path may be a path or a file-like object."""
+    with span("canvas.to_midi_file"):
+        try:
+            if canvas_data is None or canvas_data.image_data is None:
+                return False
+
+            _write_output(canvas_to_midi_bytes(canvas_data.image_data), output_path)
+            return True
+        except Exception as e:
+            record_error(e)
+            st.error(f"Error converting canvas to MIDI: {e}")
+            return False
+
+def notes_to_audio_bytes(notes, audio_format="wav", streaming=False):
+    """Synthesize a NoteArray straight to encoded audio bytes.
+
+    With streaming the audio is rendered and encoded block by block instead
+    of in one buffer.
+    """
+    from synthesis import SYNTH_SAMPLE_RATE, normalize, stream_notes, synthesize_notes, write_audio
+    
+    with span("audio.synthesize", notes=len(notes), format=audio_format, streaming=streaming):
+        if streaming:
+            audio = stream_notes(notes.pitch, notes.start, notes.end, notes.velocity)
+        else:
+            audio = normalize(synthesize_notes(notes.pitch, notes.start, notes.end, notes.velocity))
+        buf = BytesIO()
+        write_audio(audio, buf, SYNTH_SAMPLE_RATE, audio_format)
+        return buf.getvalue()
+
+def midi_bytes_to_audio_bytes(midi_bytes, audio_format="wav", streaming=False):
+    """Synthesize MIDI bytes to encoded audio bytes ('wav', 'flac' or 'ogg')."""
+    import pretty_midi
+    
+    with span("midi.to_audio", bytes=len(midi_bytes), format=audio_format):
+        midi = pretty_midi.PrettyMIDI(BytesIO(midi_bytes))
+        return notes_to_audio_bytes(NoteArray.from_pretty_midi(midi), audio_format, streaming)
+
+def midi_to_audio(midi_path, output_path, audio_format=None, streaming=False):
+    """Convert MIDI file to audio for playback.
+
+    midi_path and output_path may be paths or file-like objects.
+    audio_format is 'wav', 'flac' or 'ogg' (default: from the output file
+    extension).
+    """
+    with span("midi.to_audio_file"):
+        try:
+            if audio_format is None:
+                extension = str(output_path).rsplit(".", 1)[-1].lower() if isinstance(output_path, str) else ""
+                audio_format = extension if extension in ('wav', 'flac', 'ogg') else 'wav'
+
+            if hasattr(midi_path, "read"):
+                midi_bytes = midi_path.read()
+            else:
+                with open(midi_path, "rb") as f:
+                    midi_bytes = f.read()
+            _write_output(midi_bytes_to_audio_bytes(midi_bytes, audio_format, streaming), output_path)
+            return True
+        except Exception as e:
+            record_error(e)
+            st.error(f"Error converting MIDI to audio: {e}")
             return False
-        
-        # Get image data
-        img_data = np.array(canvas_data.image_data)
-        
-        # Convert to grayscale if RGB
-        if len(img_data.shape) == 3:
-            img_data = np.mean(img_data[:, :, :3], axis=2)
-        
-        height, width = img_data.shape
-        
-        # Create MIDI
-        midi = pretty_midi.PrettyMIDI()
-        instrument = pretty_midi.Instrument(program=0)  # Piano
-        
-        # Parameters
-        time_step = 0.25  # Each column = 0.25 seconds
-        pitch_range = (60, 84)  # C4 to C6
-        
-        # Process each column (time step)
-        for x in range(width):
-            column = img_data[:, x]
-            
-            # Find pixels that are drawn (non-white)
-            drawn_pixels = np.where(column < 200)[0]  # Threshold for "drawn"
-            
-            for y in drawn_pixels:
-                # Convert y position to pitch
-                pitch = int(pitch_range[1] - (y / height) * (pitch_range[1] - pitch_range[0]))
-                pitch = max(pitch_range[0], min(pitch_range[1], pitch))
-                
-                # Create note
-                start_time = x * time_step
-                end_time = start_time + time_step
-                
-                midi_note = pretty_midi.Note(
-                    velocity=100,
-                    pitch=pitch,
-                    start=start_time,
-                    end=end_time
-                )
-                instrument.notes.append(midi_note)
-        
-        midi.instruments.append(instrument)
-        midi.write(output_path)
-        return True
-    except Exception as e:
-        st.error(f"Error converting canvas to MIDI: {e}")
-        return False
-
-def midi_to_audio(midi_path, output_path):
-    """Convert MIDI file to audio for playback."""
-    try:
-        import pretty_midi
-        import soundfile as sf
-        
-        midi = pretty_midi.PrettyMIDI(midi_path)
-        audio = midi.synthesize(fs=22050)
-        sf.write(output_path, audio, 22050)
-        return True
-    except Exception as e:
-        st.error(f"Error converting MIDI to audio: {e}")
-        return False
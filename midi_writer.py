@@ -0,0 +1,82 @@
+import numpy as np
+
+TICKS_PER_BEAT = 480
+TEMPO_BPM = 120
+MICROSECONDS_PER_BEAT = 60_000_000 // TEMPO_BPM
+TICKS_PER_SECOND = TICKS_PER_BEAT * TEMPO_BPM / 60
+
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+PROGRAM_CHANGE = 0xC0
+
+def _vlq_lengths(values):
+    """Bytes needed for each value as a MIDI variable-length quantity (7 bits per byte)."""
+    return 1 + (values >= 1 << 7) + (values >= 1 << 14) + (values >= 1 << 21)
+
+def encode_events(ticks, status, data1, data2):
+    """Encode channel events as delta-time prefixed 3-byte messages into one uint8 array.
+
+    ticks must be sorted; every event gets its own status byte (no running status).
+    """
+    deltas = np.diff(ticks, prepend=0).astype(np.int64)
+    lengths = _vlq_lengths(deltas)
+    sizes = lengths + 3
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    out = np.empty(int(sizes.sum()), dtype=np.uint8)
+
+    # byte i of every delta that is at least i + 1 bytes long, most significant group first
+    for i in range(4):
+        has = np.flatnonzero(lengths > i)
+        remaining = lengths[has] - 1 - i
+        groups = (deltas[has] >> (7 * remaining)) & 0x7F
+        out[offsets[has] + i] = groups | np.where(remaining > 0, 0x80, 0)
+
+    message = offsets + lengths
+    out[message] = status
+    out[message + 1] = data1
+    out[message + 2] = data2
+    return out
+
+def write_midi_bytes(pitches, starts, ends, velocities=100, program=0, channel=0):
+    """Standard MIDI File bytes (format 0, one track) for notes given as NumPy arrays, without pretty_midi.
+
+    Times are in seconds at a fixed 120 BPM and rounded to TICKS_PER_BEAT. At
+    equal ticks note-offs come before note-ons, so a repeated pitch restarts
+    cleanly, and a note is at least one tick long so it survives parsing.
+    Pitches, program and channel outside their MIDI ranges raise ValueError
+    rather than corrupting the stream; velocities are clipped to 1-127.
+    """
+    pitches = np.asarray(pitches, dtype=np.int64)
+    if len(pitches) and (pitches.min() < 0 or pitches.max() > 127):
+        raise ValueError(f"MIDI pitches must be in 0-127, got {pitches.min()} to {pitches.max()}")
+    if not 0 <= program <= 127:
+        raise ValueError(f"MIDI program must be in 0-127, got {program}")
+    if not 0 <= channel <= 15:
+        raise ValueError(f"MIDI channel must be in 0-15, got {channel}")
+    n = len(pitches)
+    on_ticks = np.round(np.asarray(starts, dtype=np.float64) * TICKS_PER_SECOND).astype(np.int64)
+    off_ticks = np.maximum(np.round(np.asarray(ends, dtype=np.float64) * TICKS_PER_SECOND).astype(np.int64),
+                           on_ticks + 1)
+    # a note-on with velocity 0 would be read as a note-off
+    velocities = np.clip(np.broadcast_to(np.asarray(velocities, dtype=np.int64), (n,)), 1, 127)
+
+    ticks = np.concatenate([off_ticks, on_ticks])
+    is_on = np.concatenate([np.zeros(n, dtype=np.int8), np.ones(n, dtype=np.int8)])
+    order = np.lexsort((is_on, ticks))
+    status = np.where(is_on[order] == 1, NOTE_ON | channel, NOTE_OFF | channel)
+    data1 = np.concatenate([pitches, pitches])[order]
+    data2 = np.concatenate([np.zeros(n, dtype=np.int64), velocities])[order]
+    events = encode_events(ticks[order], status, data1, data2)
+
+    track = bytearray()
+    track += b"\x00\xff\x51\x03" + MICROSECONDS_PER_BEAT.to_bytes(3, "big")  # tempo
+    track += bytes((0x00, PROGRAM_CHANGE | channel, program))
+    track += events.tobytes()
+    track += b"\x00\xff\x2f\x00"  # end of track
+
+    data = bytearray(b"MThd")
+    data += (6).to_bytes(4, "big")
+    data += (0).to_bytes(2, "big") + (1).to_bytes(2, "big") + TICKS_PER_BEAT.to_bytes(2, "big")
+    data += b"MTrk" + len(track).to_bytes(4, "big")
+    data += track
+    return bytes(data)
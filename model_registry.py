@@ -0,0 +1,90 @@
+import streamlit as st
+import numpy as np
+import time
+import threading
+from contextlib import contextmanager
+
+class ModelRegistry:
+    """Process-wide holder for loaded CREPE and Basic Pitch models."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        self._metrics = {}
+        self.warmed_up = False
+
+    def _stats(self, name):
+        return self._metrics.setdefault(name, {
+            'loads': 0,
+            'load_seconds': 0.0,
+            'inferences': 0,
+            'inference_seconds_total': 0.0,
+            'inference_seconds_last': 0.0,
+        })
+
+    def _load(self, name, loader):
+        """Load a model once and record how long it took."""
+        with self._lock:
+            if name not in self._models:
+                start = time.perf_counter()
+                self._models[name] = loader()
+                stats = self._stats(name)
+                stats['loads'] += 1
+                stats['load_seconds'] += time.perf_counter() - start
+            return self._models[name]
+
+    def get_crepe_model(self, capacity='full'):
+        """Return the Keras model crepe.predict uses for this capacity."""
+        def loader():
+            import crepe.core
+            # crepe keeps built models in crepe.core.models, so predict() reuses this one
+            return crepe.core.build_and_load_model(capacity)
+        return self._load(f"crepe-{capacity}", loader)
+
+    def get_basic_pitch_model(self, model_path=None):
+        """Return a loaded Basic Pitch model that can be passed to predict_and_save."""
+        from basic_pitch import ICASSP_2022_MODEL_PATH
+        from basic_pitch.inference import Model
+
+        model_path = model_path or ICASSP_2022_MODEL_PATH
+        return self._load("basic-pitch", lambda: Model(model_path))
+
+    @contextmanager
+    def track_inference(self, name):
+        """Time an inference call against the named model."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stats = self._stats(name)
+                stats['inferences'] += 1
+                stats['inference_seconds_total'] += elapsed
+                stats['inference_seconds_last'] = elapsed
+
+    def warm_up(self):
+        """Load both models and run one dummy inference so the first request is fast."""
+        if self.warmed_up:
+            return
+        from basic_pitch.constants import AUDIO_N_SAMPLES
+
+        crepe_model = self.get_crepe_model('full')
+        with self.track_inference("crepe-full"):
+            crepe_model.predict(np.zeros((1, 1024), dtype=np.float32), verbose=0)
+
+        basic_pitch_model = self.get_basic_pitch_model()
+        with self.track_inference("basic-pitch"):
+            basic_pitch_model.predict(np.zeros((1, AUDIO_N_SAMPLES, 1), dtype=np.float32))
+
+        self.warmed_up = True
+
+    def metrics(self):
+        """Return a copy of the load and inference timings per model."""
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._metrics.items()}
+
+@st.cache_resource
+def get_model_registry():
+    """Return the registry shared by every session in this process."""
+    return ModelRegistry()
@@ -0,0 +1,132 @@
+import numpy as np
+from collections import namedtuple
+
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# one row of a NoteArray, for code that looks at notes one at a time
+Note = namedtuple('Note', ['pitch', 'start', 'end', 'velocity', 'confidence'])
+
+class NoteArray:
+    """Notes as parallel NumPy columns: MIDI pitch, start and end seconds, velocity and confidence.
+
+    A note costs 22 bytes instead of the few hundred of a dict or a
+    pretty_midi.Note. Slicing with a slice returns a view that shares the
+    columns; masks and index arrays copy, as they do in NumPy.
+    """
+
+    __slots__ = ('pitch', 'start', 'end', 'velocity', 'confidence')
+
+    def __init__(self, pitch=(), start=(), end=(), velocity=100, confidence=1.0):
+        pitch = np.asarray(pitch)
+        # the uint8 column would silently wrap anything outside the MIDI range
+        if pitch.size and (pitch.min() < 0 or pitch.max() > 127):
+            raise ValueError(f"MIDI pitches must be in 0-127, got {pitch.min()} to {pitch.max()}")
+        self.pitch = pitch.astype(np.uint8, copy=False)
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        n = len(self.pitch)
+        # scalars are broadcast to a column
+        self.velocity = np.asarray(velocity, dtype=np.uint8) if np.ndim(velocity) else np.full(n, velocity, np.uint8)
+        self.confidence = (np.asarray(confidence, dtype=np.float32) if np.ndim(confidence)
+                           else np.full(n, confidence, np.float32))
+        if not len(self.start) == len(self.end) == len(self.velocity) == len(self.confidence) == n:
+            raise ValueError("NoteArray columns must have the same length")
+
+    def __len__(self):
+        return len(self.pitch)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return Note(int(self.pitch[index]), float(self.start[index]), float(self.end[index]),
+                        int(self.velocity[index]), float(self.confidence[index]))
+        return NoteArray(self.pitch[index], self.start[index], self.end[index], self.velocity[index],
+                         self.confidence[index])
+
+    def __iter__(self):
+        columns = (self.pitch.tolist(), self.start.tolist(), self.end.tolist(), self.velocity.tolist(),
+                   self.confidence.tolist())
+        return map(Note._make, zip(*columns))
+
+    def __eq__(self, other):
+        if not isinstance(other, NoteArray):
+            return NotImplemented
+        return all(np.array_equal(getattr(self, column), getattr(other, column)) for column in self.__slots__)
+
+    def __repr__(self):
+        return f"NoteArray({len(self)} notes)"
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, column).nbytes for column in self.__slots__)
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    @property
+    def frequency(self):
+        """Equal-tempered frequency of each pitch in Hz."""
+        return 440.0 * 2.0 ** ((self.pitch.astype(np.float64) - 69) / 12)
+
+    @property
+    def note_names(self):
+        """Note names such as 'C#5', as a list of strings."""
+        return [f"{NOTE_NAMES[pitch % 12]}{pitch // 12 - 1}" for pitch in self.pitch.tolist()]
+
+    def sorted(self):
+        """The notes ordered by start time, then pitch."""
+        return self[np.lexsort((self.pitch, self.start))]
+
+    @classmethod
+    def concatenate(cls, arrays):
+        arrays = list(arrays)
+        if not arrays:
+            return cls()
+        return cls(*(np.concatenate([getattr(a, column) for a in arrays]) for column in cls.__slots__))
+
+    @classmethod
+    def from_pretty_midi(cls, midi, include_drums=False):
+        """Every note of a PrettyMIDI object's instruments (drums only if include_drums)."""
+        notes = [note for instrument in midi.instruments if include_drums or not instrument.is_drum
+                 for note in instrument.notes]
+        return cls(
+            [note.pitch for note in notes],
+            [note.start for note in notes],
+            [note.end for note in notes],
+            np.array([note.velocity for note in notes], dtype=np.uint8),
+        )
+
+    def to_pretty_midi(self, program=0):
+        """A PrettyMIDI object with one instrument (piano by default) holding these notes."""
+        import pretty_midi
+
+        midi = pretty_midi.PrettyMIDI()
+        instrument = pretty_midi.Instrument(program=program)
+        instrument.notes = [
+            pretty_midi.Note(velocity=velocity, pitch=pitch, start=start, end=end)
+            for pitch, start, end, velocity in zip(self.pitch.tolist(), self.start.tolist(), self.end.tolist(),
+                                                   self.velocity.tolist())
+        ]
+        midi.instruments.append(instrument)
+        return midi
+
+    def to_midi_bytes(self, program=0):
+        """Standard MIDI File bytes of these notes, encoded directly from the columns."""
+        from midi_writer import write_midi_bytes
+
+        return write_midi_bytes(self.pitch, self.start, self.end, self.velocity, program)
+
+    def to_music21(self, bpm=120):
+        """A music21 Part with one Note per row, placed at its start time at the given tempo."""
+        import music21
+
+        part = music21.stream.Part()
+        part.insert(0, music21.tempo.MetronomeMark(number=bpm))
+        quarters_per_second = bpm / 60
+        for pitch, start, duration, velocity in zip(self.pitch.tolist(), self.start.tolist(),
+                                                    self.duration.tolist(), self.velocity.tolist()):
+            note = music21.note.Note(pitch, quarterLength=duration * quarters_per_second)
+            note.volume.velocity = velocity
+            part.coreInsert(start * quarters_per_second, note)
+        part.coreElementsChanged()
+        return part
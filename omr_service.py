@@ -0,0 +1,312 @@
+import streamlit as st
+import os
+import time
+import queue
+import signal
+import logging
+import threading
+import multiprocessing
+from argparse import Namespace
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from tracing import record_error
+
+# the command variants image_to_musicxml used to try in turn, now run in-process
+OMR_VARIANTS = (
+    {'without_deskew': True, 'use_tf': False},
+    {'without_deskew': False, 'use_tf': False},
+    {'without_deskew': True, 'use_tf': True},
+)
+OMR_TIMEOUT = 300  # seconds per variant attempt
+KILL_GRACE = 30  # seconds past a job's combined variant timeouts before its worker is killed
+
+# oemer log messages that start each stage; later messages stay in the current stage
+OMR_STAGES = (
+    ("Extracting staffline and symbols", "segmentation"),
+    ("Extracting layers of different symbols", "segmentation"),
+    ("Dewarping", "deskew"),
+    ("Extracting stafflines", "symbol_extraction"),
+    ("Building MusicXML", "musicxml"),
+)
+OEMER_LOGGERS = ("oemer", "oemer.ete")
+
+class StageTimer(logging.Handler):
+    """Log handler that times oemer's pipeline stages from its progress messages."""
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self._stage = "setup"
+        self._since = time.perf_counter()
+
+    def emit(self, record):
+        message = record.getMessage()
+        for prefix, stage in OMR_STAGES:
+            if message.startswith(prefix):
+                self._close()
+                self._stage = stage
+                return
+
+    def _close(self):
+        now = time.perf_counter()
+        self.stages[self._stage] = self.stages.get(self._stage, 0.0) + now - self._since
+        self._since = now
+
+    def finish(self):
+        """Close the running stage and return seconds per stage."""
+        self._close()
+        return dict(self.stages)
+
+# per-process state, set up once by _init_worker
+_stage_timer = None
+
+def _cache_inference_sessions():
+    """Make onnxruntime hand back one session per model file instead of reloading it.
+
+    oemer builds a new InferenceSession for every image; sessions are safe to
+    reuse, so caching them keeps the segmentation models loaded between jobs.
+    The TensorFlow variant still rebuilds its Keras models each time.
+    """
+    import onnxruntime as rt
+
+    if getattr(rt.InferenceSession, '_sape_cached', False):
+        return
+    original = rt.InferenceSession
+    sessions = {}
+
+    def cached_session(path_or_bytes, *args, **kwargs):
+        key = (str(path_or_bytes), repr(args), repr(sorted(kwargs.items())))
+        if key not in sessions:
+            sessions[key] = original(path_or_bytes, *args, **kwargs)
+        return sessions[key]
+
+    cached_session._sape_cached = True
+    rt.InferenceSession = cached_session
+
+def _init_worker():
+    """Import oemer once per worker process and hook up session caching and stage timing."""
+    global _stage_timer
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+    os.environ['TF_FORCE_GPU_ALLOW_GROWTH'] = 'true'
+    os.environ['CUDA_MEMORY_FRACTION'] = '0.7'
+
+    import oemer.ete  # noqa: F401  (pays the heavy imports up front)
+    _cache_inference_sessions()
+
+    _stage_timer = StageTimer()
+    for name in OEMER_LOGGERS:
+        logger = logging.getLogger(name)
+        logger.setLevel(logging.INFO)
+        logger.addHandler(_stage_timer)
+
+def _reset_oemer_state():
+    """Drop the layers oemer registers globally, so one image never sees another's."""
+    from oemer import layers
+
+    registered = getattr(layers, '_layers', None)
+    if isinstance(registered, dict):
+        registered.clear()
+
+class OMRTimeout(TimeoutError):
+    """Raised inside a worker when a variant runs past its timeout."""
+
+def _raise_timeout(signum, frame):
+    raise OMRTimeout()
+
+@contextmanager
+def _time_limit(seconds):
+    """Interrupt the worker's main thread after seconds; without SIGALRM only the parent's deadline applies."""
+    if not seconds or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def failed_result(image_path, error, attempts=None, seconds=0.0):
+    """A job result for an image that produced no MusicXML."""
+    return {'image': image_path, 'musicxml_path': None, 'musicxml': None, 'variant': None, 'stages': {},
+            'attempts': attempts or [], 'error': error, 'seconds': seconds}
+
+def _run_omr_job(image_path, output_dir, variants=OMR_VARIANTS, timeout=OMR_TIMEOUT):
+    """Run oemer on one image in a worker, trying each variant until one writes MusicXML.
+
+    Each variant gets its own timeout. Attempts record whether oemer raised
+    (raised) or ran out of time (timed_out), so callers can tell a bad image
+    from a busy machine.
+    """
+    from oemer.ete import extract
+
+    if _stage_timer is None:
+        _init_worker()
+
+    start = time.perf_counter()
+    result = failed_result(image_path, None)
+    for i, variant in enumerate(variants):
+        _reset_oemer_state()
+        _stage_timer.reset()
+        args = Namespace(img_path=image_path, output_path=output_dir, save_cache=False, **variant)
+        attempt = {'variant': i, 'error': None, 'raised': False, 'timed_out': False}
+        try:
+            with _time_limit(timeout):
+                musicxml_path = extract(args)
+            with open(musicxml_path, "rb") as f:
+                result['musicxml'] = f.read()
+            result['musicxml_path'] = musicxml_path
+            result['variant'] = i
+        except OMRTimeout:
+            attempt['error'] = f"timed out after {timeout}s"
+            attempt['timed_out'] = True
+        except Exception as e:
+            attempt['error'] = f"{type(e).__name__}: {e}"
+            attempt['raised'] = True
+            record_error(e)
+        attempt['stages'] = _stage_timer.finish()
+        result['attempts'].append(attempt)
+        if result['musicxml_path']:
+            result['stages'] = attempt['stages']
+            break
+    else:
+        result['error'] = result['attempts'][-1]['error'] if result['attempts'] else "no variants to try"
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def _worker_main(connection):
+    """Serve OMR jobs sent over connection until a None arrives."""
+    _init_worker()
+    while True:
+        job = connection.recv()
+        if job is None:
+            return
+        image_path = job[0]
+        try:
+            result = _run_omr_job(*job)
+        except Exception as e:
+            result = failed_result(image_path, f"{type(e).__name__}: {e}")
+        connection.send(result)
+
+class _Worker:
+    """One oemer process and the pipe to it; a worker stuck on a job is killed rather than waited for."""
+
+    def __init__(self, context):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.kill()
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+class OMRService:
+    """Long-lived oemer worker processes that keep the models loaded between images.
+
+    Jobs queue for an idle worker; each worker imports oemer once and reuses
+    its inference sessions, so a batch of images shares one model load. A job
+    that overruns its timeouts or is aborted has its worker killed and
+    replaced, so a hung oemer run never keeps a slot busy.
+    """
+
+    def __init__(self, workers=1, timeout=OMR_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        # spawn so each worker gets a clean TensorFlow/onnxruntime state
+        self._context = multiprocessing.get_context('spawn')
+        self._idle = queue.Queue()
+        for _ in range(workers):
+            self._idle.put(None)  # started on first use
+        self._dispatch = ThreadPoolExecutor(workers, thread_name_prefix="omr")
+        self._aborts = {}
+
+    def submit(self, image_path, output_dir=".", variants=OMR_VARIANTS):
+        """Queue one image; the future resolves to the job result dict."""
+        abort = threading.Event()
+        future = self._dispatch.submit(self._run, os.path.abspath(image_path), os.path.abspath(output_dir),
+                                       tuple(variants), abort)
+        self._aborts[future] = abort
+        future.add_done_callback(lambda done: self._aborts.pop(done, None))
+        return future
+
+    def abort(self, future):
+        """Stop a job: drop it if it is still queued, or kill the worker running it."""
+        if not future.cancel():
+            abort = self._aborts.get(future)
+            if abort is not None:
+                abort.set()
+
+    def _run(self, image_path, output_dir, variants, abort):
+        worker = self._idle.get() or _Worker(self._context)
+        if abort.is_set():
+            self._idle.put(worker)
+            return failed_result(image_path, "aborted")
+
+        start = time.perf_counter()
+        # the worker times each variant; this deadline catches hangs its alarm can't interrupt
+        deadline = time.monotonic() + self.timeout * len(variants) + KILL_GRACE
+        attempt = {'variant': None, 'error': None, 'raised': False, 'timed_out': False, 'stages': {}}
+        try:
+            worker.connection.send((image_path, output_dir, variants, self.timeout))
+            while True:
+                if worker.connection.poll(0.5):
+                    result = worker.connection.recv()
+                    self._idle.put(worker)
+                    return result
+                if abort.is_set():
+                    attempt['error'] = "aborted"
+                    break
+                if time.monotonic() > deadline:
+                    attempt['error'] = f"timed out after {deadline - start:.0f}s, worker killed"
+                    attempt['timed_out'] = True
+                    break
+                if not worker.process.is_alive():
+                    attempt['error'] = f"worker exited with code {worker.process.exitcode}"
+                    break
+        except (EOFError, OSError) as e:
+            attempt['error'] = f"worker connection lost: {type(e).__name__}: {e}"
+
+        worker.kill()
+        self._idle.put(_Worker(self._context))
+        return failed_result(image_path, attempt['error'], [attempt], time.perf_counter() - start)
+
+    def convert(self, image_path, output_dir=".", variants=OMR_VARIANTS):
+        """Convert one image and wait for its result."""
+        return self.submit(image_path, output_dir, variants).result()
+
+    def convert_many(self, image_paths, output_dir=".", variants=OMR_VARIANTS):
+        """Queue every image up front and yield results in input order."""
+        futures = [self.submit(path, output_dir, variants) for path in image_paths]
+        for future in futures:
+            yield future.result()
+
+    def shutdown(self):
+        self._dispatch.shutdown(cancel_futures=True)
+        while not self._idle.empty():
+            worker = self._idle.get()
+            if worker is not None:
+                worker.stop()
+
+@st.cache_resource
+def get_omr_service():
+    """Return the OMR worker pool shared by every session in this process."""
+    # two workers so the deskew and no-deskew variants can race
+    return OMRService(int(os.environ.get("SAPE_OMR_WORKERS", "2")))
@@ -0,0 +1,218 @@
+import streamlit as st
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, wait
+from omr_service import OMR_VARIANTS, failed_result, get_omr_service
+
+DEFAULT_OUTCOMES_PATH = os.path.join(os.path.expanduser("~"), ".cache", "sape", "omr_outcomes.json")
+
+# indices into OMR_VARIANTS
+NO_DESKEW, DESKEW, TF_NO_DESKEW = 0, 1, 2
+
+SKEW_THRESHOLD = 0.5  # degrees; straighter scans skip oemer's slow dewarping
+SKEW_SEARCH = np.arange(-5.0, 5.25, 0.25)
+FEATURE_WIDTH = 800  # images are downscaled to this width before estimating skew
+
+def image_hash(image_path):
+    """sha256 of the image file contents."""
+    hasher = hashlib.sha256()
+    with open(image_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+def image_features(image_path):
+    """Cheap features for picking a variant: resolution, ink density and a skew estimate.
+
+    Skew is the rotation that makes the row-sum profile of the dark pixels
+    sharpest, which is where the staff lines run exactly horizontally.
+    """
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        width, height = img.size
+        gray = img.convert("L")
+        scale = min(1.0, FEATURE_WIDTH / width)
+        if scale < 1.0:
+            gray = gray.resize((int(width * scale), max(1, int(height * scale))))
+
+    ink = Image.fromarray(((np.asarray(gray) < 128) * 255).astype(np.uint8))
+    sharpness = [np.var(np.asarray(ink.rotate(angle, fillcolor=0), dtype=np.float32).sum(axis=1))
+                 for angle in SKEW_SEARCH]
+    return {
+        'width': width,
+        'height': height,
+        'megapixels': width * height / 1e6,
+        'ink_ratio': float(np.asarray(ink).mean() / 255),
+        # rotating by -skew straightens the page
+        'skew_degrees': float(0.0 - SKEW_SEARCH[int(np.argmax(sharpness))]),
+    }
+
+def predict_variants(features):
+    """Order the variants by how likely each is to succeed on an image with these features."""
+    if abs(features['skew_degrees']) > SKEW_THRESHOLD:
+        return [DESKEW, NO_DESKEW, TF_NO_DESKEW]
+    return [NO_DESKEW, DESKEW, TF_NO_DESKEW]
+
+class OutcomeCache:
+    """JSON file of past OMR outcomes per image hash, so known-bad images fail fast."""
+
+    def __init__(self, path=DEFAULT_OUTCOMES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self._outcomes = json.load(f)
+        except (OSError, ValueError):
+            self._outcomes = {}
+
+    def get(self, key):
+        with self._lock:
+            return self._outcomes.get(key)
+
+    def put(self, key, outcome):
+        """Record an outcome and rewrite the file atomically."""
+        with self._lock:
+            self._outcomes[key] = dict(outcome, recorded_at=time.time())
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._outcomes, f, indent=1)
+            os.replace(temp_path, self.path)
+
+def _write_musicxml(result, image_path, output_dir):
+    """Write the winning job's MusicXML to where the oemer CLI would have put it."""
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    musicxml_path = os.path.join(output_dir, base_name + ".musicxml")
+    with open(musicxml_path, "wb") as f:
+        f.write(result['musicxml'])
+    result['musicxml_path'] = musicxml_path
+    return result
+
+def _as_variant(result, variant):
+    """Relabel a single-variant job result with the variant's index in OMR_VARIANTS."""
+    result['variant'] = variant if result['musicxml_path'] else None
+    for attempt in result['attempts']:
+        attempt['variant'] = variant
+    return result
+
+def run_sequential(service, image_path, output_dir, order):
+    """Try the variants one after another in the given order."""
+    result = service.convert(image_path, output_dir, [OMR_VARIANTS[i] for i in order])
+    for attempt in result['attempts']:
+        if attempt['variant'] is not None:
+            attempt['variant'] = order[attempt['variant']]
+    if result['musicxml_path']:
+        result['variant'] = order[result['variant']]
+    return result
+
+def race_variants(service, image_path, output_dir, variants=(NO_DESKEW, DESKEW)):
+    """Run variants in parallel workers and return the first success, or the combined failure.
+
+    Each variant writes to its own scratch directory so they never clobber one
+    another. Racing needs as many OMR workers as variants to run in parallel;
+    once one variant succeeds the others are aborted, which kills their
+    workers, before the scratch directories go away.
+    """
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as scratch:
+        pending = {}
+        for variant in variants:
+            variant_dir = os.path.join(scratch, str(variant))
+            os.makedirs(variant_dir)
+            future = service.submit(image_path, variant_dir, (OMR_VARIANTS[variant],))
+            pending[future] = variant
+
+        attempts = []
+        while pending:
+            # every job is bounded by the service's per-variant timeout
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                variant = pending.pop(future)
+                result = _as_variant(future.result(), variant)
+                attempts.extend(result['attempts'])
+                if result['musicxml_path']:
+                    for other in pending:
+                        service.abort(other)
+                    wait(pending)
+                    result['attempts'] = attempts
+                    result['seconds'] = time.perf_counter() - start
+                    return _write_musicxml(result, image_path, output_dir)
+
+    return failed_result(image_path, attempts[-1]['error'] if attempts else "no variants to try", attempts,
+                         time.perf_counter() - start)
+
+def _timed_out(result):
+    return any(attempt.get('timed_out') for attempt in result['attempts'])
+
+def _deterministic_failure(result):
+    """True when every attempt failed because oemer raised, not because of time or a lost worker."""
+    return bool(result['attempts']) and all(attempt.get('raised') for attempt in result['attempts'])
+
+def convert_with_strategy(image_path, output_dir=".", mode="predict", service=None, outcomes=None,
+                          retry_failed=False):
+    """Convert a sheet image, choosing how to try the oemer variants.
+
+    mode is 'predict' to order the variants from image features, 'race' to run
+    the deskew and no-deskew variants in parallel, or 'sequential' for the
+    fixed order. Past outcomes for the same image are reused: a known-good
+    variant goes first and a known-bad image fails immediately unless
+    retry_failed is set. Only images oemer itself rejected are remembered as
+    bad; timeouts and worker failures may go away on a quieter machine.
+    """
+    service = service or get_omr_service()
+    outcomes = outcomes or get_outcome_cache()
+    key = image_hash(image_path)
+    previous = outcomes.get(key)
+
+    if previous and previous['status'] == 'failed' and not retry_failed:
+        return dict(failed_result(image_path, f"known bad input, failed before: {previous['error']}"),
+                    strategy='cached')
+
+    features = None
+    strategy = mode
+    try:
+        if previous and previous['status'] == 'ok':
+            strategy = 'cached'
+            order = [previous['variant']] + [i for i in range(len(OMR_VARIANTS)) if i != previous['variant']]
+            result = run_sequential(service, image_path, output_dir, order)
+        elif mode == 'race':
+            result = race_variants(service, image_path, output_dir)
+            # a variant that ran out of time would likely do so again in the fallback
+            if not result['musicxml_path'] and not _timed_out(result):
+                fallback = run_sequential(service, image_path, output_dir, [TF_NO_DESKEW])
+                fallback['attempts'] = result['attempts'] + fallback['attempts']
+                fallback['seconds'] += result['seconds']
+                result = fallback
+        else:
+            order = list(range(len(OMR_VARIANTS)))
+            if mode == 'predict':
+                features = image_features(image_path)
+                order = predict_variants(features)
+            result = run_sequential(service, image_path, output_dir, order)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        result = failed_result(image_path, error, [{'variant': None, 'error': error, 'raised': False,
+                                                    'timed_out': False, 'stages': {}}])
+
+    result['strategy'] = strategy
+    result['features'] = features
+    if result['musicxml_path'] or _deterministic_failure(result):
+        outcomes.put(key, {
+            'status': 'ok' if result['musicxml_path'] else 'failed',
+            'variant': result['variant'],
+            'error': result['error'],
+            'seconds': result['seconds'],
+        })
+    return result
+
+@st.cache_resource
+def get_outcome_cache():
+    """Return the OMR outcome cache shared by every session in this process."""
+    return OutcomeCache(os.environ.get("SAPE_OMR_OUTCOMES", DEFAULT_OUTCOMES_PATH))
@@ -0,0 +1,219 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+PDF_DPI = 300
+INK_THRESHOLD = 128  # grayscale values below this count as ink
+STAFF_LINE_FRACTION = 0.5  # rows this dark relative to the darkest row are staff lines
+BLANK_ROW_FRACTION = 0.002  # rows with less ink than this share of the width are gutter
+TILE_MAX_WIDTH = 2400  # tiles wider than this are downscaled before OMR
+TILE_MARGIN = 0.5  # share of the gutter kept above and below each system
+PAGE_MAX_PIXELS = 40_000_000  # larger pages are downscaled on load; tiles end up TILE_MAX_WIDTH wide anyway
+
+def _page_scale(width, height, max_pixels):
+    """Scale factor that brings a width x height page within max_pixels, at most 1."""
+    return min(1.0, (max_pixels / (width * height)) ** 0.5)
+
+def load_pages(path, dpi=PDF_DPI, max_pixels=PAGE_MAX_PIXELS):
+    """Yield each page of an image, multi-page TIFF or PDF as a grayscale PIL image, one at a time.
+
+    Pages over max_pixels are downscaled to fit: PDFs are rendered smaller and
+    JPEGs decoded at a reduced size, other rasters are decoded whole once and
+    then shrunk. Images beyond PIL's decompression bomb limit are still refused.
+    """
+    from PIL import Image, ImageSequence
+
+    if path.lower().endswith(".pdf"):
+        # optional dependency, only needed for PDF input
+        import pypdfium2 as pdfium
+
+        pdf = pdfium.PdfDocument(path)
+        try:
+            for page in pdf:
+                width, height = page.get_size()
+                scale = dpi / 72 * _page_scale(width * dpi / 72, height * dpi / 72, max_pixels)
+                yield page.render(scale=scale).to_pil().convert("L")
+                page.close()
+        finally:
+            pdf.close()
+        return
+
+    with Image.open(path) as img:
+        for frame in ImageSequence.Iterator(img):
+            scale = _page_scale(frame.width, frame.height, max_pixels)
+            if scale == 1.0:
+                yield frame.convert("L")
+                continue
+            size = (max(1, int(frame.width * scale)), max(1, int(frame.height * scale)))
+            frame.draft("L", size)
+            page = frame.convert("L")
+            if page.size != size:
+                page = page.resize(size, Image.Resampling.LANCZOS)
+            yield page
+
+def _runs(mask):
+    """(start, stop) index pairs of the True runs in a boolean array."""
+    padded = np.concatenate([[False], mask, [False]])
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return edges.reshape(-1, 2)
+
+def find_system_bounds(page):
+    """Split a page into staff systems by its horizontal projection profile; returns (top, bottom) rows.
+
+    Staff lines are the darkest rows. Consecutive staves are kept in one system
+    unless the rows between them contain almost no ink: barlines and braces run
+    through the gaps inside a grand staff, but not between systems.
+    """
+    ink = np.asarray(page) < INK_THRESHOLD
+    profile = ink.sum(axis=1)
+    height, width = ink.shape
+    if profile.max() == 0:
+        return []
+
+    staff_rows = _runs(profile >= STAFF_LINE_FRACTION * profile.max())
+    if len(staff_rows) == 0:
+        return [(0, height)]
+    # staff lines closer together than a few line spacings belong to the same staff
+    line_centres = staff_rows.mean(axis=1)
+    spacing = np.median(np.diff(line_centres)) if len(line_centres) > 1 else height
+    staves = []
+    for (start, stop), centre in zip(staff_rows, line_centres):
+        if staves and centre - staves[-1][2] <= 2 * spacing:
+            staves[-1][1] = stop
+            staves[-1][2] = centre
+        else:
+            staves.append([start, stop, centre])
+
+    blank = profile < BLANK_ROW_FRACTION * width
+    cuts = [0]
+    for (_, upper_stop, _), (lower_start, _, _) in zip(staves, staves[1:]):
+        gutter = np.flatnonzero(blank[upper_stop:lower_start])
+        if len(gutter):
+            # cut in the middle of the widest blank stretch between the staves
+            runs = _runs(blank[upper_stop:lower_start])
+            run_start, run_stop = max(runs, key=lambda run: run[1] - run[0])
+            cuts.append(upper_stop + (run_start + run_stop) // 2)
+    cuts.append(height)
+
+    bounds = []
+    for top, bottom in zip(cuts, cuts[1:]):
+        rows = np.flatnonzero(profile[top:bottom])
+        if len(rows) == 0:
+            continue
+        # trim surrounding whitespace but keep part of it as a margin
+        first, last = top + rows[0], top + rows[-1] + 1
+        bounds.append((int(first - (first - top) * TILE_MARGIN), int(last + (bottom - last) * TILE_MARGIN)))
+    return bounds
+
+def write_tiles(path, work_dir, max_width=TILE_MAX_WIDTH):
+    """Cut every page of a score into system tiles saved as PNG; returns the tile paths in reading order.
+
+    Only one page is held in memory at a time, so peak memory depends on the
+    page size, not on the number of pages.
+    """
+    from PIL import Image
+
+    os.makedirs(work_dir, exist_ok=True)
+    tile_paths = []
+    for page_number, page in enumerate(load_pages(path), 1):
+        for system_number, (top, bottom) in enumerate(find_system_bounds(page), 1):
+            tile = page.crop((0, top, page.width, bottom))
+            if tile.width > max_width:
+                tile = tile.resize((max_width, max(1, round(tile.height * max_width / tile.width))),
+                                   Image.Resampling.LANCZOS)
+            tile_path = os.path.join(work_dir, f"page{page_number:03d}_system{system_number:02d}.png")
+            tile.save(tile_path)
+            tile_paths.append(tile_path)
+        page.close()
+    return tile_paths
+
+def _rest_measure(number, template):
+    """An empty measure numbered number that lasts as long as template."""
+    import music21
+
+    measure = music21.stream.Measure(number=number)
+    measure.append(music21.note.Rest(quarterLength=template.duration.quarterLength))
+    return measure
+
+def merge_musicxml(musicxml_paths):
+    """Join per-tile MusicXML into one music21 score, appending each tile's measures part by part.
+
+    Tiles need not agree on the number of parts: a part first seen in a later
+    tile is added with rests under the measures before it, and a part missing
+    from a tile gets rests for that tile's measures, so no part is dropped and
+    the parts stay aligned.
+    """
+    import copy
+    import music21
+
+    merged = None
+    measure_number = 0
+    for path in musicxml_paths:
+        score = music21.converter.parse(path)
+        if merged is None:
+            merged = score
+            measure_number = len(merged.parts[0].getElementsByClass(music21.stream.Measure)) \
+                if merged.parts else 0
+            continue
+        targets = list(merged.parts)
+        earlier = list(targets[0].getElementsByClass(music21.stream.Measure)) if targets else []
+        tile_measures = [list(part.getElementsByClass(music21.stream.Measure)) for part in score.parts]
+        longest = max(tile_measures, key=len, default=[])
+        for index, (part, measures) in enumerate(zip(score.parts, tile_measures)):
+            if index < len(targets):
+                target = targets[index]
+            else:
+                target = music21.stream.Part()
+                target.partName = part.partName
+                for measure in earlier:
+                    target.append(_rest_measure(measure.number, measure))
+                merged.insert(0, target)
+            for offset, measure in enumerate(measures, 1):
+                measure = copy.deepcopy(measure)
+                measure.number = measure_number + offset
+                target.append(measure)
+        for target in targets[len(tile_measures):]:
+            for offset, measure in enumerate(longest, 1):
+                target.append(_rest_measure(measure_number + offset, measure))
+        measure_number += len(longest)
+    return merged
+
+def tiled_image_to_musicxml(path, output_dir, strategy="predict", service=None, progress=None,
+                            retry_failed=False):
+    """Convert a large or multi-page score by running OMR per staff system and merging the results.
+
+    Tiles are converted in parallel, one thread per OMR worker, and merged in
+    reading order. A tile that fails or raises is reported in its result and
+    left out of the merge. Returns (musicxml_path, tile_results) with the
+    results in reading order; musicxml_path is None when no tile could be
+    converted.
+    """
+    from omr_service import failed_result, get_omr_service
+    from omr_strategy import convert_with_strategy
+
+    service = service or get_omr_service()
+    base_name = os.path.splitext(os.path.basename(path))[0]
+    tile_dir = os.path.join(output_dir, base_name + "_tiles")
+    tile_paths = write_tiles(path, tile_dir)
+
+    results = [None] * len(tile_paths)
+    with ThreadPoolExecutor(max(1, service.workers)) as pool:
+        futures = {pool.submit(convert_with_strategy, tile_path, tile_dir, strategy, service=service,
+                               retry_failed=retry_failed): i
+                   for i, tile_path in enumerate(tile_paths)}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = dict(failed_result(tile_paths[i], f"{type(e).__name__}: {e}"), strategy=strategy)
+            if progress:
+                progress(done, len(tile_paths), results[i])
+
+    converted = [r['musicxml_path'] for r in results if r['musicxml_path']]
+    if not converted:
+        return None, results
+
+    musicxml_path = os.path.join(output_dir, base_name + ".musicxml")
+    merge_musicxml(converted).write('musicxml', fp=musicxml_path)
+    return musicxml_path, results
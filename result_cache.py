@@ -0,0 +1,106 @@
+import streamlit as st
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+CACHE_VERSION = 2  # 2: whistle notes are NoteArrays instead of lists of dicts
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sape", "results")
+DEFAULT_MAX_MB = 512
+
+class ResultCache:
+    """Disk-backed cache of transcription results keyed by audio content and parameters."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, audio_bytes, model, params):
+        """Hash the audio bytes together with the model name and its parameters."""
+        hasher = hashlib.sha256()
+        hasher.update(f"v{CACHE_VERSION}:{model}:".encode())
+        hasher.update(json.dumps(params, sort_keys=True, default=str).encode())
+        hasher.update(memoryview(audio_bytes))
+        return hasher.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key):
+        """Return the cached result for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            # bump the mtime so eviction treats this entry as recently used
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store a result and evict least recently used entries over the size limit."""
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pkl"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _evict(self):
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                total -= size
+
+    def stats(self):
+        """Return hit/miss counters and the current size of the cache."""
+        entries = self._entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
+
+@st.cache_resource
+def get_result_cache():
+    """Return the result cache shared by every session in this process."""
+    cache_dir = os.environ.get("SAPE_CACHE_DIR", DEFAULT_CACHE_DIR)
+    max_mb = float(os.environ.get("SAPE_CACHE_MAX_MB", DEFAULT_MAX_MB))
+    return ResultCache(cache_dir, int(max_mb * 1024 * 1024))
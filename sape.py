@@ -0,0 +1,260 @@
+"""Command-line entry point for headless conversions.
+
+Usage:
+    python sape.py batch <directory-or-glob> -o <output-dir> [--pipeline basic-pitch|whistle] [--workers N]
+    python sape.py omr <directory-or-glob> -o <output-dir> [--workers N]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.ogg', '.flac')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+OUTPUT_SUFFIXES = {
+    'basic-pitch': '_basic_pitch.mid',
+    'whistle': '_melody.mid',
+}
+
+def find_audio_files(source, extensions=AUDIO_EXTENSIONS):
+    """Expand a directory or glob pattern into a sorted list of audio (or other extension) files."""
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths.extend(os.path.join(root, name) for name in files)
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(p for p in paths if p.lower().endswith(extensions) and os.path.isfile(p))
+
+def output_path_for(audio_path, source, output_dir, pipeline):
+    """Mirror the input layout under output_dir, one MIDI file per input."""
+    if os.path.isdir(source):
+        base_dir = source
+    else:
+        # the directory part of the pattern before its first wildcard
+        parts = []
+        for part in source.split(os.sep):
+            if any(c in part for c in '*?['):
+                break
+            parts.append(part)
+        base_dir = os.sep.join(parts[:-1] if len(parts) == len(source.split(os.sep)) else parts) or "."
+    relative = os.path.relpath(audio_path, base_dir)
+    if relative.startswith(os.pardir):
+        relative = os.path.basename(audio_path)
+    stem = os.path.splitext(relative)[0]
+    return os.path.join(output_dir, stem + OUTPUT_SUFFIXES[pipeline])
+
+def audio_duration(audio_path):
+    """Return the duration of an audio file in seconds without decoding it."""
+    try:
+        import soundfile as sf
+        return sf.info(audio_path).duration
+    except Exception:
+        import librosa
+        return librosa.get_duration(path=audio_path)
+
+def _init_worker(pipeline, pitch_backend):
+    """Load the pipeline's model once per worker process."""
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+    from model_registry import get_model_registry
+
+    # called only to warm the registry, which the conversions then read the model from
+    registry = get_model_registry()
+    if pipeline == 'basic-pitch':
+        registry.get_basic_pitch_model()
+    elif pitch_backend == 'crepe':
+        registry.get_crepe_model('full')
+    elif pitch_backend == 'crepe-tiny':
+        registry.get_crepe_model('tiny')
+
+def _convert_file(pipeline, audio_path, output_path, pitch_backend='crepe'):
+    """Convert one file in a worker and report its duration and status."""
+    start = time.perf_counter()
+    result = {'input': audio_path, 'output': output_path, 'status': 'done', 'error': None}
+    try:
+        result['audio_seconds'] = audio_duration(audio_path)
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        # write next to the target and rename, so an interrupted run never leaves a partial output
+        temp_path = output_path + ".part"
+
+        with open(audio_path, "rb") as f:
+            audio_bytes = f.read()
+
+        if pipeline == 'basic-pitch':
+            from audio_to_midi import audio_bytes_to_midi
+
+            # the batch already runs one file per core, so a file never fans out further
+            midi_bytes = audio_bytes_to_midi(audio_bytes, use_cache=False, parallel=False)
+        else:
+            from whistle_to_sheet import WHISTLE_PARAMS, transcribe_whistle
+
+            _, midi_bytes, _ = transcribe_whistle(audio_bytes, dict(WHISTLE_PARAMS, backend=pitch_backend),
+                                              use_cache=False)
+            if midi_bytes is None:
+                raise RuntimeError("no notes detected")
+
+        with open(temp_path, "wb") as f:
+            f.write(midi_bytes)
+        os.replace(temp_path, output_path)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = f"{type(e).__name__}: {e}"
+        result.setdefault('audio_seconds', 0.0)
+        print(traceback.format_exc(), file=sys.stderr)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def run_batch(source, output_dir, pipeline='basic-pitch', workers=None, overwrite=False, pitch_backend='crepe'):
+    """Convert every audio file under source, skipping ones that already have an output.
+
+    Raises ValueError before converting anything if two inputs map to the
+    same output, such as a.wav and a.mp3 in one directory.
+    """
+    audio_files = find_audio_files(source)
+    output_paths = {}
+    for audio_path in audio_files:
+        output_paths.setdefault(output_path_for(audio_path, source, output_dir, pipeline), []).append(audio_path)
+    collisions = [inputs for inputs in output_paths.values() if len(inputs) > 1]
+    if collisions:
+        raise ValueError("inputs would overwrite each other's output: "
+                         + "; ".join(", ".join(inputs) for inputs in collisions))
+
+    jobs = []
+    skipped = 0
+    for output_path, (audio_path,) in output_paths.items():
+        if not overwrite and os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            skipped += 1
+            continue
+        jobs.append((audio_path, output_path))
+
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs) or 1))
+    print(f"{len(audio_files)} files found, {skipped} already converted, {len(jobs)} to convert "
+          f"with {workers} worker(s)")
+
+    results = []
+    start = time.perf_counter()
+    if jobs:
+        # spawn so each worker gets a clean TensorFlow runtime
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(pipeline, pitch_backend)) as pool:
+            futures = [pool.submit(_convert_file, pipeline, a, o, pitch_backend) for a, o in jobs]
+            for i, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                results.append(result)
+                print(f"[{i}/{len(jobs)}] {result['status']}: {result['input']}"
+                      + (f" ({result['error']})" if result['error'] else ""))
+    elapsed = time.perf_counter() - start
+
+    converted = [r for r in results if r['status'] == 'done']
+    audio_seconds = sum(r['audio_seconds'] for r in converted)
+    return {
+        'pipeline': pipeline,
+        'workers': workers,
+        'found': len(audio_files),
+        'skipped': skipped,
+        'converted': len(converted),
+        'failed': len(results) - len(converted),
+        'wall_seconds': elapsed,
+        'audio_seconds': audio_seconds,
+        'files_per_second': len(converted) / elapsed if elapsed > 0 else 0.0,
+        'audio_seconds_per_second': audio_seconds / elapsed if elapsed > 0 else 0.0,
+        'results': results,
+    }
+
+def run_omr(source, output_dir, workers=1):
+    """Convert every sheet image under source to MusicXML through one OMR worker pool."""
+    from omr_service import OMRService
+
+    images = find_audio_files(source, IMAGE_EXTENSIONS)
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"{len(images)} images found, converting with {workers} OMR worker(s)")
+
+    results = []
+    start = time.perf_counter()
+    service = OMRService(workers)
+    try:
+        for i, result in enumerate(service.convert_many(images, output_dir), 1):
+            result.pop('musicxml')
+            results.append(result)
+            stages = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in result['stages'].items())
+            print(f"[{i}/{len(images)}] {'done' if result['musicxml_path'] else 'failed'}: {result['image']}"
+                  + (f" ({result['error']})" if result['error'] else f" ({stages})"))
+    finally:
+        service.shutdown()
+    elapsed = time.perf_counter() - start
+
+    converted = sum(1 for r in results if r['musicxml_path'])
+    return {
+        'workers': workers,
+        'found': len(images),
+        'converted': converted,
+        'failed': len(results) - converted,
+        'wall_seconds': elapsed,
+        'images_per_second': converted / elapsed if elapsed > 0 else 0.0,
+        'results': results,
+    }
+
+def print_summary(report):
+    """Print the throughput summary of a batch run."""
+    print()
+    print(f"Pipeline:        {report['pipeline']} ({report['workers']} worker(s))")
+    print(f"Converted:       {report['converted']} (skipped {report['skipped']}, failed {report['failed']})")
+    print(f"Wall time:       {report['wall_seconds']:.1f}s")
+    print(f"Throughput:      {report['files_per_second']:.2f} files/sec, "
+          f"{report['audio_seconds_per_second']:.2f} audio-seconds/sec")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sape", description="SoundScape Studio command-line tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch = subparsers.add_parser("batch", help="Convert a directory or glob of audio files to MIDI.")
+    batch.add_argument("source", help="Directory (searched recursively) or glob pattern of audio files.")
+    batch.add_argument("-o", "--output-dir", required=True, help="Directory to write MIDI files to.")
+    batch.add_argument("--pipeline", choices=sorted(OUTPUT_SUFFIXES), default="basic-pitch",
+                       help="Basic Pitch for general audio, or the CREPE whistle pipeline.")
+    batch.add_argument("--pitch-backend", choices=["crepe", "crepe-tiny", "pyin", "autocorr"], default="crepe",
+                       help="Pitch estimator for the whistle pipeline.")
+    batch.add_argument("--workers", type=int, default=None,
+                       help="Number of worker processes (default: one per CPU).")
+    batch.add_argument("--overwrite", action="store_true", help="Convert files that already have an output.")
+    batch.add_argument("--report", help="Write the summary and per-file results as JSON to this path.")
+
+    omr = subparsers.add_parser("omr", help="Convert a directory or glob of sheet images to MusicXML.")
+    omr.add_argument("source", help="Directory (searched recursively) or glob pattern of images.")
+    omr.add_argument("-o", "--output-dir", required=True, help="Directory to write MusicXML files to.")
+    omr.add_argument("--workers", type=int, default=1,
+                     help="Number of OMR worker processes, each holding its own models (default: 1).")
+    omr.add_argument("--report", help="Write the summary and per-image results as JSON to this path.")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "batch":
+        try:
+            report = run_batch(args.source, args.output_dir, args.pipeline, args.workers, args.overwrite,
+                               args.pitch_backend)
+        except ValueError as e:
+            parser.error(str(e))
+        print_summary(report)
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(report, f, indent=2)
+        return 1 if report['failed'] else 0
+
+    if args.command == "omr":
+        report = run_omr(args.source, args.output_dir, args.workers)
+        print(f"\nConverted {report['converted']} of {report['found']} images "
+              f"in {report['wall_seconds']:.1f}s ({report['images_per_second']:.2f} images/sec)")
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(report, f, indent=2)
+        return 1 if report['failed'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import numpy as np
+from functools import lru_cache
+
+SYNTH_SAMPLE_RATE = 22050
+ATTACK_SECONDS = 0.005
+RELEASE_SECONDS = 0.02
+WRITE_FRAMES = 8192
+TABLE_MAX_SAMPLES = 8192  # longest per-pitch table; 128 of them stay under 4 MB
+
+# soundfile format and subtype for each preview format
+AUDIO_FORMATS = {
+    'wav': ('WAV', 'PCM_16'),
+    'flac': ('FLAC', 'PCM_16'),
+    'ogg': ('OGG', 'VORBIS'),
+}
+AUDIO_MIME_TYPES = {
+    'wav': 'audio/wav',
+    'flac': 'audio/flac',
+    'ogg': 'audio/ogg',
+}
+
+@lru_cache(maxsize=128)
+def pitch_table(pitch, fs=SYNTH_SAMPLE_RATE):
+    """One looping sine table per MIDI pitch, at most TABLE_MAX_SAMPLES long.
+
+    The table holds the whole number of cycles that comes closest to a whole
+    number of samples, so repeating it keeps the phase continuous; the pitch
+    is off by well under a cent.
+    """
+    period = fs / (440.0 * 2 ** ((pitch - 69) / 12))
+    cycles = np.arange(1, max(1, int(TABLE_MAX_SAMPLES // period)) + 1)
+    lengths = np.maximum(np.round(cycles * period), 1)
+    best = int(np.argmin(np.abs(lengths - cycles * period) / lengths))
+    n_cycles, length = int(cycles[best]), int(lengths[best])
+    table = np.sin(2 * np.pi * n_cycles / length * np.arange(length)).astype(np.float32)
+    # shared between calls, so it must never be modified in place
+    table.setflags(write=False)
+    return table
+
+def note_waveform(pitch, n_samples, fs=SYNTH_SAMPLE_RATE, first=0, stop=None):
+    """Samples first:stop of a note n_samples long, looped from its pitch table, with attack and release ramps."""
+    stop = n_samples if stop is None else stop
+    table = pitch_table(pitch, fs)
+    wave = table[np.arange(first, stop) % len(table)]
+
+    attack = min(int(ATTACK_SECONDS * fs), n_samples // 2)
+    release = min(int(RELEASE_SECONDS * fs), n_samples // 2)
+    # ramp only the part of each ramp that falls inside first:stop
+    if first < attack:
+        ramp_stop = min(attack, stop)
+        wave[:ramp_stop - first] *= np.arange(first, ramp_stop, dtype=np.float32) / attack
+    release_start = n_samples - release
+    if release and stop > release_start:
+        ramp_first = max(release_start, first)
+        wave[ramp_first - first:] *= np.linspace(1, 0, release, dtype=np.float32)[ramp_first - release_start:
+                                                                                 stop - release_start]
+    return wave
+
+def _note_samples(starts, ends, fs):
+    start_samples = np.round(np.asarray(starts) * fs).astype(np.int64)
+    lengths = np.maximum(np.round(np.asarray(ends) * fs).astype(np.int64) - start_samples, 0)
+    return start_samples, lengths
+
+def mix_notes(buffer, buffer_start, pitches, starts, ends, velocities=100, fs=SYNTH_SAMPLE_RATE):
+    """Add every note overlapping buffer into it; buffer_start is the sample index of buffer[0]."""
+    start_samples, lengths = _note_samples(starts, ends, fs)
+    gains = np.broadcast_to(np.asarray(velocities, dtype=np.float32) / 127, start_samples.shape)
+    pitches = np.asarray(pitches)
+
+    buffer_stop = buffer_start + len(buffer)
+    overlapping = np.flatnonzero(
+        (lengths > 0) & (start_samples < buffer_stop) & (start_samples + lengths > buffer_start)
+    )
+    for i in overlapping:
+        start, length = start_samples[i], lengths[i]
+        lo = max(start, buffer_start)
+        hi = min(start + length, buffer_stop)
+        wave = note_waveform(int(pitches[i]), int(length), fs, int(lo - start), int(hi - start))
+        buffer[lo - buffer_start:hi - buffer_start] += gains[i] * wave
+    return buffer
+
+def synthesize_notes(pitches, starts, ends, velocities=100, fs=SYNTH_SAMPLE_RATE):
+    """Render notes into one preallocated buffer, without normalization."""
+    if len(pitches) == 0:
+        return np.zeros(0, dtype=np.float32)
+    n_samples = int(np.ceil(np.max(ends) * fs)) + 1
+    buffer = np.zeros(n_samples, dtype=np.float32)
+    return mix_notes(buffer, 0, pitches, starts, ends, velocities, fs)
+
+def normalize(audio):
+    """Scale audio to a peak of 1, like pretty_midi's synthesize."""
+    peak = np.max(np.abs(audio)) if len(audio) else 0
+    return audio / peak if peak > 0 else audio
+
+def polyphony_gain(starts, ends, velocities=100):
+    """Gain that keeps the loudest chord below full scale, computable before rendering."""
+    if len(starts) == 0:
+        return 1.0
+    gains = np.broadcast_to(np.asarray(velocities, dtype=np.float64) / 127, np.shape(starts))
+    times = np.concatenate([starts, ends])
+    steps = np.concatenate([gains, -gains])
+    # releases sort before onsets at the same time so back-to-back notes don't stack
+    order = np.lexsort((steps, times))
+    return 1.0 / max(1.0, np.cumsum(steps[order]).max())
+
+def stream_notes(pitches, starts, ends, velocities=100, fs=SYNTH_SAMPLE_RATE, block_size=65536):
+    """Yield the rendered audio block by block, scaled so it never clips."""
+    if len(pitches) == 0:
+        return
+    gain = polyphony_gain(starts, ends, velocities)
+    n_samples = int(np.ceil(np.max(ends) * fs)) + 1
+    for block_start in range(0, n_samples, block_size):
+        block = np.zeros(min(block_size, n_samples - block_start), dtype=np.float32)
+        mix_notes(block, block_start, pitches, starts, ends, velocities, fs)
+        yield block * gain
+
+def write_audio(blocks, output, fs=SYNTH_SAMPLE_RATE, audio_format='wav'):
+    """Write an array or an iterable of blocks to a path or file-like object as WAV, FLAC or OGG."""
+    import soundfile as sf
+
+    if isinstance(blocks, np.ndarray):
+        blocks = [blocks]
+    file_format, subtype = AUDIO_FORMATS[audio_format]
+    with sf.SoundFile(output, 'w', fs, 1, format=file_format, subtype=subtype) as f:
+        for block in blocks:
+            # libsndfile's Vorbis encoder can crash on very large single writes
+            for start in range(0, len(block), WRITE_FRAMES):
+                f.write(block[start:start + WRITE_FRAMES])
@@ -0,0 +1,47 @@
+"""Live note detection fed from a simulated WAV source."""
+from io import BytesIO
+import numpy as np
+import pytest
+from audio_processing import frequency_to_note_name
+from live_pitch import LATENCY_BUDGET, LIVE_SAMPLE_RATE, LiveNoteTracker, WavFileSource, YinDetector, run_live
+
+TONES = [(660.0, 0.5), (0.0, 0.2), (880.0, 0.5), (0.0, 0.2), (1320.0, 0.5)]  # (Hz, seconds), 0 is a rest
+
+def held_tones_wav(tones=TONES, sr=LIVE_SAMPLE_RATE):
+    """A WAV file of held sine tones separated by rests."""
+    import soundfile as sf
+
+    segments = [0.5 * np.sin(2 * np.pi * frequency * np.arange(int(seconds * sr)) / sr) if frequency
+                else np.zeros(int(seconds * sr)) for frequency, seconds in tones]
+    buf = BytesIO()
+    sf.write(buf, np.concatenate(segments).astype(np.float32), sr, format='WAV', subtype='PCM_16')
+    buf.seek(0)
+    return buf
+
+@pytest.fixture(scope="module")
+def events():
+    tracker = LiveNoteTracker(YinDetector())
+    return list(run_live(WavFileSource(held_tones_wav()), tracker))
+
+def test_note_names_match_the_tones(events):
+    expected = [frequency_to_note_name(frequency) for frequency, _ in TONES if frequency]
+    assert [event.note_name for event in events if event.kind == 'note_on'] == expected
+
+def test_every_note_on_has_a_matching_note_off(events):
+    sounding = None
+    for event in events:
+        if event.kind == 'note_on':
+            assert sounding is None
+            sounding = event.pitch
+        else:
+            assert event.pitch == sounding
+            sounding = None
+    assert sounding is None
+
+def test_note_times_follow_the_tones(events):
+    onsets = [event.stream_time for event in events if event.kind == 'note_on']
+    np.testing.assert_allclose(onsets, [0.0, 0.7, 1.4], atol=0.05)
+
+def test_latency_within_budget(events):
+    assert events
+    assert max(event.latency for event in events) < LATENCY_BUDGET
@@ -0,0 +1,81 @@
+"""Round trip of write_midi_bytes through pretty_midi's parser."""
+from io import BytesIO
+import numpy as np
+import pytest
+from midi_writer import TICKS_PER_BEAT, TICKS_PER_SECOND, write_midi_bytes
+from note_array import NoteArray
+
+pretty_midi = pytest.importorskip("pretty_midi")
+
+def parse(midi_bytes):
+    return pretty_midi.PrettyMIDI(BytesIO(midi_bytes))
+
+def parsed_notes(midi):
+    """(pitch, start tick, end tick, velocity) of every parsed note, sorted."""
+    return sorted((note.pitch, midi.time_to_tick(note.start), midi.time_to_tick(note.end), note.velocity)
+                  for instrument in midi.instruments for note in instrument.notes)
+
+def random_notes(n_notes, seed):
+    """Polyphonic notes on a quarter-beat grid that never overlap on the same pitch."""
+    rng = np.random.default_rng(seed)
+    pitch, start, end = [], [], []
+    for p in rng.choice(128, 16, replace=False):
+        t = 0.0
+        for _ in range(n_notes // 16):
+            t += rng.integers(0, 3) * 0.125
+            length = rng.integers(1, 6) * 0.125
+            pitch.append(p)
+            start.append(t)
+            end.append(t + length)
+            t += length
+    return np.array(pitch), np.array(start), np.array(end), rng.integers(1, 128, len(pitch))
+
+@pytest.mark.parametrize("seed", range(5))
+def test_round_trip_matches_pitches_ticks_and_velocities(seed):
+    pitch, start, end, velocity = random_notes(400, seed)
+    midi = parse(write_midi_bytes(pitch, start, end, velocity))
+    assert midi.resolution == TICKS_PER_BEAT
+    expected = sorted(zip(pitch.tolist(), np.round(start * TICKS_PER_SECOND).astype(int).tolist(),
+                          np.round(end * TICKS_PER_SECOND).astype(int).tolist(), velocity.tolist()))
+    assert parsed_notes(midi) == expected
+
+def test_back_to_back_notes_on_one_pitch():
+    # the first note's off and the second's on share a tick; the off must come first
+    midi_bytes = write_midi_bytes([60, 60, 64], [0.0, 0.5, 0.5], [0.5, 1.0, 1.0], [90, 100, 80])
+    assert parsed_notes(parse(midi_bytes)) == [(60, 0, 480, 90), (60, 480, 960, 100), (64, 480, 960, 80)]
+
+    import mido
+
+    events = [(message.type, message.note, message.velocity)
+              for message in mido.MidiFile(file=BytesIO(midi_bytes)).tracks[0]
+              if message.type in ('note_on', 'note_off')]
+    at_shared_tick = events[1:4]
+    assert at_shared_tick[0] == ('note_off', 60, 0)
+    assert {event[0] for event in at_shared_tick[1:]} == {'note_on'}
+
+def test_short_notes_last_a_tick_and_velocities_are_clipped():
+    midi = parse(write_midi_bytes([60, 62], [1.0, 2.0], [1.0, 2.5], [0, 200]))
+    assert parsed_notes(midi) == [(60, 960, 961, 1), (62, 1920, 2400, 127)]
+
+def test_note_array_round_trip():
+    notes = NoteArray([72, 60, 67], [0.5, 0.0, 0.25], [1.0, 0.25, 0.75], [64, 100, 127]).sorted()
+    parsed = NoteArray.from_pretty_midi(parse(notes.to_midi_bytes())).sorted()
+    assert np.array_equal(parsed.pitch, notes.pitch)
+    assert np.array_equal(parsed.velocity, notes.velocity)
+    np.testing.assert_allclose(parsed.start, notes.start)
+    np.testing.assert_allclose(parsed.end, notes.end)
+
+@pytest.mark.parametrize("pitch", [128, -1, 300])
+def test_out_of_range_pitches_raise(pitch):
+    with pytest.raises(ValueError):
+        write_midi_bytes([60, pitch], [0.0, 0.5], [0.5, 1.0])
+    with pytest.raises(ValueError):
+        NoteArray([60, pitch], [0.0, 0.5], [0.5, 1.0])
+
+@pytest.mark.parametrize("program, channel", [(128, 0), (-1, 0), (0, 16), (0, -1)])
+def test_out_of_range_program_or_channel_raise(program, channel):
+    with pytest.raises(ValueError):
+        write_midi_bytes([60], [0.0], [0.5], program=program, channel=channel)
+
+def test_empty():
+    assert parsed_notes(parse(write_midi_bytes([], [], []))) == []
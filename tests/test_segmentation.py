@@ -0,0 +1,124 @@
+"""Parity of the vectorized segment_notes with the per-frame loop it replaced, and hysteresis segmentation."""
+import numpy as np
+import pytest
+from audio_processing import HYSTERESIS_PARAMS, frequency_to_note_name, segment_notes, segment_notes_hysteresis
+
+def reference_segment_notes(time, frequency, note_threshold=50, min_duration=0.1):
+    """The original per-frame loop from process_whistle_audio, returning note dicts."""
+    notes = []
+    current_note = None
+
+    for i, (t, f) in enumerate(zip(time, frequency)):
+        note_name = frequency_to_note_name(f) if f > 0 else None
+
+        if current_note is None and note_name:
+            current_note = {'start_time': t, 'note_name': note_name, 'frequency': f, 'end_time': t}
+        elif current_note and note_name:
+            if abs(f - current_note['frequency']) < note_threshold:
+                current_note['end_time'] = t
+            else:
+                if current_note['end_time'] - current_note['start_time'] >= min_duration:
+                    notes.append(current_note)
+                current_note = {'start_time': t, 'note_name': note_name, 'frequency': f, 'end_time': t}
+        elif current_note and not note_name:
+            if current_note['end_time'] - current_note['start_time'] >= min_duration:
+                notes.append(current_note)
+            current_note = None
+
+    if current_note and current_note['end_time'] - current_note['start_time'] >= min_duration:
+        notes.append(current_note)
+    return notes
+
+def random_pitch_track(seed, n_frames=500, step=0.01):
+    """Held whistle-range notes with jitter, rests and the odd sub-audible frame."""
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(1, 40, n_frames)
+    pitches = rng.uniform(400, 2000, n_frames)
+    pitches[rng.random(n_frames) < 0.25] = 0
+    frequency = np.repeat(pitches, lengths)[:n_frames]
+    frequency = np.where(frequency > 0, frequency + rng.normal(0, 15, n_frames), 0)
+    frequency[rng.random(n_frames) < 0.01] = 10.0  # voiced, but below C0
+    return np.arange(n_frames) * step, frequency
+
+def assert_same_notes(time, frequency, **params):
+    expected = reference_segment_notes(time, frequency, **params)
+    notes = segment_notes(time, frequency, **params)
+    assert len(notes) == len(expected)
+    assert notes.note_names == [note['note_name'] for note in expected]
+    np.testing.assert_array_equal(notes.start, [note['start_time'] for note in expected])
+    np.testing.assert_array_equal(notes.end, [note['end_time'] for note in expected])
+
+@pytest.mark.parametrize("seed", range(50))
+def test_matches_reference_loop(seed):
+    time, frequency = random_pitch_track(seed)
+    assert_same_notes(time, frequency)
+
+@pytest.mark.parametrize("note_threshold, min_duration", [(10, 0.0), (50, 0.05), (200, 0.3)])
+def test_matches_reference_loop_with_other_thresholds(note_threshold, min_duration):
+    for seed in range(10):
+        time, frequency = random_pitch_track(seed)
+        assert_same_notes(time, frequency, note_threshold=note_threshold, min_duration=min_duration)
+
+def test_empty_input():
+    assert_same_notes(np.zeros(0), np.zeros(0))
+    assert len(segment_notes([], [])) == 0
+
+def test_all_unvoiced():
+    time = np.arange(100) * 0.01
+    assert_same_notes(time, np.zeros(100))
+    assert len(segment_notes(time, np.zeros(100))) == 0
+
+@pytest.mark.parametrize("min_duration", [0.0, 0.1])
+def test_single_frame(min_duration):
+    assert_same_notes(np.array([0.0]), np.array([880.0]), min_duration=min_duration)
+
+def test_note_running_to_the_last_frame():
+    time = np.arange(30) * 0.01
+    frequency = np.where(np.arange(30) >= 10, 660.0, 0.0)
+    assert_same_notes(time, frequency)
+
+def held_track(cents_offsets, base=880.0, step=0.01):
+    """A confident pitch track at base Hz moved by cents_offsets frame by frame."""
+    frequency = base * 2 ** (np.asarray(cents_offsets, dtype=np.float64) / 1200)
+    return np.arange(len(frequency)) * step, frequency, np.full(len(frequency), 0.9)
+
+def test_hysteresis_vibrato_stays_one_note():
+    # peak to peak within split_cents, so no frame strays that far from the pitch the note starts at
+    depth = 0.4 * HYSTERESIS_PARAMS['split_cents']
+    time, frequency, confidence = held_track(depth * np.sin(2 * np.pi * 6 * np.arange(100) * 0.01))
+    notes = segment_notes_hysteresis(time, frequency, confidence)
+    assert len(notes) == 1
+    assert notes.note_names == [frequency_to_note_name(880.0)]
+    assert notes.start[0] == time[0] and notes.end[0] == time[-1]
+
+def test_hysteresis_step_beyond_split_cents_splits():
+    step = HYSTERESIS_PARAMS['split_cents'] + 130  # a whole tone
+    time, frequency, confidence = held_track(np.repeat([0, step], 40))
+    notes = segment_notes_hysteresis(time, frequency, confidence)
+    assert notes.note_names == [frequency_to_note_name(880.0), frequency_to_note_name(frequency[-1])]
+    np.testing.assert_array_equal(notes.start, [time[0], time[40]])
+
+def test_hysteresis_bridges_one_frame_dropout():
+    time, frequency, confidence = held_track(np.zeros(60))
+    confidence[30] = 0.0
+    frequency[30] = 0.0
+    assert len(segment_notes_hysteresis(time, frequency, confidence, median_frames=1)) == 2
+    notes = segment_notes_hysteresis(time, frequency, confidence)
+    assert len(notes) == 1
+    assert notes.start[0] == time[0] and notes.end[0] == time[-1]
+
+def test_hysteresis_reattack_splits_with_onset_strength():
+    time, frequency, confidence = held_track(np.zeros(80))
+    assert len(segment_notes_hysteresis(time, frequency, confidence)) == 1
+    strength = np.zeros(80)
+    strength[40] = 1.0
+    notes = segment_notes_hysteresis(time, frequency, confidence, onset_strength=strength)
+    assert notes.note_names == [frequency_to_note_name(880.0)] * 2
+    np.testing.assert_array_equal(notes.start, [time[0], time[40]])
+    np.testing.assert_array_equal(notes.end, [time[39], time[-1]])
+
+def test_hysteresis_all_unvoiced_and_empty():
+    time = np.arange(100) * 0.01
+    assert len(segment_notes_hysteresis(time, np.zeros(100), np.full(100, 0.9))) == 0
+    assert len(segment_notes_hysteresis(time, np.full(100, 880.0), np.full(100, 0.1))) == 0
+    assert len(segment_notes_hysteresis(np.zeros(0), np.zeros(0), np.zeros(0))) == 0
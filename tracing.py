@@ -0,0 +1,214 @@
+import streamlit as st
+import contextvars
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+# upper bounds of the duration histogram exported to Prometheus, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+RECENT_SPANS = 2000  # finished spans kept in memory for the timing panel
+
+logger = logging.getLogger("sape.trace")
+
+# the innermost open span of the current thread or task
+_current_span = contextvars.ContextVar("sape_current_span", default=None)
+
+def _rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+class Tracer:
+    """Collects finished spans into a ring buffer, per-name Prometheus aggregates and optional sinks."""
+
+    def __init__(self, log_path=None):
+        self._lock = threading.Lock()
+        self.recent = deque(maxlen=RECENT_SPANS)
+        self.aggregates = {}
+        self.log_path = log_path
+
+    def record(self, span):
+        with self._lock:
+            self.recent.append(span)
+            stats = self.aggregates.setdefault(span['name'], {
+                'count': 0, 'errors': 0, 'seconds': 0.0, 'buckets': [0] * len(DURATION_BUCKETS),
+            })
+            stats['count'] += 1
+            stats['seconds'] += span['seconds']
+            stats['errors'] += span['error'] is not None
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span['seconds'] <= bound:
+                    stats['buckets'][i] += 1
+
+            line = json.dumps(span, default=str)
+            if self.log_path:
+                with open(self.log_path, "a") as f:
+                    f.write(line + "\n")
+        logger.debug(line)
+
+    def traces(self, limit=20):
+        """The most recent traces, newest first, each a list of its spans in start order."""
+        with self._lock:
+            spans = list(self.recent)
+        by_trace = {}
+        for span in spans:
+            by_trace.setdefault(span['trace_id'], []).append(span)
+        traces = sorted(by_trace.values(), key=lambda trace: -max(span['end'] for span in trace))
+        return [sorted(trace, key=lambda span: span['start']) for trace in traces[:limit]]
+
+    def prometheus_text(self):
+        """Span aggregates in the Prometheus text exposition format."""
+        with self._lock:
+            aggregates = {name: dict(stats, buckets=list(stats['buckets']))
+                          for name, stats in self.aggregates.items()}
+        lines = [
+            "# HELP sape_span_seconds Time spent in each traced pipeline stage.",
+            "# TYPE sape_span_seconds histogram",
+        ]
+        for name, stats in sorted(aggregates.items()):
+            for bound, count in zip(DURATION_BUCKETS, stats['buckets']):
+                lines.append(f'sape_span_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+            lines.append(f'sape_span_seconds_bucket{{span="{name}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'sape_span_seconds_sum{{span="{name}"}} {stats["seconds"]:.6f}')
+            lines.append(f'sape_span_seconds_count{{span="{name}"}} {stats["count"]}')
+        lines.append("# HELP sape_span_errors_total Traced stages that raised an exception.")
+        lines.append("# TYPE sape_span_errors_total counter")
+        for name, stats in sorted(aggregates.items()):
+            lines.append(f'sape_span_errors_total{{span="{name}"}} {stats["errors"]}')
+        return "\n".join(lines) + "\n"
+
+_tracer = Tracer(os.environ.get("SAPE_TRACE_LOG"))
+
+def get_tracer():
+    """Return the process-wide tracer."""
+    return _tracer
+
+@contextmanager
+def span(name, **attributes):
+    """Time a block as a named span, with its memory delta, input sizes and any exception.
+
+    Spans nest: a span opened inside another becomes its child and shares its
+    trace id. Attributes should be small values such as sample counts or byte
+    sizes; more can be added while the span is open with set_attributes.
+    Exceptions are recorded with their traceback and re-raised.
+    """
+    parent = _current_span.get()
+    record = {
+        'name': name,
+        'trace_id': parent['trace_id'] if parent else uuid.uuid4().hex[:16],
+        'span_id': uuid.uuid4().hex[:16],
+        'parent_id': parent['span_id'] if parent else None,
+        'depth': parent['depth'] + 1 if parent else 0,
+        'thread': threading.current_thread().name,
+        'attributes': dict(attributes),
+        'error': None,
+    }
+    token = _current_span.set(record)
+    rss_before = _rss_mb()
+    record['start'] = time.time()
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        record['traceback'] = traceback.format_exc()
+        raise
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        record['end'] = record['start'] + record['seconds']
+        record['rss_delta_mb'] = _rss_mb() - rss_before
+        _current_span.reset(token)
+        _tracer.record(record)
+
+def set_attributes(**attributes):
+    """Add attributes, e.g. output sizes, to the innermost open span."""
+    current = _current_span.get()
+    if current is not None:
+        current['attributes'].update(attributes)
+
+def record_error(error):
+    """Mark the innermost open span as failed for an exception that is handled, not raised."""
+    current = _current_span.get()
+    if current is not None:
+        current['error'] = f"{type(error).__name__}: {error}"
+        current['traceback'] = traceback.format_exc()
+    logger.error("%s", traceback.format_exc())
+
+def record_span(name, seconds, **attributes):
+    """Record an already-timed stage, such as one measured in a worker process, under the open span."""
+    parent = _current_span.get()
+    end = time.time()
+    _tracer.record({
+        'name': name,
+        'trace_id': parent['trace_id'] if parent else uuid.uuid4().hex[:16],
+        'span_id': uuid.uuid4().hex[:16],
+        'parent_id': parent['span_id'] if parent else None,
+        'depth': parent['depth'] + 1 if parent else 0,
+        'thread': threading.current_thread().name,
+        'attributes': dict(attributes),
+        'error': None,
+        'start': end - seconds,
+        'end': end,
+        'seconds': seconds,
+        'rss_delta_mb': 0.0,
+    })
+
+def start_metrics_server(port):
+    """Serve the Prometheus text at http://0.0.0.0:<port>/metrics from a daemon thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = _tracer.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="sape-metrics", daemon=True).start()
+    return server
+
+@st.cache_resource
+def get_metrics_server():
+    """Start the metrics endpoint once per process if SAPE_METRICS_PORT is set."""
+    port = os.environ.get("SAPE_METRICS_PORT")
+    return start_metrics_server(int(port)) if port else None
+
+def render_timing_panel(limit=5):
+    """Show the stage timings of the most recent traces."""
+    traces = _tracer.traces(limit)
+    if not traces:
+        st.write("No traced conversions yet.")
+        return
+    for trace in traces:
+        root = trace[0]
+        status = f" — failed: {root['error']}" if root['error'] else ""
+        st.markdown(f"**{root['name']}** {root['seconds'] * 1000:.0f} ms{status}")
+        st.dataframe(
+            [{'stage': " " * span['depth'] + span['name'],
+              'ms': round(span['seconds'] * 1000, 1),
+              'memory Δ (MB)': round(span['rss_delta_mb'], 1),
+              'inputs': ", ".join(f"{k}={v}" for k, v in span['attributes'].items()),
+              'error': span['error'] or ""} for span in trace],
+            use_container_width=True, hide_index=True
+        )
@@ -1,79 +1,219 @@
 import streamlit as st
-import tempfile
-import os
-import traceback
-from audio_processing import process_whistle_audio
-from midi_utils import create_sheet_music_from_notes, create_midi_from_notes
+import numpy as np
+from io import BytesIO
+from audio_io import load_audio
+from audio_processing import (
+    CREPE_SAMPLE_RATE, HYSTERESIS_PARAMS, extract_pitch_from_audio, onset_strength, segment_pitch_track,
+    stream_pitch_track, segment_notes_stream
+)
+from midi_utils import create_sheet_music_from_notes, notes_to_midi_bytes
+from note_array import NoteArray
 from audio_recorder_streamlit import audio_recorder
+from result_cache import get_result_cache
+from job_queue import get_job_queue, render_job
+from live_pitch import render_live_whistle_ui
+from tracing import set_attributes, span
+
+# pitch tracking and segmentation settings; part of the result cache key
+WHISTLE_PARAMS = {
+    'backend': 'crepe',
+    'step_size': 10,
+    'viterbi': True,
+    'min_duration': 0.1,
+    'segmentation': 'hysteresis',
+    **HYSTERESIS_PARAMS,
+    # only used by the legacy segmentation
+    'confidence_threshold': 0.5,
+    'note_threshold': 50,
+}
+
+SEGMENTATION_LABELS = {
+    "Hysteresis in cents (recommended)": 'hysteresis',
+    "Fixed 50 Hz steps (legacy)": 'legacy',
+}
+
+# recordings longer than this are analysed block by block to bound memory
+STREAMING_MIN_SECONDS = 60
+
+def _hysteresis_params(params):
+    return {name: params[name] for name in HYSTERESIS_PARAMS}
+
+def _confidence_threshold(params):
+    # the hysteresis segmentation needs the ungated pitch track
+    return params['confidence_threshold'] if params['segmentation'] == 'legacy' else 0.0
+
+def transcribe_whistle(audio_bytes, params=WHISTLE_PARAMS, use_cache=True):
+    """Transcribe whistle audio bytes in memory; returns (notes, midi_bytes, pitch_track)."""
+    # decoded straight to the pitch backends' rate, so extract_pitch_from_audio doesn't resample again
+    audio_data, sr = load_audio(audio_bytes, CREPE_SAMPLE_RATE, use_cache)
+    time, frequency, confidence = extract_pitch_from_audio(
+        audio_data, sr,
+        params['step_size'],
+        params['viterbi'],
+        _confidence_threshold(params),
+        params['backend']
+    )
+    if time is None:
+        raise RuntimeError("pitch extraction failed")
+    strength = None
+    if params['segmentation'] == 'hysteresis':
+        strength = onset_strength(audio_data, sr, params['step_size'])
+    notes = segment_pitch_track(time, frequency, confidence, params['segmentation'], params['min_duration'],
+                                params['note_threshold'], strength, **_hysteresis_params(params))
+    midi_bytes = notes_to_midi_bytes(notes) if notes else None
+    return notes, midi_bytes, {'time': time, 'frequency': frequency, 'confidence': confidence}
+
+def stream_whistle(source, params=WHISTLE_PARAMS, progress=None, duration=None):
+    """Analyse a long recording block by block, reporting notes as they are found."""
+    chunks = []
+
+    def collect_chunks():
+        for chunk in stream_pitch_track(
+            source,
+            step_size=params['step_size'],
+            viterbi=params['viterbi'],
+            confidence_threshold=_confidence_threshold(params),
+            backend=params['backend']
+        ):
+            chunks.append(chunk)
+            yield chunk
+
+    found = []
+    n_notes = 0
+    for notes in segment_notes_stream(collect_chunks(), params['note_threshold'], params['min_duration'],
+                                      params['segmentation'], **_hysteresis_params(params)):
+        found.append(notes)
+        n_notes += len(notes)
+        if progress:
+            latest = notes[-1]
+            progress(latest.end / duration if duration else None,
+                     f"Analyzing whistled melody... {n_notes} notes so far "
+                     f"(latest {notes[-1:].note_names[0]} at {latest.start:.2f}s)")
+
+    time, frequency, confidence = (np.concatenate(column) for column in zip(*chunks))
+    return time, frequency, confidence, NoteArray.concatenate(found)
+
+def whistle_job(progress, audio_bytes, params=WHISTLE_PARAMS):
+    """Background job: transcribe whistle audio through the result cache; returns the cache entry."""
+    with span("whistle.job", bytes=len(audio_bytes), backend=params['backend']):
+        return _whistle_job(progress, audio_bytes, params)
+
+def _whistle_job(progress, audio_bytes, params):
+    cache = get_result_cache()
+    cache_key = cache.make_key(audio_bytes, "whistle", params)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        set_attributes(from_cache=True)
+        return dict(cached, from_cache=True)
+
+    import soundfile as sf
+    try:
+        duration = sf.info(BytesIO(audio_bytes)).duration
+    except RuntimeError:
+        duration = 0.0
+
+    set_attributes(audio_seconds=round(duration, 2))
+    if duration > STREAMING_MIN_SECONDS:
+        time, frequency, confidence, notes = stream_whistle(BytesIO(audio_bytes), params, progress, duration)
+        midi_bytes = notes_to_midi_bytes(notes) if notes else None
+        pitch_track = {'time': time, 'frequency': frequency, 'confidence': confidence}
+    else:
+        progress(0.1, "Analyzing whistled melody...")
+        notes, midi_bytes, pitch_track = transcribe_whistle(audio_bytes, params)
+
+    entry = {
+        'notes': notes,
+        'midi_bytes': midi_bytes,
+        'pitch_track': pitch_track,
+    }
+    cache.put(cache_key, entry)
+    return entry
 
 class WhistleToSheetApp:
     """Modular class for Whistle-to-Sheet functionality."""
     
-    def process_uploaded_whistle(self, uploaded_file):
-        """Process uploaded whistle audio file."""
-        return self._process_whistle_common(uploaded_file.getvalue(), "uploaded whistle")
+    def __init__(self, backend='crepe', segmentation='hysteresis'):
+        self.params = dict(WHISTLE_PARAMS, backend=backend, segmentation=segmentation)
     
-    def process_recorded_whistle(self, audio_bytes):
-        """Process recorded whistle audio."""
-        return self._process_whistle_common(audio_bytes, "recorded whistle")
+    def process_uploaded_whistle(self, uploaded_file, session_key):
+        """Queue processing of an uploaded whistle audio file."""
+        self._submit(uploaded_file.getvalue(), session_key)
     
-    def _process_whistle_common(self, audio_bytes, source_name):
-        """Common processing logic for whistle audio."""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_audio_path = os.path.join(temp_dir, f"{source_name}.wav")
-            midi_output_path = os.path.join(temp_dir, f"{source_name}_melody.mid")
-            
-            try:
-                # Save audio
-                with open(temp_audio_path, "wb") as f:
-                    f.write(audio_bytes)
-                
-                # Load and process audio
-                import librosa
-                audio_data, sr = librosa.load(temp_audio_path)
-                
-                with st.spinner("Analyzing whistled melody..."):
-                    notes = process_whistle_audio(audio_data, sr)
-                
-                if notes:
-                    st.success(f"Detected {len(notes)} musical notes!")
-                    
-                    # Display detected notes
-                    st.subheader("Detected Notes")
-                    for i, note in enumerate(notes):
-                        st.write(f"Note {i+1}: {note['note_name']} "
-                               f"({note['start_time']:.2f}s - {note['end_time']:.2f}s)")
-                    
-                    # Generate sheet music
-                    with st.spinner("Generating sheet music..."):
-                        sheet_image = create_sheet_music_from_notes(notes)
-                    
-                    if sheet_image:
-                        st.subheader("Generated Sheet Music")
-                        st.image(sheet_image, caption="Sheet Music Preview")
-                    
-                    # Generate MIDI
-                    if create_midi_from_notes(notes, midi_output_path):
-                        with open(midi_output_path, "rb") as f:
-                            midi_bytes = f.read()
-                        
-                        return midi_bytes
-                else:
-                    st.warning("No clear melody detected. Try whistling more clearly or loudly.")
-                    return None
-                    
-            except Exception as e:
-                st.error(f"Error processing {source_name}: {type(e).__name__}")
-                print(traceback.format_exc())
-                return None
+    def process_recorded_whistle(self, audio_bytes, session_key):
+        """Queue processing of recorded whistle audio."""
+        self._submit(audio_bytes, session_key)
+    
+    def _submit(self, audio_bytes, session_key):
+        """Queue a whistle transcription and remember its job in the session."""
+        st.session_state[session_key] = get_job_queue().submit('whistle', whistle_job, audio_bytes, self.params)
+
+    def render_result(self, session_key, download_key):
+        """Show the progress of a queued transcription, then the notes, sheet music and MIDI download."""
+        def render_entry(entry):
+            if entry.get('from_cache'):
+                st.caption("Loaded from result cache.")
+            midi_bytes = self._render_whistle_result(entry['notes'], entry['midi_bytes'])
+            if midi_bytes:
+                st.download_button(
+                    label="Download MIDI File",
+                    data=midi_bytes,
+                    file_name="whistle_melody.mid",
+                    mime="audio/midi",
+                    key=download_key
+                )
+
+        render_job(session_key, render_entry)
+
+    def _render_whistle_result(self, notes, midi_bytes):
+        """Show detected notes and sheet music, and return the MIDI bytes."""
+        if not notes:
+            st.warning("No clear melody detected. Try whistling more clearly or loudly.")
+            return None
+
+        st.success(f"Detected {len(notes)} musical notes!")
+        
+        # Display detected notes
+        st.subheader("Detected Notes")
+        for i, (note_name, start, end) in enumerate(zip(notes.note_names, notes.start, notes.end)):
+            st.write(f"Note {i+1}: {note_name} "
+                   f"({start:.2f}s - {end:.2f}s)")
+        
+        # Generate sheet music
+        with st.spinner("Generating sheet music..."):
+            sheet_pages = create_sheet_music_from_notes(notes)
+        
+        if sheet_pages:
+            st.subheader("Generated Sheet Music")
+            for i, page in enumerate(sheet_pages):
+                st.image(page, caption=f"Sheet Music Preview (page {i+1} of {len(sheet_pages)})")
+        
+        return midi_bytes
 
 def render_whistle_to_sheet_ui():
     """Render the complete Whistle-to-Sheet interface."""
     st.header("Whistle to Sheet Music")
     st.write("Record or upload a whistled melody to generate sheet music and MIDI.")
     
-    whistle_app = WhistleToSheetApp()
-    tab1, tab2 = st.tabs(["Upload Audio", "Record Whistle"])
+    backend_labels = {
+        "CREPE (most accurate)": 'crepe',
+        "CREPE tiny": 'crepe-tiny',
+        "pYIN": 'pyin',
+        "Autocorrelation (fastest)": 'autocorr',
+    }
+    backend_label = st.selectbox(
+        "Pitch estimator:",
+        list(backend_labels),
+        help="Clean whistles are close to pure tones, so the faster estimators are usually enough.",
+        key="whistle_backend"
+    )
+    segmentation_label = st.selectbox(
+        "Note segmentation:",
+        list(SEGMENTATION_LABELS),
+        help="Hysteresis keeps vibrato within one note and splits on semitone steps at any pitch.",
+        key="whistle_segmentation"
+    )
+    whistle_app = WhistleToSheetApp(backend_labels[backend_label], SEGMENTATION_LABELS[segmentation_label])
+    tab1, tab2, tab3 = st.tabs(["Upload Audio", "Record Whistle", "Live Notes"])
     
     with tab1:
         st.subheader("Upload Whistled Audio")
@@ -87,16 +227,8 @@ def render_whistle_to_sheet_ui():
             st.audio(uploaded_whistle.getvalue())
             
             if st.button("Process Whistled Audio", key="process_whistle_upload"):
-                midi_bytes = whistle_app.process_uploaded_whistle(uploaded_whistle)
-                
-                if midi_bytes:
-                    st.download_button(
-                        label="Download MIDI File",
-                        data=midi_bytes,
-                        file_name="whistle_melody.mid",
-                        mime="audio/midi",
-                        key="download_whistle_upload"
-                    )
+                whistle_app.process_uploaded_whistle(uploaded_whistle, "whistle_job_upload")
+            whistle_app.render_result("whistle_job_upload", "download_whistle_upload")
     
     with tab2:
         st.subheader("Record Whistled Melody")
@@ -116,13 +248,9 @@ def render_whistle_to_sheet_ui():
             st.audio(whistle_audio, format="audio/wav")
             
             if st.button("Process Whistled Melody", key="process_whistle_record"):
-                midi_bytes = whistle_app.process_recorded_whistle(whistle_audio)
-                
-                if midi_bytes:
-                    st.download_button(
-                        label="Download MIDI File",
-                        data=midi_bytes,
-                        file_name="whistle_melody.mid",
-                        mime="audio/midi",
-                        key="download_whistle_record"
-                    )
+                whistle_app.process_recorded_whistle(whistle_audio, "whistle_job_record")
+            whistle_app.render_result("whistle_job_record", "download_whistle_record")
+
+    with tab3:
+        st.subheader("Live Note Detection")
+        render_live_whistle_ui()